@@ -958,12 +958,14 @@ class CloudController(object):
         return {'instancesSet': instances_set}
 
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
+                             result, bdms=None):
         """Format InstanceBlockDeviceMappingResponseItemType"""
         root_device_type = 'instance-store'
         mapping = []
-        for bdm in db.block_device_mapping_get_all_by_instance(context,
-                                                               instance_uuid):
+        if bdms is None:
+            bdms = db.block_device_mapping_get_all_by_instance(context,
+                                                               instance_uuid)
+        for bdm in bdms:
             volume_id = bdm['volume_id']
             if (volume_id is None or bdm['no_device']):
                 continue
@@ -1036,18 +1038,43 @@ class CloudController(object):
                                                      sort_dir='asc')
             except exception.NotFound:
                 instances = []
+        if not context.is_admin:
+            instances = [instance for instance in instances
+                         if instance['image_ref'] != str(FLAGS.vpn_image_id)]
+
+        # Look up the ec2 ids, block device mappings and availability zones
+        # of all the instances at once rather than instance by instance
+        ec2_ids = ec2utils.get_int_ids_from_instance_uuids(
+                context.elevated(),
+                [instance['uuid'] for instance in instances])
+        image_ids = ec2utils.glance_ids_to_ids(context,
+                [instance[key] for instance in instances
+                 for key in ('image_ref', 'kernel_id', 'ramdisk_id')
+                 if instance[key]])
+        bdms = {}
+        for bdm in db.block_device_mapping_get_all_by_instances(context,
+                [instance['uuid'] for instance in instances]):
+            bdms.setdefault(bdm['instance_uuid'], []).append(bdm)
+        services = {}
+        hosts = set(instance['host'] for instance in instances) - set([None])
+        for service in db.service_get_all_by_hosts(context.elevated(),
+                                                   list(hosts)):
+            services.setdefault(service['host'], []).append(service)
+        zones = {}
+
         for instance in instances:
-            if not context.is_admin:
-                if instance['image_ref'] == str(FLAGS.vpn_image_id):
-                    continue
             i = {}
             instance_uuid = instance['uuid']
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
+            ec2_id = ec2utils.id_to_ec2_id(ec2_ids[instance_uuid])
             i['instanceId'] = ec2_id
             image_uuid = instance['image_ref']
-            i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
-            self._format_kernel_id(context, instance, i, 'kernelId')
-            self._format_ramdisk_id(context, instance, i, 'ramdiskId')
+            i['imageId'] = ec2utils.image_ec2_id(image_ids.get(image_uuid))
+            if instance['kernel_id']:
+                i['kernelId'] = ec2utils.image_ec2_id(
+                        image_ids[instance['kernel_id']], 'aki')
+            if instance['ramdisk_id']:
+                i['ramdiskId'] = ec2utils.image_ec2_id(
+                        image_ids[instance['ramdisk_id']], 'ari')
             i['instanceState'] = _state_description(
                 instance['vm_state'], instance['shutdown_terminate'])
 
@@ -1081,11 +1108,13 @@ class CloudController(object):
             i['amiLaunchIndex'] = instance['launch_index']
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance['uuid'],
-                                      i['rootDeviceName'], i)
+                                      i['rootDeviceName'], i,
+                                      bdms=bdms.get(instance['uuid'], []))
             host = instance['host']
-            services = db.service_get_all_by_host(context.elevated(), host)
-            zone = ec2utils.get_availability_zone_by_host(services, host)
-            i['placement'] = {'availabilityZone': zone}
+            if host not in zones:
+                zones[host] = ec2utils.get_availability_zone_by_host(
+                        services.get(host, []), host)
+            i['placement'] = {'availabilityZone': zones[host]}
             if instance['reservation_id'] not in reservations:
                 r = {}
                 r['reservationId'] = instance['reservation_id']
@@ -16,6 +16,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
 import re
 
 from nova import context
@@ -23,14 +25,124 @@ from nova import db
 from nova import exception
 from nova import flags
 from nova.network import model as network_model
+from nova.openstack.common import cfg
 from nova.openstack.common import log as logging
 from nova import utils
 
 
+ec2utils_opts = [
+    cfg.IntOpt('ec2_id_cache_size',
+               default=10000,
+               help='Number of ec2 id mappings to cache in memory, '
+                    '0 to disable the cache'),
+    ]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(ec2utils_opts)
 LOG = logging.getLogger(__name__)
 
 
+class IdMappingCache(object):
+    """A bounded, least recently used cache of ec2 id mappings.
+
+    The mappings of uuids to the integer ids ec2 ids are made of never
+    change once created, so they can be cached for the whole life of
+    the process.
+    """
+
+    def __init__(self):
+        # NOTE: collections.OrderedDict is not available on python 2.6, so
+        #       the recency order is kept in a deque of (tick, key) pairs.
+        #       A key used again is appended once more and its older pairs
+        #       are skipped when evicting and dropped when compacting.
+        self._mappings = {}
+        self._order = collections.deque()
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if FLAGS.ec2_id_cache_size <= 0:
+            return None
+        try:
+            value = self._mappings[key][0]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._touch(key, value)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if FLAGS.ec2_id_cache_size <= 0 or value is None:
+            return
+        self._touch(key, value)
+        while len(self._mappings) > FLAGS.ec2_id_cache_size:
+            tick, oldest = self._order.popleft()
+            if self._is_current(tick, oldest):
+                del self._mappings[oldest]
+
+    def _is_current(self, tick, key):
+        return self._mappings.get(key, (None, None))[1] == tick
+
+    def _touch(self, key, value):
+        self._tick += 1
+        self._mappings[key] = (value, self._tick)
+        self._order.append((self._tick, key))
+        if len(self._order) > 2 * max(len(self._mappings), 16):
+            self._order = collections.deque((tick, key)
+                                            for tick, key in self._order
+                                            if self._is_current(tick, key))
+
+    def add_mapping(self, kind, uuid, int_id):
+        self.set((kind, 'id', uuid), int_id)
+        self.set((kind, 'uuid', int_id), uuid)
+
+    def clear(self):
+        self._mappings.clear()
+        self._order.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._mappings)}
+
+
+ID_MAPPING_CACHE = IdMappingCache()
+
+
+def _cached_uuid_to_id(kind):
+    """Cache the int ids returned by a uuid to int id lookup."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(context, uuid):
+            if uuid is None:
+                return
+            int_id = ID_MAPPING_CACHE.get((kind, 'id', uuid))
+            if int_id is None:
+                int_id = f(context, uuid)
+                ID_MAPPING_CACHE.add_mapping(kind, uuid, int_id)
+            return int_id
+        return wrapper
+    return decorator
+
+
+def _cached_id_to_uuid(kind):
+    """Cache the uuids returned by an int id to uuid lookup."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(context, int_id):
+            uuid = ID_MAPPING_CACHE.get((kind, 'uuid', int_id))
+            if uuid is None:
+                uuid = f(context, int_id)
+                ID_MAPPING_CACHE.add_mapping(kind, uuid, int_id)
+            return uuid
+        return wrapper
+    return decorator
+
+
 def image_type(image_type):
     """Converts to a three letter image type.
 
@@ -48,21 +160,41 @@ def image_type(image_type):
     return image_type
 
 
+@_cached_id_to_uuid('image')
 def id_to_glance_id(context, image_id):
     """Convert an internal (db) id to a glance id."""
     return db.s3_image_get(context, image_id)['uuid']
 
 
+@_cached_uuid_to_id('image')
 def glance_id_to_id(context, glance_id):
     """Convert a glance id to an internal (db) id."""
-    if glance_id is None:
-        return
     try:
         return db.s3_image_get_by_uuid(context, glance_id)['id']
     except exception.NotFound:
         return db.s3_image_create(context, glance_id)['id']
 
 
+def glance_ids_to_ids(context, glance_ids):
+    """Convert many glance ids to internal (db) ids at once.
+
+    Returns a dict of internal ids by glance id.
+    """
+    ids = {}
+    for glance_id in set(glance_ids) - set([None]):
+        image_id = ID_MAPPING_CACHE.get(('image', 'id', glance_id))
+        if image_id is not None:
+            ids[glance_id] = image_id
+
+    missing = set(glance_ids) - set(ids) - set([None])
+    for image in db.s3_image_get_all_by_uuids(context, list(missing)):
+        ID_MAPPING_CACHE.add_mapping('image', image['uuid'], image['id'])
+        ids[image['uuid']] = image['id']
+    for glance_id in missing - set(ids):
+        ids[glance_id] = glance_id_to_id(context, glance_id)
+    return ids
+
+
 def ec2_id_to_glance_id(context, ec2_id):
     image_id = ec2_id_to_id(ec2_id)
     return id_to_glance_id(context, image_id)
@@ -143,6 +275,7 @@ def ec2_inst_id_to_uuid(context, ec2_id):
     return get_instance_uuid_from_int_id(context, int_id)
 
 
+@_cached_id_to_uuid('instance')
 def get_instance_uuid_from_int_id(context, int_id):
     return db.get_instance_uuid_by_ec2_id(context, int_id)
 
@@ -176,24 +309,45 @@ def ec2_vol_id_to_uuid(ec2_id):
     return get_volume_uuid_from_int_id(ctxt, int_id)
 
 
+@_cached_uuid_to_id('instance')
 def get_int_id_from_instance_uuid(context, instance_uuid):
-    if instance_uuid is None:
-        return
     try:
         return db.get_ec2_instance_id_by_uuid(context, instance_uuid)
     except exception.NotFound:
         return db.ec2_instance_create(context, instance_uuid)['id']
 
 
+def get_int_ids_from_instance_uuids(context, instance_uuids):
+    """Get or create the ec2 instance ids of many instance uuids at once.
+
+    Returns a dict of ec2 instance ids by instance uuid.
+    """
+    ids = {}
+    for instance_uuid in set(instance_uuids) - set([None]):
+        int_id = ID_MAPPING_CACHE.get(('instance', 'id', instance_uuid))
+        if int_id is not None:
+            ids[instance_uuid] = int_id
+
+    missing = set(instance_uuids) - set(ids) - set([None])
+    found = db.get_ec2_instance_ids_by_uuids(context, list(missing))
+    for instance_uuid, int_id in found.items():
+        ID_MAPPING_CACHE.add_mapping('instance', instance_uuid, int_id)
+    ids.update(found)
+    for instance_uuid in missing - set(found):
+        ids[instance_uuid] = get_int_id_from_instance_uuid(context,
+                                                           instance_uuid)
+    return ids
+
+
+@_cached_uuid_to_id('volume')
 def get_int_id_from_volume_uuid(context, volume_uuid):
-    if volume_uuid is None:
-        return
     try:
         return db.get_ec2_volume_id_by_uuid(context, volume_uuid)
     except exception.NotFound:
         return db.ec2_volume_create(context, volume_uuid)['id']
 
 
+@_cached_id_to_uuid('volume')
 def get_volume_uuid_from_int_id(context, int_id):
     return db.get_volume_uuid_by_ec2_id(context, int_id)
 
@@ -207,15 +361,15 @@ def ec2_snap_id_to_uuid(ec2_id):
     return get_snapshot_uuid_from_int_id(ctxt, int_id)
 
 
+@_cached_uuid_to_id('snapshot')
 def get_int_id_from_snapshot_uuid(context, snapshot_uuid):
-    if snapshot_uuid is None:
-        return
     try:
         return db.get_ec2_snapshot_id_by_uuid(context, snapshot_uuid)
     except exception.NotFound:
         return db.ec2_snapshot_create(context, snapshot_uuid)['id']
 
 
+@_cached_id_to_uuid('snapshot')
 def get_snapshot_uuid_from_int_id(context, int_id):
     return db.get_snapshot_uuid_by_ec2_id(context, int_id)
 
@@ -267,6 +267,9 @@ class InstanceMetadata():
             raise KeyError(path)
 
         # right now, the only valid path is metadata.json
+        return self._get_openstack_metadata(version)
+
+    def _get_openstack_metadata(self, version):
         metadata = {}
         metadata['uuid'] = self.uuid
 
@@ -297,11 +300,7 @@ class InstanceMetadata():
         metadata['launch_index'] = self.instance['launch_index']
         metadata['availability_zone'] = self.availability_zone
 
-        data = {
-            MD_JSON_NAME: json.dumps(metadata),
-        }
-
-        return data[path]
+        return json.dumps(metadata)
 
     def _check_version(self, required, requested):
         return VERSIONS.index(requested) >= VERSIONS.index(required)
@@ -374,12 +373,69 @@ class InstanceMetadata():
         for (cid, content) in self.content.iteritems():
             yield ('%s/%s/%s' % ("openstack", CONTENT_DIR, cid), content)
 
+    def render(self):
+        """Render every document of the metadata tree.
+
+        The result only holds plain types, so it can be serialized and
+        served by RenderedMetadata without any further DB or RPC calls.
+        """
+        ec2 = {}
+        for version in VERSIONS:
+            ec2[version] = self.get_ec2_metadata(version)['meta-data']
+
+        openstack = {}
+        for version in OPENSTACK_VERSIONS:
+            openstack[version] = self._get_openstack_metadata(version)
+
+        return {'uuid': self.uuid,
+                'address': self.address,
+                'user_data': self.instance.get('user_data'),
+                'ec2': ec2,
+                'openstack': openstack,
+                'content': self.content}
+
+
+class RenderedMetadata(InstanceMetadata):
+    """Instance metadata served from documents built by render()."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.uuid = documents['uuid']
+        self.address = documents['address']
+        self.content = documents['content']
+
+        if documents['user_data'] is not None:
+            self.userdata_raw = base64.b64decode(documents['user_data'])
+        else:
+            self.userdata_raw = None
+
+    def get_ec2_metadata(self, version):
+        if version == "latest":
+            version = VERSIONS[-1]
+
+        if version not in VERSIONS:
+            raise InvalidMetadataVersion(version)
+
+        data = {'meta-data': self.documents['ec2'][version]}
+        if self.userdata_raw is not None:
+            data['user-data'] = self.userdata_raw
+
+        return data
+
+    def _get_openstack_metadata(self, version):
+        return self.documents['openstack'][version]
+
 
 def get_metadata_by_address(address):
     ctxt = context.get_admin_context()
     fixed_ip = network.API().get_fixed_ip_by_address(ctxt, address)
 
-    instance = db.instance_get_by_uuid(ctxt, fixed_ip['instance_uuid'])
+    return get_metadata_by_instance_uuid(fixed_ip['instance_uuid'], address)
+
+
+def get_metadata_by_instance_uuid(instance_uuid, address):
+    ctxt = context.get_admin_context()
+    instance = db.instance_get_by_uuid(ctxt, instance_uuid)
     return InstanceMetadata(instance, address)
 
 
@@ -23,6 +23,9 @@ import webob.dec
 import webob.exc
 
 from nova.api.metadata import base
+from nova.common import metadatacache
+from nova import context
+from nova import db
 from nova import exception
 from nova import flags
 from nova.openstack.common import log as logging
@@ -43,11 +46,15 @@ class MetadataRequestHandler(wsgi.Application):
 
     def __init__(self):
         self._cache = memcache.Client(FLAGS.memcached_servers, debug=0)
+        self._rendered = metadatacache.MetadataCache()
 
     def get_metadata(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
+        if FLAGS.metadata_prerender:
+            return self._get_rendered_metadata(address)
+
         cache_key = 'metadata-%s' % address
         data = self._cache.get(cache_key)
         if data:
@@ -62,6 +69,35 @@ class MetadataRequestHandler(wsgi.Application):
 
         return data
 
+    def _get_rendered_metadata(self, address):
+        # NOTE: Documents are looked up for the current owner of the fixed
+        #       ip, never for the address alone, as the ip may have been
+        #       given to another instance since they were rendered.  The
+        #       owner is read from the database, so serving a rendered
+        #       document needs no call to nova-network.
+        ctxt = context.get_admin_context()
+        try:
+            fixed_ip = db.fixed_ip_get_by_address(ctxt, address)
+        except exception.NotFound:
+            return None
+        instance_uuid = fixed_ip['instance_uuid']
+        if not instance_uuid:
+            return None
+
+        documents = self._rendered.get(address, instance_uuid)
+        if documents:
+            return base.RenderedMetadata(documents)
+
+        # Not rendered yet (or expired), render it once for this address
+        try:
+            data = base.get_metadata_by_instance_uuid(instance_uuid, address)
+        except exception.NotFound:
+            return None
+
+        self._rendered.add(data)
+
+        return data
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         remote_address = req.remote_addr
@@ -21,9 +21,11 @@ from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.compute import api as compute_api
+from nova.compute import utils as compute_utils
 from nova import db
 from nova import exception
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 
 
 LOG = logging.getLogger(__name__)
@@ -55,6 +57,12 @@ def make_hypervisor(elem, detail):
         service.set('host')
 
 
+def make_usage_period(elem):
+    elem.set('period_start')
+    for field in compute_utils.USAGE_HISTORY_FIELDS:
+        elem.set(field)
+
+
 class HypervisorIndexTemplate(xmlutil.TemplateBuilder):
     def construct(self):
         root = xmlutil.TemplateElement('hypervisors')
@@ -124,6 +132,30 @@ class HypervisorStatisticsTemplate(xmlutil.TemplateBuilder):
         return xmlutil.MasterTemplate(root, 1)
 
 
+class HypervisorHistoryTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('hypervisor', selector='hypervisor')
+        make_hypervisor(root, False)
+
+        history = xmlutil.SubTemplateElement(root, 'history')
+        period = xmlutil.SubTemplateElement(history, 'period',
+                                            selector='history')
+        make_usage_period(period)
+
+        return xmlutil.MasterTemplate(root, 1)
+
+
+class HypervisorStatisticsHistoryTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('hypervisor_statistics_history')
+        period = xmlutil.SubTemplateElement(root, 'period',
+                selector='hypervisor_statistics_history')
+        period.set('count')
+        make_usage_period(period)
+
+        return xmlutil.MasterTemplate(root, 1)
+
+
 class HypervisorsController(object):
     """The Hypervisors API controller for the OpenStack API."""
 
@@ -160,19 +192,41 @@ class HypervisorsController(object):
 
         return hyp_dict
 
+    def _view_usage_period(self, period, *fields):
+        period_dict = dict((field, period[field])
+                           for field in
+                           fields + compute_utils.USAGE_HISTORY_FIELDS)
+        period_dict['period_start'] = timeutils.isotime(
+                period['period_start'])
+        return period_dict
+
+    def _get_since(self, req):
+        """Return the time given by the since parameter, if any."""
+        since = req.GET.get('since')
+        if since is None:
+            return None
+        try:
+            since = timeutils.parse_isotime(since)
+        except ValueError:
+            msg = _("Invalid since value '%s'") % since
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        return timeutils.normalize_time(since).replace(tzinfo=None)
+
     @wsgi.serializers(xml=HypervisorIndexTemplate)
     def index(self, req):
         context = req.environ['nova.context']
         authorize(context)
         return dict(hypervisors=[self._view_hypervisor(hyp, False)
-                                 for hyp in db.compute_node_get_all(context)])
+                                 for hyp in db.compute_node_get_all(context,
+                                                        use_slave=True)])
 
     @wsgi.serializers(xml=HypervisorDetailTemplate)
     def detail(self, req):
         context = req.environ['nova.context']
         authorize(context)
         return dict(hypervisors=[self._view_hypervisor(hyp, True)
-                                 for hyp in db.compute_node_get_all(context)])
+                                 for hyp in db.compute_node_get_all(context,
+                                                        use_slave=True)])
 
     @wsgi.serializers(xml=HypervisorTemplate)
     def show(self, req, id):
@@ -239,6 +293,40 @@ class HypervisorsController(object):
         stats = db.compute_node_statistics(context)
         return dict(hypervisor_statistics=stats)
 
+    @wsgi.serializers(xml=HypervisorHistoryTemplate)
+    def history(self, req, id):
+        """Return the recent usage of a hypervisor, one entry per period
+        of compute_usage_history_interval seconds.
+        """
+        context = req.environ['nova.context']
+        authorize(context)
+        since = self._get_since(req)
+        try:
+            hyp = db.compute_node_get(context, int(id))
+        except (ValueError, exception.ComputeHostNotFound):
+            msg = _("Hypervisor with ID '%s' could not be found.") % id
+            raise webob.exc.HTTPNotFound(explanation=msg)
+
+        history = db.compute_node_usage_history_get(context, hyp['id'],
+                                                    since=since)
+        return dict(hypervisor=self._view_hypervisor(hyp, False,
+                history=[self._view_usage_period(period)
+                         for period in history]))
+
+    @wsgi.serializers(xml=HypervisorStatisticsHistoryTemplate)
+    def statistics_history(self, req):
+        """Return the recent usage of all hypervisors added up, one entry
+        per period of compute_usage_history_interval seconds.
+        """
+        context = req.environ['nova.context']
+        authorize(context)
+        since = self._get_since(req)
+        history = db.compute_node_usage_history_statistics(context,
+                                                           since=since)
+        return dict(hypervisor_statistics_history=[
+                self._view_usage_period(period, 'count')
+                for period in history])
+
 
 class Hypervisors(extensions.ExtensionDescriptor):
     """Admin-only hypervisor administration"""
@@ -252,9 +340,11 @@ class Hypervisors(extensions.ExtensionDescriptor):
         resources = [extensions.ResourceExtension('os-hypervisors',
                 HypervisorsController(),
                 collection_actions={'detail': 'GET',
-                                    'statistics': 'GET'},
+                                    'statistics': 'GET',
+                                    'statistics_history': 'GET'},
                 member_actions={'uptime': 'GET',
                                 'search': 'GET',
-                                'servers': 'GET'})]
+                                'servers': 'GET',
+                                'history': 'GET'})]
 
         return resources
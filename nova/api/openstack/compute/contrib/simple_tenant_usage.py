@@ -22,6 +22,8 @@ from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.compute import api
+from nova.compute import utils as compute_utils
+from nova import db
 from nova import exception
 from nova import flags
 from nova.openstack.common import timeutils
@@ -69,49 +71,67 @@ class SimpleTenantUsagesTemplate(xmlutil.TemplateBuilder):
 
 class SimpleTenantUsageController(object):
     def _hours_for(self, instance, period_start, period_stop):
-        launched_at = instance['launched_at']
-        terminated_at = instance['terminated_at']
-        if terminated_at is not None:
-            if not isinstance(terminated_at, datetime.datetime):
-                terminated_at = timeutils.parse_strtime(terminated_at,
-                                                        "%Y-%m-%d %H:%M:%S.%f")
-
-        if launched_at is not None:
-            if not isinstance(launched_at, datetime.datetime):
-                launched_at = timeutils.parse_strtime(launched_at,
-                                                      "%Y-%m-%d %H:%M:%S.%f")
-
-        if terminated_at and terminated_at < period_start:
-            return 0
-        # nothing if it started after the usage report ended
-        if launched_at and launched_at > period_stop:
-            return 0
-        if launched_at:
-            # if instance launched after period_started, don't charge for first
-            start = max(launched_at, period_start)
-            if terminated_at:
-                # if instance stopped before period_stop, don't charge after
-                stop = min(period_stop, terminated_at)
-            else:
-                # instance is still running, so charge them up to current time
-                stop = period_stop
-            dt = stop - start
-            seconds = (dt.days * 3600 * 24 + dt.seconds +
-                       dt.microseconds / 100000.0)
-
-            return seconds / 3600.0
-        else:
-            # instance hasn't launched, so no charge
-            return 0
+        return compute_utils.usage_hours(instance, period_start, period_stop)
 
     def _tenant_usages_for_period(self, context, period_start,
                                   period_stop, tenant_id=None, detailed=True):
+        if FLAGS.tenant_usage_rollup and not detailed:
+            return self._rolled_up_usages_for_period(context, period_start,
+                                                     period_stop, tenant_id)
+        return self._live_usages_for_period(context, period_start,
+                                            period_stop, tenant_id, detailed)
+
+    def _rolled_up_usages_for_period(self, context, period_start,
+                                     period_stop, tenant_id=None):
+        """Sum the rolled up days of a period and the rest of it live."""
+        rolled_up = db.tenant_usage_rolled_up_periods(context, period_start,
+                                                      period_stop)
+        usages = []
+        live_start = period_start
+        for (begin, end) in rolled_up:
+            if live_start < begin:
+                usages.extend(self._live_usages_for_period(context,
+                        live_start, begin, tenant_id, detailed=False))
+            live_start = end
+        if live_start < period_stop:
+            usages.extend(self._live_usages_for_period(context, live_start,
+                    period_stop, tenant_id, detailed=False))
+        if rolled_up:
+            usages.extend(
+                dict(tenant_id=totals['project_id'],
+                     total_local_gb_usage=totals['local_gb_usage'],
+                     total_vcpus_usage=totals['vcpus_usage'],
+                     total_memory_mb_usage=totals['memory_mb_usage'],
+                     total_hours=totals['hours'])
+                for totals in db.tenant_usage_buckets_get_totals(context,
+                        rolled_up[0][0], rolled_up[-1][1], tenant_id))
+
+        rval = {}
+        for usage in usages:
+            if not usage['tenant_id'] in rval:
+                rval[usage['tenant_id']] = dict(tenant_id=usage['tenant_id'],
+                                                total_local_gb_usage=0,
+                                                total_vcpus_usage=0,
+                                                total_memory_mb_usage=0,
+                                                total_hours=0,
+                                                start=period_start,
+                                                stop=period_stop)
+            summary = rval[usage['tenant_id']]
+            for key in ('total_local_gb_usage', 'total_vcpus_usage',
+                        'total_memory_mb_usage', 'total_hours'):
+                summary[key] += usage[key]
+
+        return rval.values()
+
+    def _live_usages_for_period(self, context, period_start, period_stop,
+                                tenant_id=None, detailed=True):
 
         compute_api = api.API()
         instances = compute_api.get_active_by_window(context,
                                                      period_start,
                                                      period_stop,
-                                                     tenant_id)
+                                                     tenant_id,
+                                                     use_slave=True)
         rval = {}
         flavors = {}
 
@@ -30,12 +30,14 @@ import webob.exc
 from nova.api.openstack.compute.views import limits as limits_views
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
+from nova import flags
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova import quota
 from nova import wsgi as base_wsgi
 
 
+FLAGS = flags.FLAGS
 QUOTAS = quota.QUOTAS
 
 
@@ -218,7 +220,8 @@ DEFAULT_LIMITS = [
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """
     Rate-limits requests passing through this middleware. All limit information
-    is stored in memory for this implementation.
+    is stored in memory for this implementation, unless the limiter used
+    shares it between processes, like `MemcacheLimiter`.
     """
 
     def __init__(self, application, limits=None, limiter=None, **kwargs):
@@ -383,6 +386,134 @@ class Limiter(object):
         return result
 
 
+class MemcacheLimiter(Limiter):
+    """
+    Rate-limit checking class which keeps the state of the limits in
+    memcache, so that it is shared by all the API workers talking to the
+    same memcached servers.
+
+    Uses memcached if the memcached_servers flag is set, otherwise it
+    uses a very simple in-process cache, which is private to each
+    limiter and so shares nothing.
+
+    The state of each limit is the water level and last request time of
+    its bucket, which leaks exactly like the one of `Limit` and is
+    updated atomically with gets/cas.  Limits of at least 40 requests
+    per second or minute are taken from in leases of several requests,
+    so most requests do not need a round trip to memcache.  The unused
+    part of an expired lease is given back to the bucket on the next
+    request; a lease is worth a few seconds of its limit, so the units
+    held by an idle worker leak away soon.
+    """
+
+    # Fraction of a limit's requests taken from memcache at once
+    lease_fraction = 0.05
+
+    # Longest limit unit for which requests are leased
+    lease_max_unit = PER_MINUTE
+
+    # Seconds after which unused leased requests are given back
+    lease_time = 1.0
+
+    # Number of attempts at updating a contended bucket
+    cas_attempts = 10
+
+    def __init__(self, limits, **kwargs):
+        """
+        Initialize the new `MemcacheLimiter`.
+
+        @param limits: List of `Limit` objects
+        """
+        super(MemcacheLimiter, self).__init__(limits, **kwargs)
+        if FLAGS.memcached_servers:
+            import memcache
+        else:
+            from nova.common import memorycache as memcache
+        self._cache = memcache.Client(FLAGS.memcached_servers,
+                                      debug=0, cache_cas=True)
+        self._leases = {}
+
+    def check_for_delay(self, verb, url, username=None):
+        """
+        Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        delays = []
+
+        for index, limit in enumerate(self.levels[username]):
+            if limit.verb != verb or not re.match(limit.regex, url):
+                continue
+            key = "limits-%s-%d" % (username, index)
+            delay = self._take(key, limit)
+            if delay:
+                delays.append((delay, limit.error_message))
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+    def _take(self, key, limit):
+        """
+        Take one request from a limit, using a leased request if one is
+        left and leasing more from memcache otherwise.
+
+        @return: Delay (in seconds) before a request is allowed, or None
+        """
+        now = limit._get_time()
+
+        leased, expires = self._leases.pop(key, (0, now))
+        if leased and now < expires:
+            self._leases[key] = (leased - 1, expires)
+            limit.remaining = max(limit.remaining - 1, 0)
+            limit.next_request = now
+            return
+
+        # The unused part of an expired lease goes back to the bucket
+        unused = leased * limit.request_value
+
+        lease = 1
+        if limit.unit <= self.lease_max_unit:
+            lease = max(int(limit.value * self.lease_fraction), 1)
+
+        for attempt in xrange(self.cas_attempts):
+            bucket = self._cache.gets(key)
+            level = 0
+            if bucket is not None:
+                water_level, last_request = bucket
+                level = max(water_level - (now - last_request) - unused, 0)
+
+            # Tolerate rounding errors of a fraction of a request
+            room = int((limit.capacity - level) / limit.request_value + 1e-3)
+
+            granted = min(lease, room)
+            if granted < 1:
+                difference = level + limit.request_value - limit.capacity
+                limit.next_request = now + difference
+                return difference
+
+            level += granted * limit.request_value
+            expiry = int(math.ceil(level)) + 1
+            if bucket is None:
+                stored = self._cache.add(key, (level, now), expiry)
+            else:
+                stored = self._cache.cas(key, (level, now), expiry)
+            if stored:
+                break
+        else:
+            # Fail open rather than rejecting requests nobody counted
+            return
+
+        self._leases[key] = (granted - 1, now + self.lease_time)
+
+        cap = limit.capacity
+        limit.remaining = math.floor(((cap - level) / cap) * limit.value)
+        limit.remaining += granted - 1
+        limit.next_request = now
+
+
 class WsgiLimiter(object):
     """
     Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
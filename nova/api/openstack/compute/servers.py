@@ -528,12 +528,21 @@ class Controller(wsgi.Controller):
             else:
                 search_opts['user_id'] = context.user_id
 
+        # The index view only shows the id, name and links of each server,
+        # so none of the instance's relationships need to be loaded.
+        if is_detail:
+            columns_to_join = None
+        else:
+            columns_to_join = []
+
         limit, marker = common.get_limit_and_marker(req)
         try:
             instance_list = self.compute_api.get_all(context,
-                                                     search_opts=search_opts,
-                                                     limit=limit,
-                                                     marker=marker)
+                                            search_opts=search_opts,
+                                            limit=limit,
+                                            marker=marker,
+                                            columns_to_join=columns_to_join,
+                                            use_slave=True)
         except exception.MarkerNotFound as e:
             msg = _('marker [%s] not found') % marker
             raise webob.exc.HTTPBadRequest(explanation=msg)
@@ -27,6 +27,7 @@ class Client(object):
     def __init__(self, *args, **kwargs):
         """Ignores the passed in args."""
         self.cache = {}
+        self.cas_ids = {}
 
     def get(self, key):
         """Retrieves the value for a key or None.
@@ -40,6 +41,20 @@ class Client(object):
 
         return self.cache.get(key, (0, None))[1]
 
+    def gets(self, key):
+        """Retrieves the value for a key, to be updated with cas()."""
+        value = self.get(key)
+        self.cas_ids[key] = self.cache.get(key)
+        return value
+
+    def cas(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key if it did not change since gets()."""
+        if key not in self.cas_ids:
+            return self.set(key, value, time, min_compress_len)
+        if self.cache.get(key) is not self.cas_ids.pop(key):
+            return False
+        return self.set(key, value, time, min_compress_len)
+
     def set(self, key, value, time=0, min_compress_len=0):
         """Sets the value for a key."""
         timeout = 0
@@ -54,6 +69,11 @@ class Client(object):
             return False
         return self.set(key, value, time, min_compress_len)
 
+    def delete(self, key):
+        """Deletes the value stored under key."""
+        self.cache.pop(key, None)
+        return True
+
     def incr(self, key, delta=1):
         """Increments the value for a key."""
         value = self.get(key)
@@ -0,0 +1,124 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of the pre-rendered metadata documents of instances."""
+
+from nova import flags
+from nova.openstack.common import cfg
+from nova.openstack.common import importutils
+from nova.openstack.common import jsonutils
+
+
+metadata_cache_opts = [
+    cfg.BoolOpt('metadata_prerender',
+                default=False,
+                help='Render the metadata of an instance when it is built '
+                     'or changed and serve it from the metadata cache. '
+                     'Set memcached_servers so that nova-compute and '
+                     'nova-network can invalidate the documents served by '
+                     'the metadata api'),
+    cfg.IntOpt('metadata_prerender_expiration',
+               default=60,
+               help='Time in seconds pre-rendered metadata is kept in the '
+                    'metadata cache, 0 to keep it until invalidated'),
+    ]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(metadata_cache_opts)
+
+# NOTE: The metadata api renders the documents; its renderer is loaded on
+#       first use, so nova-compute does not import the api.
+RENDERER = 'nova.api.metadata.base.InstanceMetadata'
+
+
+class MetadataCache(object):
+    """Pre-rendered metadata documents keyed by fixed ip and instance.
+
+    Documents are only served to the instance they were rendered for, so
+    a fixed ip given to another instance never serves the documents of
+    the previous one.  The fixed ips the documents of an instance were
+    rendered for are kept under the instance uuid, so they can be dropped
+    when the instance changes.
+
+    Uses memcached if the memcached_servers flag is set, otherwise it
+    uses a very simple in-process cache which other services can't
+    invalidate.
+    """
+
+    def __init__(self):
+        if FLAGS.memcached_servers:
+            import memcache
+        else:
+            from nova.common import memorycache as memcache
+        self._cache = memcache.Client(FLAGS.memcached_servers, debug=0)
+
+    def get(self, address, instance_uuid):
+        """Return the documents rendered for an instance at a fixed ip."""
+        data = self._cache.get(_address_cache_key(address, instance_uuid))
+        if not data:
+            return None
+
+        documents = jsonutils.loads(data)
+        if (documents['uuid'] != instance_uuid or
+            documents['address'] != address):
+            return None
+        return documents
+
+    def add(self, instance_md):
+        """Store the rendered documents of an InstanceMetadata."""
+        documents = instance_md.render()
+        expiration = FLAGS.metadata_prerender_expiration
+        self._cache.set(_address_cache_key(instance_md.address,
+                                           instance_md.uuid),
+                        jsonutils.dumps(documents), expiration)
+
+        uuid_key = _uuid_cache_key(instance_md.uuid)
+        addresses = self._cache.get(uuid_key) or []
+        if instance_md.address not in addresses:
+            addresses.append(instance_md.address)
+        self._cache.set(uuid_key, addresses, expiration)
+        return documents
+
+    def render(self, instance):
+        """Render the metadata of an instance for all its fixed ips."""
+        if not FLAGS.metadata_prerender:
+            return
+
+        self.invalidate(instance['uuid'])
+
+        instance_md = importutils.import_class(RENDERER)(instance)
+        for address in instance_md.ip_info['fixed_ips']:
+            instance_md.address = address
+            self.add(instance_md)
+
+    def invalidate(self, instance_uuid):
+        """Drop the rendered documents of an instance."""
+        if not FLAGS.metadata_prerender or not instance_uuid:
+            return
+
+        uuid_key = _uuid_cache_key(instance_uuid)
+        for address in self._cache.get(uuid_key) or []:
+            self._cache.delete(_address_cache_key(address, instance_uuid))
+        self._cache.delete(uuid_key)
+
+
+def _address_cache_key(address, instance_uuid):
+    return 'metadata-rendered-%s-%s' % (address, instance_uuid)
+
+
+def _uuid_cache_key(instance_uuid):
+    return 'metadata-addresses-%s' % instance_uuid
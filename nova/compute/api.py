@@ -29,6 +29,7 @@ import time
 import urllib
 
 from nova import block_device
+from nova.common import metadatacache
 from nova.compute import instance_types
 from nova.compute import power_state
 from nova.compute import rpcapi as compute_rpcapi
@@ -1005,10 +1006,12 @@ class API(base.Base):
 
     #NOTE(bcwaldon): no policy check here since it should be rolled in to
     # search_opts in get_all
-    def get_active_by_window(self, context, begin, end=None, project_id=None):
+    def get_active_by_window(self, context, begin, end=None, project_id=None,
+                             use_slave=False):
         """Get instances that were continuously active over a window."""
         return self.db.instance_get_active_by_window(context, begin, end,
-                                                     project_id)
+                                                     project_id,
+                                                     use_slave=use_slave)
 
     #NOTE(bcwaldon): this doesn't really belong in this class
     def get_instance_type(self, context, instance_type_id):
@@ -1031,7 +1034,8 @@ class API(base.Base):
         return inst
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
-                sort_dir='desc', limit=None, marker=None):
+                sort_dir='desc', limit=None, marker=None,
+                columns_to_join=None, use_slave=False):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1043,6 +1047,13 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        'columns_to_join' restricts the instance relationships which are
+        loaded; callers which only need the instance's own fields can pass
+        an empty list.  By default all of them are loaded.
+
+        If 'use_slave' is True the instances are read from the slave
+        database, if there is one, and may lag behind recent changes.
         """
 
         #TODO(bcwaldon): determine the best argument for target here
@@ -1108,9 +1119,10 @@ class API(base.Base):
                         return []
 
         inst_models = self._get_instances_by_filters(context, filters,
-                                                     sort_key, sort_dir,
-                                                     limit=limit,
-                                                     marker=marker)
+                                sort_key, sort_dir, limit=limit,
+                                marker=marker,
+                                columns_to_join=columns_to_join,
+                                use_slave=use_slave)
 
         # Convert the models to dictionaries
         instances = []
@@ -1125,7 +1137,9 @@ class API(base.Base):
     def _get_instances_by_filters(self, context, filters,
                                   sort_key, sort_dir,
                                   limit=None,
-                                  marker=None):
+                                  marker=None,
+                                  columns_to_join=None,
+                                  use_slave=False):
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
                                                                    filters)
@@ -1135,8 +1149,9 @@ class API(base.Base):
             filters['uuid'] = uuids
 
         return self.db.instance_get_all_by_filters(context, filters,
-                                                   sort_key, sort_dir,
-                                                   limit=limit, marker=marker)
+                                sort_key, sort_dir, limit=limit, marker=marker,
+                                columns_to_join=columns_to_join,
+                                use_slave=use_slave)
 
     @wrap_check_policy
     @check_instance_state(vm_state=[vm_states.ACTIVE, vm_states.STOPPED])
@@ -1995,6 +2010,7 @@ class AggregateAPI(base.Base):
     """Sub-set of the Compute Manager API for managing host aggregates."""
     def __init__(self, **kwargs):
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
+        self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
         super(AggregateAPI, self).__init__(**kwargs)
 
     def create_aggregate(self, context, aggregate_name, availability_zone):
@@ -2025,6 +2041,10 @@ class AggregateAPI(base.Base):
     def update_aggregate(self, context, aggregate_id, values):
         """Update the properties of an aggregate."""
         aggregate = self.db.aggregate_update(context, aggregate_id, values)
+        # NOTE: The schedulers only index the metadata of the aggregates by
+        #       host, which aggregate_update replaces if values has any.
+        if values.get('metadata') is not None:
+            self.scheduler_rpcapi.update_aggregates(context)
         return self._get_aggregate_info(context, aggregate)
 
     def update_aggregate_metadata(self, context, aggregate_id, metadata):
@@ -2041,6 +2061,7 @@ class AggregateAPI(base.Base):
                 except exception.AggregateMetadataNotFound, e:
                     LOG.warn(e.message)
         self.db.aggregate_metadata_add(context, aggregate_id, metadata)
+        self.scheduler_rpcapi.update_aggregates(context)
         return self.get_aggregate(context, aggregate_id)
 
     def delete_aggregate(self, context, aggregate_id):
@@ -2063,6 +2084,7 @@ class AggregateAPI(base.Base):
                     aggregate_id=aggregate_id,
                     reason='availability zone mismatch')
         self.db.aggregate_host_add(context, aggregate_id, host)
+        self.scheduler_rpcapi.update_aggregates(context)
         #NOTE(jogo): Send message to host to support resource pools
         self.compute_rpcapi.add_aggregate_host(context,
                 aggregate_id=aggregate_id, host_param=host, host=host)
@@ -2073,6 +2095,7 @@ class AggregateAPI(base.Base):
         # validates the host; ComputeHostNotFound is raised if invalid
         service = self.db.service_get_all_compute_by_host(context, host)[0]
         self.db.aggregate_host_delete(context, aggregate_id, host)
+        self.scheduler_rpcapi.update_aggregates(context)
         self.compute_rpcapi.remove_aggregate_host(context,
                 aggregate_id=aggregate_id, host_param=host, host=host)
         return self.get_aggregate(context, aggregate_id)
@@ -2188,6 +2211,7 @@ class SecurityGroupAPI(base.Base):
         super(SecurityGroupAPI, self).__init__(**kwargs)
         self.security_group_rpcapi = compute_rpcapi.SecurityGroupAPI()
         self.sgh = importutils.import_object(FLAGS.security_group_handler)
+        self.metadata_cache = metadatacache.MetadataCache()
 
     def validate_property(self, value, property, allowed):
         """
@@ -2375,6 +2399,7 @@ class SecurityGroupAPI(base.Base):
         self.db.instance_add_security_group(context.elevated(),
                                             instance_uuid,
                                             security_group['id'])
+        self.metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -2405,6 +2430,7 @@ class SecurityGroupAPI(base.Base):
         self.db.instance_remove_security_group(context.elevated(),
                                                instance_uuid,
                                                security_group['id'])
+        self.metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -44,6 +44,7 @@ import traceback
 from eventlet import greenthread
 
 from nova import block_device
+from nova.common import metadatacache
 from nova import compute
 from nova.compute import instance_types
 from nova.compute import power_state
@@ -72,6 +73,7 @@ from nova import quota
 from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import utils
 from nova.virt import driver
+from nova.virt import event as virtevent
 from nova import volume
 
 
@@ -139,6 +141,15 @@ compute_opts = [
                default=60,
                help="Number of seconds between instance info_cache self "
                         "healing updates"),
+    cfg.IntOpt("heal_instance_info_cache_max_age",
+               default=600,
+               help="Age in seconds after which an instance info_cache is "
+                    "considered stale and healed"),
+    cfg.IntOpt("sync_power_state_event_interval",
+               default=600,
+               help="Number of seconds between power state syncs when the "
+                    "virt driver emits lifecycle events. The sync is then "
+                    "only a safety net for missed events."),
     cfg.BoolOpt('instance_usage_audit',
                default=False,
                help="Generate periodic compute.instance.exists notifications"),
@@ -236,9 +247,11 @@ class ComputeManager(manager.SchedulerDependentManager):
         self._last_host_check = 0
         self._last_bw_usage_poll = 0
         self._last_info_cache_heal = 0
+        self._last_power_state_sync = 0
         self.compute_api = compute.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self.metadata_cache = metadatacache.MetadataCache()
 
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
@@ -267,6 +280,7 @@ class ComputeManager(manager.SchedulerDependentManager):
 
     def init_host(self):
         """Initialization for a standalone compute service."""
+        self.driver.register_event_listener(self.handle_events)
         self.driver.init_host(host=self.host)
         context = nova.context.get_admin_context()
         instances = self.db.instance_get_all_by_host(context, self.host)
@@ -334,6 +348,47 @@ class ComputeManager(manager.SchedulerDependentManager):
             if FLAGS.defer_iptables_apply:
                 self.driver.filter_defer_apply_off()
 
+    def handle_events(self, event):
+        if isinstance(event, virtevent.LifecycleEvent):
+            self.handle_lifecycle_event(event)
+        else:
+            LOG.debug(_("Ignoring event %s"), event)
+
+    def handle_lifecycle_event(self, event):
+        """Record the power state an instance moved to, as notified by the
+        virt driver."""
+        context = nova.context.get_admin_context()
+        try:
+            db_instance = self.db.instance_get_by_uuid(context, event.uuid)
+        except exception.InstanceNotFound:
+            LOG.debug(_("Lifecycle event for unknown instance %s, ignoring"),
+                      event.uuid)
+            return
+
+        vm_power_state = event.power_state
+        LOG.info(_("Lifecycle event: power state %(vm_power_state)s"),
+                 locals(), instance=db_instance)
+        if db_instance['host'] != self.host:
+            LOG.info(_("The instance is not on this host. Skip."),
+                     instance=db_instance)
+            return
+        if db_instance['task_state'] is not None:
+            LOG.info(_("The instance has a pending task. Skip."),
+                     instance=db_instance)
+            return
+
+        if vm_power_state != db_instance['power_state']:
+            updated = self.db.instance_power_states_update(
+                    context, self.host, {db_instance['uuid']: vm_power_state})
+            if not updated:
+                LOG.info(_("The instance has moved or has a pending task. "
+                           "Skip."), instance=db_instance)
+                return
+            db_instance['power_state'] = vm_power_state
+            notifications.send_update(context, db_instance, db_instance)
+        self._sync_instance_vm_state(context, db_instance,
+                                     db_instance['vm_state'], vm_power_state)
+
     def _get_power_state(self, context, instance):
         """Retrieve the power state for the given instance."""
         LOG.debug(_('Checking state'), instance=instance)
@@ -513,6 +568,7 @@ class ComputeManager(manager.SchedulerDependentManager):
                                   and not instance['access_ip_v6']):
                     self._update_access_ip(context, instance, network_info)
 
+                self._render_metadata(context, instance)
                 self._notify_about_instance_usage(context, instance,
                         "create.end", network_info=network_info,
                         extra_usage_info=extra_usage_info)
@@ -770,6 +826,21 @@ class ComputeManager(manager.SchedulerDependentManager):
                 system_metadata=system_metadata,
                 extra_usage_info=extra_usage_info, host=self.host)
 
+    def _render_metadata(self, context, instance):
+        """Push the rendered metadata of an instance to the metadata cache.
+
+        A failure here only means the metadata api renders it on demand.
+        """
+        if not FLAGS.metadata_prerender:
+            return
+
+        try:
+            instance = self.db.instance_get_by_uuid(context, instance['uuid'])
+            self.metadata_cache.render(instance)
+        except Exception:
+            LOG.exception(_('Failed to render instance metadata'),
+                          instance=instance)
+
     def _deallocate_network(self, context, instance):
         LOG.debug(_('Deallocating network for instance'), instance=instance)
         self.network_api.deallocate_for_instance(context, instance)
@@ -885,6 +956,7 @@ class ComputeManager(manager.SchedulerDependentManager):
         """Delete an instance on this host."""
         instance_uuid = instance['uuid']
         self.db.instance_info_cache_delete(context, instance_uuid)
+        self.metadata_cache.invalidate(instance_uuid)
         self._notify_about_instance_usage(context, instance, "delete.start")
         self._shutdown_instance(context, instance)
         # NOTE(vish): We have already deleted the instance, so we have
@@ -1077,6 +1149,7 @@ class ComputeManager(manager.SchedulerDependentManager):
                                                  REBUILD_SPAWNING,
                                              launched_at=timeutils.utcnow())
 
+            self._render_metadata(context, instance)
             self._notify_about_instance_usage(
                     context, instance, "rebuild.end",
                     network_info=network_info,
@@ -1388,6 +1461,7 @@ class ComputeManager(manager.SchedulerDependentManager):
         LOG.debug(_("Changing instance metadata according to %(diff)r") %
                   locals(), instance=instance)
         self.driver.change_instance_metadata(context, instance, diff)
+        self._render_metadata(context, instance)
 
     @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
     @wrap_instance_fault
@@ -1701,6 +1775,7 @@ class ComputeManager(manager.SchedulerDependentManager):
 
         network_info = self._inject_network_info(context, instance=instance)
         self.reset_network(context, instance)
+        self._render_metadata(context, instance)
 
         self._notify_about_instance_usage(
             context, instance, "create_ip.end", network_info=network_info)
@@ -1723,6 +1798,7 @@ class ComputeManager(manager.SchedulerDependentManager):
         network_info = self._inject_network_info(context,
                                                  instance=instance)
         self.reset_network(context, instance)
+        self._render_metadata(context, instance)
 
         self._notify_about_instance_usage(
             context, instance, "delete_ip.end", network_info=network_info)
@@ -2361,17 +2437,15 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.driver.destroy(instance, self._legacy_nw_info(network_info),
                             block_device_info)
 
-    @manager.periodic_task
+    @manager.periodic_task(concurrent=True)
     def _heal_instance_info_cache(self, context):
-        """Called periodically.  On every call, try to update the
-        info_cache's network information for another instance by
-        calling to the network manager.
-
-        This is implemented by keeping a cache of uuids of instances
-        that live on this host.  On each call, we pop one off of a
-        list, pull the DB record, and try the call to the network API.
-        If anything errors, we don't care.  It's possible the instance
-        has been deleted, etc.
+        """Called periodically.  On every call, update the info_cache's
+        network information of all the instances on this host whose cache
+        is older than heal_instance_info_cache_max_age seconds.
+
+        The network information of all the stale instances is fetched from
+        the network manager in one call.  If anything errors, the failure
+        is logged and the caches will be healed on a later call.
         """
         heal_interval = FLAGS.heal_instance_info_cache_interval
         if not heal_interval:
@@ -2381,38 +2455,29 @@ class ComputeManager(manager.SchedulerDependentManager):
             return
         self._last_info_cache_heal = curr_time
 
-        instance_uuids = getattr(self, '_instance_uuids_to_heal', None)
-        instance = None
+        max_age = FLAGS.heal_instance_info_cache_max_age
+        db_instances = self.db.instance_get_all_by_host(context, self.host)
+        stale_instances = []
+        for instance in db_instances:
+            info_cache = instance['info_cache'] or {}
+            updated_at = (info_cache.get('updated_at') or
+                          info_cache.get('created_at'))
+            if (updated_at is None or
+                timeutils.is_older_than(updated_at, max_age)):
+                stale_instances.append(instance)
+
+        if not stale_instances:
+            return
 
-        while not instance or instance['host'] != self.host:
-            if instance_uuids:
-                try:
-                    instance = self.db.instance_get_by_uuid(context,
-                        instance_uuids.pop(0))
-                except exception.InstanceNotFound:
-                    # Instance is gone.  Try to grab another.
-                    continue
-            else:
-                # No more in our copy of uuids.  Pull from the DB.
-                db_instances = self.db.instance_get_all_by_host(
-                        context, self.host)
-                if not db_instances:
-                    # None.. just return.
-                    return
-                instance = db_instances.pop(0)
-                instance_uuids = [inst['uuid'] for inst in db_instances]
-                self._instance_uuids_to_heal = instance_uuids
-
-        # We have an instance now and it's ours
         try:
-            # Call to network API to get instance info.. this will
-            # force an update to the instance's info_cache
-            self.network_api.get_instance_nw_info(context, instance)
-            LOG.debug(_('Updated the info_cache for instance'),
-                      instance=instance)
+            # Call to network API to get the instances' info.. this will
+            # force an update to their info_caches
+            self.network_api.get_instances_nw_info(context, stale_instances)
+            LOG.debug(_('Updated the info_cache for %d instances'),
+                      len(stale_instances))
         except Exception:
-            # We don't care about any failures
-            pass
+            LOG.exception(_('Failed to update the info_cache for %d '
+                            'instances'), len(stale_instances))
 
     @manager.periodic_task
     def _poll_rebooting_instances(self, context):
@@ -2487,7 +2552,8 @@ class ComputeManager(manager.SchedulerDependentManager):
                                                             context,
                                                             begin,
                                                             end,
-                                                            host=self.host)
+                                                            host=self.host,
+                                                            use_slave=True)
                 num_instances = len(instances)
                 errors = 0
                 successes = 0
@@ -2566,29 +2632,91 @@ class ComputeManager(manager.SchedulerDependentManager):
             capabilities['host_ip'] = FLAGS.my_ip
             self.update_service_capabilities(capabilities)
 
-    @manager.periodic_task(ticks_between_runs=10)
+    @manager.periodic_task(ticks_between_runs=10, concurrent=True)
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
-        To sync power state data we make a DB call to get the number of
-        virtual machines known by the hypervisor and if the number matches the
-        number of virtual machines known by the database, we proceed in a lazy
-        loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database. We call eventlet.sleep(0) after
-        each loop to allow the periodic task eventlet to do other work.
+        The power states of all the instances are listed from the
+        hypervisor in one call, then compared with the instances of the
+        host in the database.  Power states which changed are written in
+        one bulk update, skipping instances which got a pending task or
+        moved to another host in the meantime.  Drivers which can't list
+        power states fall back to a get_info() call per instance.
 
         If the instance is not found on the hypervisor, but is in the database,
         then a stop() API will be called on the instance.
+
+        Drivers which emit lifecycle events keep the power states up to
+        date themselves, so the sync then only runs every
+        sync_power_state_event_interval seconds to catch missed events.
         """
+        if self.driver.emits_lifecycle_events():
+            curr_time = time.time()
+            if (curr_time - self._last_power_state_sync <
+                    FLAGS.sync_power_state_event_interval):
+                return
+            self._last_power_state_sync = curr_time
+
+        try:
+            vm_power_states = self.driver.list_instance_power_states()
+        except NotImplementedError:
+            vm_power_states = None
+
+        # The hypervisor is listed first, so the database is at least as
+        # recent as the power states.
         db_instances = self.db.instance_get_all_by_host(context, self.host)
 
-        num_vm_instances = self.driver.get_num_instances()
+        if vm_power_states is None:
+            num_vm_instances = self.driver.get_num_instances()
+        else:
+            num_vm_instances = len(vm_power_states)
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
             LOG.warn(_("Found %(num_db_instances)s in the database and "
                        "%(num_vm_instances)s on the hypervisor.") % locals())
 
+        if vm_power_states is None:
+            self._sync_power_states_by_instance(context, db_instances)
+            return
+
+        synced = []
+        changed = {}
+        for db_instance in db_instances:
+            if db_instance['task_state'] is not None:
+                LOG.info(_("During sync_power_state the instance has a "
+                           "pending task. Skip."), instance=db_instance)
+                continue
+            vm_power_state = vm_power_states.get(db_instance['name'],
+                                                 power_state.NOSTATE)
+            synced.append((db_instance, vm_power_state))
+            if vm_power_state != db_instance['power_state']:
+                changed[db_instance['uuid']] = vm_power_state
+
+        updated = set()
+        if changed:
+            # power_state is always updated from hypervisor to db
+            updated = self.db.instance_power_states_update(context,
+                                                           self.host,
+                                                           changed)
+
+        for db_instance, vm_power_state in synced:
+            if db_instance['uuid'] in changed:
+                if db_instance['uuid'] not in updated:
+                    LOG.info(_("During sync_power_state the instance has "
+                               "moved or has a pending task. Skip."),
+                             instance=db_instance)
+                    continue
+                db_instance['power_state'] = vm_power_state
+                notifications.send_update(context, db_instance, db_instance)
+            self._sync_instance_vm_state(context, db_instance,
+                                         db_instance['vm_state'],
+                                         vm_power_state)
+
+    def _sync_power_states_by_instance(self, context, db_instances):
+        """Align power states one instance at a time, for drivers which
+        don't implement list_instance_power_states().
+        """
         for db_instance in db_instances:
             db_power_state = db_instance['power_state']
             if db_instance['task_state'] is not None:
@@ -2638,70 +2766,74 @@ class ComputeManager(manager.SchedulerDependentManager):
                 self._instance_update(context,
                                       db_instance['uuid'],
                                       power_state=vm_power_state)
-                db_power_state = vm_power_state
-            # Note(maoy): Now resolve the discrepancy between vm_state and
-            # vm_power_state. We go through all possible vm_states.
-            if vm_state in (vm_states.BUILDING,
-                            vm_states.RESCUED,
-                            vm_states.RESIZED,
-                            vm_states.SUSPENDED,
-                            vm_states.PAUSED,
-                            vm_states.ERROR):
-                # TODO(maoy): we ignore these vm_state for now.
-                pass
-            elif vm_state == vm_states.ACTIVE:
-                # The only rational power state should be RUNNING
-                if vm_power_state in (power_state.NOSTATE,
-                                       power_state.SHUTDOWN,
-                                       power_state.CRASHED):
-                    LOG.warn(_("Instance shutdown by itself. Calling "
-                               "the stop API."), instance=db_instance)
-                    try:
-                        # Note(maoy): here we call the API instead of
-                        # brutally updating the vm_state in the database
-                        # to allow all the hooks and checks to be performed.
-                        self.compute_api.stop(context, db_instance)
-                    except Exception:
-                        # Note(maoy): there is no need to propagate the error
-                        # because the same power_state will be retrieved next
-                        # time and retried.
-                        # For example, there might be another task scheduled.
-                        LOG.exception(_("error during stop() in "
-                                        "sync_power_state."),
-                                      instance=db_instance)
-                elif vm_power_state in (power_state.PAUSED,
-                                        power_state.SUSPENDED):
-                    LOG.warn(_("Instance is paused or suspended "
-                               "unexpectedly. Calling "
-                               "the stop API."), instance=db_instance)
-                    try:
-                        self.compute_api.stop(context, db_instance)
-                    except Exception:
-                        LOG.exception(_("error during stop() in "
-                                        "sync_power_state."),
-                                      instance=db_instance)
-            elif vm_state == vm_states.STOPPED:
-                if vm_power_state not in (power_state.NOSTATE,
-                                          power_state.SHUTDOWN,
-                                          power_state.CRASHED):
-                    LOG.warn(_("Instance is not stopped. Calling "
-                               "the stop API."), instance=db_instance)
-                    try:
-                        # Note(maoy): this assumes that the stop API is
-                        # idempotent.
-                        self.compute_api.stop(context, db_instance)
-                    except Exception:
-                        LOG.exception(_("error during stop() in "
-                                        "sync_power_state."),
-                                      instance=db_instance)
-            elif vm_state in (vm_states.SOFT_DELETED,
-                              vm_states.DELETED):
-                if vm_power_state not in (power_state.NOSTATE,
-                                          power_state.SHUTDOWN):
-                    # Note(maoy): this should be taken care of periodically in
-                    # _cleanup_running_deleted_instances().
-                    LOG.warn(_("Instance is not (soft-)deleted."),
-                             instance=db_instance)
+            self._sync_instance_vm_state(context, db_instance, vm_state,
+                                         vm_power_state)
+
+    def _sync_instance_vm_state(self, context, db_instance, vm_state,
+                                vm_power_state):
+        """Resolve the discrepancy between vm_state and vm_power_state."""
+        # Note(maoy): We go through all possible vm_states.
+        if vm_state in (vm_states.BUILDING,
+                        vm_states.RESCUED,
+                        vm_states.RESIZED,
+                        vm_states.SUSPENDED,
+                        vm_states.PAUSED,
+                        vm_states.ERROR):
+            # TODO(maoy): we ignore these vm_state for now.
+            pass
+        elif vm_state == vm_states.ACTIVE:
+            # The only rational power state should be RUNNING
+            if vm_power_state in (power_state.NOSTATE,
+                                   power_state.SHUTDOWN,
+                                   power_state.CRASHED):
+                LOG.warn(_("Instance shutdown by itself. Calling "
+                           "the stop API."), instance=db_instance)
+                try:
+                    # Note(maoy): here we call the API instead of
+                    # brutally updating the vm_state in the database
+                    # to allow all the hooks and checks to be performed.
+                    self.compute_api.stop(context, db_instance)
+                except Exception:
+                    # Note(maoy): there is no need to propagate the error
+                    # because the same power_state will be retrieved next
+                    # time and retried.
+                    # For example, there might be another task scheduled.
+                    LOG.exception(_("error during stop() in "
+                                    "sync_power_state."),
+                                  instance=db_instance)
+            elif vm_power_state in (power_state.PAUSED,
+                                    power_state.SUSPENDED):
+                LOG.warn(_("Instance is paused or suspended "
+                           "unexpectedly. Calling "
+                           "the stop API."), instance=db_instance)
+                try:
+                    self.compute_api.stop(context, db_instance)
+                except Exception:
+                    LOG.exception(_("error during stop() in "
+                                    "sync_power_state."),
+                                  instance=db_instance)
+        elif vm_state == vm_states.STOPPED:
+            if vm_power_state not in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN,
+                                      power_state.CRASHED):
+                LOG.warn(_("Instance is not stopped. Calling "
+                           "the stop API."), instance=db_instance)
+                try:
+                    # Note(maoy): this assumes that the stop API is
+                    # idempotent.
+                    self.compute_api.stop(context, db_instance)
+                except Exception:
+                    LOG.exception(_("error during stop() in "
+                                    "sync_power_state."),
+                                  instance=db_instance)
+        elif vm_state in (vm_states.SOFT_DELETED,
+                          vm_states.DELETED):
+            if vm_power_state not in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN):
+                # Note(maoy): this should be taken care of periodically in
+                # _cleanup_running_deleted_instances().
+                LOG.warn(_("Instance is not (soft-)deleted."),
+                         instance=db_instance)
 
     @manager.periodic_task
     def _reclaim_queued_deletes(self, context):
@@ -2734,7 +2866,8 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.resource_tracker.update_available_resource(context)
 
     @manager.periodic_task(
-        ticks_between_runs=FLAGS.running_deleted_instance_poll_interval)
+        ticks_between_runs=FLAGS.running_deleted_instance_poll_interval,
+        concurrent=True)
     def _cleanup_running_deleted_instances(self, context):
         """Cleanup any instances which are erroneously still running after
         having been deleted.
@@ -2845,7 +2978,8 @@ class ComputeManager(manager.SchedulerDependentManager):
                                     isinstance(e, exception.AggregateError))
 
     @manager.periodic_task(
-        ticks_between_runs=FLAGS.image_cache_manager_interval)
+        ticks_between_runs=FLAGS.image_cache_manager_interval,
+        concurrent=True)
     def _run_image_cache_manager_pass(self, context):
         """Run a single pass of the image cache manager."""
 
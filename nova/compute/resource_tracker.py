@@ -19,6 +19,9 @@ scheduler with useful information about availability through the ComputeNode
 model.
 """
 
+import datetime
+
+from nova.compute import utils as compute_utils
 from nova.compute import vm_states
 from nova import db
 from nova import exception
@@ -39,7 +42,14 @@ resource_tracker_opts = [
                help='How long, in seconds, before a resource claim times out'),
     cfg.StrOpt('compute_stats_class',
                default='nova.compute.stats.Stats',
-               help='Class that will manage stats for the local compute host')
+               help='Class that will manage stats for the local compute host'),
+    cfg.IntOpt('compute_usage_history_interval', default=300,
+               help='Length in seconds of the periods the usage history of '
+                    'the compute host is kept for.  Set to 0 to keep no '
+                    'history.'),
+    cfg.IntOpt('compute_usage_history_size', default=288,
+               help='Number of periods of usage history kept for the '
+                    'compute host'),
 ]
 
 FLAGS = flags.FLAGS
@@ -48,6 +58,8 @@ FLAGS.register_opts(resource_tracker_opts)
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
+EPOCH = datetime.datetime(1970, 1, 1)
+
 
 class Claim(object):
     """A declaration that a compute host operation will require free resources.
@@ -123,6 +135,8 @@ class ResourceTracker(object):
         self.claims = {}
         self.stats = importutils.import_object(FLAGS.compute_stats_class)
         self.tracked_instances = {}
+        # Usage last stored in the history, with its period_start
+        self.usage_history = None
 
     def resource_claim(self, context, instance_ref, limits=None):
         claim = self.begin_resource_claim(context, instance_ref, limits)
@@ -412,6 +426,31 @@ class ResourceTracker(object):
             self._update(context, resources, prune_stats=True)
             LOG.info(_('Compute_service record updated for %s ') % self.host)
 
+        self._update_usage_history(context)
+
+    def _update_usage_history(self, context):
+        """Record the usage of the compute node in the history slot of the
+        current period.  Within a period, the latest usage is kept.
+        """
+        interval = FLAGS.compute_usage_history_interval
+        size = FLAGS.compute_usage_history_size
+        if interval <= 0 or size <= 0:
+            return
+
+        seconds = utils.total_seconds(timeutils.utcnow() - EPOCH)
+        period = int(seconds) // interval
+        values = dict((field, self.compute_node.get(field))
+                      for field in compute_utils.USAGE_HISTORY_FIELDS)
+        values['period_start'] = EPOCH + datetime.timedelta(
+                seconds=period * interval)
+        if values == self.usage_history:
+            # Nothing changed since the last update in this period
+            return
+
+        db.compute_node_usage_history_update(context,
+                self.compute_node['id'], period % size, values)
+        self.usage_history = values
+
     def _purge_expired_claims(self):
         """Purge expired resource claims"""
         for claim_id in self.claims.keys():
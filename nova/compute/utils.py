@@ -16,6 +16,7 @@
 
 """Compute-related Utilities and helpers."""
 
+import datetime
 import re
 import string
 import traceback
@@ -29,11 +30,16 @@ from nova.network import model as network_model
 from nova import notifications
 from nova.openstack.common import log
 from nova.openstack.common.notifier import api as notifier_api
+from nova.openstack.common import timeutils
 from nova import utils
 
 FLAGS = flags.FLAGS
 LOG = log.getLogger(__name__)
 
+# The compute node fields kept in the usage history of compute nodes
+USAGE_HISTORY_FIELDS = ('vcpus', 'vcpus_used', 'memory_mb', 'memory_mb_used',
+                        'local_gb', 'local_gb_used', 'running_vms')
+
 
 def add_instance_fault_from_exc(context, instance_uuid, fault, exc_info=None):
     """Adds the specified fault to the database."""
@@ -222,3 +228,101 @@ def start_instance_usage_audit(context, begin, end, host, num_instances):
 def finish_instance_usage_audit(context, begin, end, host, errors, message):
     db.task_log_end_task(context, "instance_usage_audit", begin, end, host,
                          errors, message)
+
+
+def usage_hours(instance, period_start, period_stop):
+    """Return the hours an instance was launched for during a period."""
+    launched_at = instance['launched_at']
+    terminated_at = instance['terminated_at']
+    if terminated_at is not None:
+        if not isinstance(terminated_at, datetime.datetime):
+            terminated_at = timeutils.parse_strtime(terminated_at,
+                                                    "%Y-%m-%d %H:%M:%S.%f")
+
+    if launched_at is not None:
+        if not isinstance(launched_at, datetime.datetime):
+            launched_at = timeutils.parse_strtime(launched_at,
+                                                  "%Y-%m-%d %H:%M:%S.%f")
+
+    if terminated_at and terminated_at < period_start:
+        return 0
+    # nothing if it started after the usage report ended
+    if launched_at and launched_at > period_stop:
+        return 0
+    if launched_at:
+        # if instance launched after period_started, don't charge for first
+        start = max(launched_at, period_start)
+        if terminated_at:
+            # if instance stopped before period_stop, don't charge after
+            stop = min(period_stop, terminated_at)
+        else:
+            # instance is still running, so charge them up to current time
+            stop = period_stop
+        dt = stop - start
+        seconds = (dt.days * 3600 * 24 + dt.seconds +
+                   dt.microseconds / 100000.0)
+
+        return seconds / 3600.0
+    else:
+        # instance hasn't launched, so no charge
+        return 0
+
+
+def get_tenant_usage_buckets(context, begin, end):
+    """Sum the usage of each tenant and flavor between begin and end."""
+    # NOTE: Buckets are never recomputed, so read from the master rather
+    #       than freezing the replication lag of a slave into them.
+    instances = db.instance_get_active_by_window(context, begin, end)
+    buckets = {}
+    flavors = {}
+
+    for instance in instances:
+        flavor_id = instance['instance_type_id']
+        if flavor_id not in flavors:
+            try:
+                flavors[flavor_id] = instance_types.get_instance_type(
+                        flavor_id)
+            except exception.InstanceTypeNotFound:
+                # can't bill if there is no instance type
+                flavors[flavor_id] = None
+        flavor = flavors[flavor_id]
+        if not flavor:
+            continue
+
+        key = (instance['project_id'], flavor_id)
+        if key not in buckets:
+            buckets[key] = dict(project_id=instance['project_id'],
+                                instance_type_id=flavor_id, hours=0,
+                                local_gb_usage=0, vcpus_usage=0,
+                                memory_mb_usage=0)
+        bucket = buckets[key]
+        hours = usage_hours(instance, begin, end)
+        bucket['hours'] += hours
+        bucket['local_gb_usage'] += (flavor['root_gb'] +
+                                     flavor['ephemeral_gb']) * hours
+        bucket['vcpus_usage'] += flavor['vcpus'] * hours
+        bucket['memory_mb_usage'] += flavor['memory_mb'] * hours
+
+    return buckets.values()
+
+
+def roll_up_tenant_usage(context, before=None):
+    """Roll up the tenant usage of the past days not rolled up yet."""
+    end = (before or timeutils.utcnow()).replace(hour=0, minute=0, second=0,
+                                                 microsecond=0)
+    begin = end - datetime.timedelta(days=FLAGS.tenant_usage_rollup_days)
+    rolled_up = set(period_beginning for period_beginning, period_ending in
+                    db.tenant_usage_rolled_up_periods(context, begin, end))
+
+    day = begin
+    while day < end:
+        next_day = day + datetime.timedelta(days=1)
+        if day not in rolled_up:
+            buckets = get_tenant_usage_buckets(context, day, next_day)
+            try:
+                db.tenant_usage_buckets_create(context, day, next_day,
+                                               buckets)
+            except exception.TaskAlreadyRunning:
+                # Another scheduler rolled it up in the meantime
+                pass
+        day = next_day
@@ -143,6 +143,11 @@ def service_get_all_by_host(context, host):
     return IMPL.service_get_all_by_host(context, host)
 
 
+def service_get_all_by_hosts(context, hosts):
+    """Get all services for the given hosts."""
+    return IMPL.service_get_all_by_hosts(context, hosts)
+
+
 def service_get_all_compute_by_host(context, host):
     """Get all compute services for a given host."""
     return IMPL.service_get_all_compute_by_host(context, host)
@@ -193,9 +198,17 @@ def compute_node_get(context, compute_id):
     return IMPL.compute_node_get(context, compute_id)
 
 
-def compute_node_get_all(context):
-    """Get all computeNodes."""
-    return IMPL.compute_node_get_all(context)
+def compute_node_get_all(context, use_slave=False):
+    """Get all computeNodes.
+
+    If use_slave is True, read them from the slave database if there is one.
+    """
+    return IMPL.compute_node_get_all(context, use_slave=use_slave)
+
+
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get all computeNodes created, updated or deleted since a time."""
+    return IMPL.compute_node_get_all_changed_since(context, changes_since)
 
 
 def compute_node_search_by_hypervisor(context, hypervisor_match):
@@ -224,6 +237,23 @@ def compute_node_statistics(context):
     return IMPL.compute_node_statistics(context)
 
 
+def compute_node_usage_history_update(context, compute_id, slot, values):
+    """Store the usage of a computeNode in one of its history slots."""
+    return IMPL.compute_node_usage_history_update(context, compute_id, slot,
+                                                  values)
+
+
+def compute_node_usage_history_get(context, compute_id, since=None):
+    """Get the usage history of a computeNode, oldest period first."""
+    return IMPL.compute_node_usage_history_get(context, compute_id,
+                                               since=since)
+
+
+def compute_node_usage_history_statistics(context, since=None):
+    """Sum the usage history of all computeNodes by period."""
+    return IMPL.compute_node_usage_history_statistics(context, since=since)
+
+
 ###################
 
 
@@ -492,6 +522,14 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
 
 
+def fixed_ip_get_by_address_filter(context, address=None,
+                                   address_prefix=None):
+    """Get the allocated fixed ips and their floating ips where either
+    address is equal to address or starts with address_prefix."""
+    return IMPL.fixed_ip_get_by_address_filter(context, address=address,
+            address_prefix=address_prefix)
+
+
 def fixed_ip_get_network(context, address):
     """Get a network for a fixed ip by address."""
     return IMPL.fixed_ip_get_network(context, address)
@@ -529,6 +567,11 @@ def virtual_interface_get_by_instance(context, instance_id):
     return IMPL.virtual_interface_get_by_instance(context, instance_id)
 
 
+def virtual_interface_get_by_instances(context, instance_uuids):
+    """Gets all virtual_interfaces for many instances."""
+    return IMPL.virtual_interface_get_by_instances(context, instance_uuids)
+
+
 def virtual_interface_get_by_instance_and_network(context, instance_id,
                                                            network_id):
     """Gets all virtual interfaces for instance."""
@@ -587,33 +630,44 @@ def instance_get_all(context, columns_to_join=None):
 
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
-                                sort_dir='desc', limit=None, marker=None):
-    """Get all instances that match all filters."""
+                                sort_dir='desc', limit=None, marker=None,
+                                columns_to_join=None, use_slave=False):
+    """Get all instances that match all filters.
+
+    If use_slave is True, read them from the slave database if there is one.
+    """
     return IMPL.instance_get_all_by_filters(context, filters, sort_key,
                                             sort_dir, limit=limit,
-                                            marker=marker)
+                                            marker=marker,
+                                            columns_to_join=columns_to_join,
+                                            use_slave=use_slave)
 
 
 def instance_get_active_by_window(context, begin, end=None, project_id=None,
-                                  host=None):
+                                  host=None, use_slave=False):
     """Get instances active during a certain time window.
 
     Specifying a project_id will filter for a certain project.
     Specifying a host will filter for instances on a given compute host.
+    If use_slave is True, read them from the slave database if there is one.
     """
     return IMPL.instance_get_active_by_window(context, begin, end,
-                                              project_id, host)
+                                              project_id, host,
+                                              use_slave=use_slave)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
-                                         project_id=None, host=None):
+                                         project_id=None, host=None,
+                                         use_slave=False):
     """Get instances and joins active during a certain time window.
 
     Specifying a project_id will filter for a certain project.
     Specifying a host will filter for instances on a given compute host.
+    If use_slave is True, read them from the slave database if there is one.
     """
     return IMPL.instance_get_active_by_window_joined(context, begin, end,
-                                              project_id, host)
+                                              project_id, host,
+                                              use_slave=use_slave)
 
 
 def instance_get_all_by_project(context, project_id):
@@ -681,6 +735,16 @@ def instance_update_and_get_original(context, instance_uuid, values):
                                                  values)
 
 
+def instance_power_states_update(context, host, power_states):
+    """Set the power states of instances on host, given as a dict of
+    instance uuid to power state.
+
+    Instances which are no longer on host, or have a task pending, are
+    skipped.  Returns the set of the uuids of the instances updated.
+    """
+    return IMPL.instance_power_states_update(context, host, power_states)
+
+
 def instance_add_security_group(context, instance_id, security_group_id):
     """Associate the given security group with the given instance."""
     return IMPL.instance_add_security_group(context, instance_id,
@@ -1056,6 +1120,12 @@ def reservation_expire(context):
     return IMPL.reservation_expire(context)
 
 
+def quota_usage_refresh_stale(context, resources, until_refresh, max_age):
+    """Resync the quota usages which are due for a refresh."""
+    return IMPL.quota_usage_refresh_stale(context, resources, until_refresh,
+                                          max_age)
+
+
 ###################
 
 
@@ -1225,6 +1295,12 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                                                          instance_uuid)
 
 
+def block_device_mapping_get_all_by_instances(context, instance_uuids):
+    """Get all block device mapping belonging to the given instances"""
+    return IMPL.block_device_mapping_get_all_by_instances(context,
+                                                          instance_uuids)
+
+
 def block_device_mapping_destroy(context, bdm_id):
     """Destroy the block device mapping."""
     return IMPL.block_device_mapping_destroy(context, bdm_id)
@@ -1665,6 +1741,11 @@ def s3_image_get_by_uuid(context, image_uuid):
     return IMPL.s3_image_get_by_uuid(context, image_uuid)
 
 
+def s3_image_get_all_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids"""
+    return IMPL.s3_image_get_all_by_uuids(context, image_uuids)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid"""
     return IMPL.s3_image_create(context, image_uuid)
@@ -1791,6 +1872,14 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return IMPL.aggregate_metadata_get_by_host(context, host, key)
 
 
+def aggregate_metadata_get_all_by_host(context):
+    """Get the metadata of the aggregates of every host.
+
+    Returns a dictionary mapping each host in an aggregate with metadata to
+    a dictionary of sets, like aggregate_metadata_get_by_host()."""
+    return IMPL.aggregate_metadata_get_all_by_host(context)
+
+
 def aggregate_update(context, aggregate_id, values):
     """Update the attributes of an aggregates. If values contains a metadata
     key, it updates the aggregate metadata too."""
@@ -1858,6 +1947,11 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return IMPL.get_ec2_instance_id_by_uuid(context, instance_id)
 
 
+def get_ec2_instance_ids_by_uuids(context, instance_uuids):
+    """Get a dict of ec2 ids by uuid from instance_id_mappings table"""
+    return IMPL.get_ec2_instance_ids_by_uuids(context, instance_uuids)
+
+
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     """Get uuid through ec2 id from instance_id_mappings table"""
     return IMPL.get_instance_uuid_by_ec2_id(context, ec2_id)
@@ -1915,3 +2009,29 @@ def task_log_get(context, task_name, period_beginning,
                  period_ending, host, state=None, session=None):
     return IMPL.task_log_get(context, task_name, period_beginning,
                  period_ending, host, state, session)
+
+
+####################
+
+
+def tenant_usage_buckets_create(context, period_beginning, period_ending,
+                                buckets):
+    """Store the tenant usage buckets of a period and mark it rolled up.
+
+    Raises TaskAlreadyRunning if the period was already rolled up.
+    """
+    return IMPL.tenant_usage_buckets_create(context, period_beginning,
+                                            period_ending, buckets)
+
+
+def tenant_usage_rolled_up_periods(context, period_beginning, period_ending):
+    """Get the (beginning, ending) of the rolled up periods in a period."""
+    return IMPL.tenant_usage_rolled_up_periods(context, period_beginning,
+                                               period_ending)
+
+
+def tenant_usage_buckets_get_totals(context, period_beginning, period_ending,
+                                    project_id=None):
+    """Get the usage totals per tenant of the buckets in a period."""
+    return IMPL.tenant_usage_buckets_get_totals(context, period_beginning,
+                                                period_ending, project_id)
@@ -27,6 +27,7 @@ import warnings
 
 from nova import block_device
 from nova.common.sqlalchemyutils import paginate_query
+from nova.compute import utils as compute_utils
 from nova.compute import vm_states
 from nova import db
 from nova.db.sqlalchemy import models
@@ -195,8 +196,11 @@ def model_query(context, model, *args, **kwargs):
     :param project_only: if present and context is user-type, then restrict
             query to match the context's project_id. If set to 'allow_none',
             restriction includes project_id = None.
+    :param use_slave: if present and True, and no session is passed, read
+            from the slave database if there is one.
     """
-    session = kwargs.get('session') or get_session()
+    session = kwargs.get('session') or \
+            get_session(slave=kwargs.get('use_slave', False))
     read_deleted = kwargs.get('read_deleted') or context.read_deleted
     project_only = kwargs.get('project_only', False)
 
@@ -334,6 +338,12 @@ def service_destroy(context, service_id):
         if service_ref.topic == 'compute' and service_ref.compute_node:
             for c in service_ref.compute_node:
                 c.delete(session=session)
+                model_query(context, models.ComputeNodeUsageHistory,
+                            session=session).\
+                        filter_by(compute_node_id=c.id).\
+                        update({'deleted': True,
+                                'deleted_at': timeutils.utcnow()},
+                               synchronize_session=False)
 
 
 @require_admin_context
@@ -382,6 +392,15 @@ def service_get_all_by_host(context, host):
                 all()
 
 
+@require_admin_context
+def service_get_all_by_hosts(context, hosts):
+    if not hosts:
+        return []
+    return model_query(context, models.Service, read_deleted="no").\
+                filter(models.Service.host.in_(hosts)).\
+                all()
+
+
 @require_admin_context
 def service_get_all_compute_by_host(context, host):
     result = model_query(context, models.Service, read_deleted="no").\
@@ -500,10 +519,26 @@ def compute_node_get(context, compute_id, session=None):
 
 
 @require_admin_context
-def compute_node_get_all(context, session=None):
-    return model_query(context, models.ComputeNode, session=session).\
+def compute_node_get_all(context, session=None, use_slave=False):
+    return model_query(context, models.ComputeNode, session=session,
+                       use_slave=use_slave).\
+            options(joinedload('service')).\
+            options(joinedload('stats')).\
+            all()
+
+
+@require_admin_context
+def compute_node_get_all_changed_since(context, changes_since):
+    """Return compute nodes touched at or after changes_since.
+
+    Deleted compute nodes are included (with no service joined) so that
+    callers caching compute node state can notice their removal.
+    """
+    return model_query(context, models.ComputeNode, read_deleted="yes").\
             options(joinedload('service')).\
             options(joinedload('stats')).\
+            filter(or_(models.ComputeNode.updated_at >= changes_since,
+                       models.ComputeNode.created_at >= changes_since)).\
             all()
 
 
@@ -628,6 +663,65 @@ def compute_node_statistics(context):
                 for idx, field in enumerate(fields))
 
 
+@require_admin_context
+def compute_node_usage_history_update(context, compute_id, slot, values):
+    """Store the usage of a compute node in one of its history slots,
+    replacing the period the slot held before.
+    """
+    session = get_session()
+    with session.begin():
+        usage_ref = model_query(context, models.ComputeNodeUsageHistory,
+                                session=session, read_deleted="no").\
+                        filter_by(compute_node_id=compute_id).\
+                        filter_by(slot=slot).\
+                        first()
+        if not usage_ref:
+            usage_ref = models.ComputeNodeUsageHistory()
+            usage_ref.compute_node_id = compute_id
+            usage_ref.slot = slot
+        usage_ref.update(values)
+        usage_ref.save(session=session)
+    return usage_ref
+
+
+@require_admin_context
+def compute_node_usage_history_get(context, compute_id, since=None):
+    """Get the usage history of a compute node, oldest period first."""
+    query = model_query(context, models.ComputeNodeUsageHistory,
+                        read_deleted="no").\
+                    filter_by(compute_node_id=compute_id)
+    if since:
+        query = query.filter(
+                models.ComputeNodeUsageHistory.period_start >= since)
+    return query.order_by(
+            asc(models.ComputeNodeUsageHistory.period_start)).all()
+
+
+@require_admin_context
+def compute_node_usage_history_statistics(context, since=None):
+    """Sum the usage history of all compute nodes by period, oldest
+    period first.
+    """
+    history = models.ComputeNodeUsageHistory
+    query = model_query(context,
+                        history.period_start,
+                        func.count(history.id),
+                        *[func.sum(getattr(history, field))
+                          for field in compute_utils.USAGE_HISTORY_FIELDS],
+                        read_deleted="no")
+    if since:
+        query = query.filter(history.period_start >= since)
+    rows = query.group_by(history.period_start).\
+                 order_by(asc(history.period_start)).\
+                 all()
+
+    fields = ('count',) + compute_utils.USAGE_HISTORY_FIELDS
+    return [dict([('period_start', row[0])] +
+                 [(field, int(row[idx + 1] or 0))
+                  for idx, field in enumerate(fields)])
+            for row in rows]
+
+
 ###################
 
 
@@ -1248,6 +1342,59 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return result
 
 
+def _address_filter(query, column, address, address_prefix):
+    if address is not None:
+        query = query.filter(column == address)
+    if address_prefix:
+        query = query.filter(column.like('%s%%' % address_prefix))
+    return query
+
+
+@require_context
+def fixed_ip_get_by_address_filter(context, address=None,
+                                   address_prefix=None):
+    """Return one dict per allocated fixed ip and floating ip pair, with
+    fixed ips which have no floating ip paired with None.
+
+    Rows are only returned if the fixed or the floating address is equal
+    to address and starts with address_prefix, so the search uses the
+    address indexes instead of walking every virtual interface.
+    """
+    floating_join = and_(models.FloatingIp.fixed_ip_id == models.FixedIp.id,
+                         models.FloatingIp.deleted == False)
+    query = model_query(context, models.FixedIp.id,
+                        models.FixedIp.instance_uuid,
+                        models.FixedIp.address, models.FloatingIp.address,
+                        read_deleted="no").\
+                filter(models.FixedIp.instance_uuid != None).\
+                filter(models.FixedIp.virtual_interface_id != None)
+    fixed_query = query.outerjoin((models.FloatingIp, floating_join))
+
+    if address is None and not address_prefix:
+        queries = [fixed_query]
+    else:
+        # NOTE: An OR of the fixed and floating addresses can use neither
+        #       address index, so the fixed and the floating ips are
+        #       searched separately and their rows merged.
+        queries = [_address_filter(fixed_query, models.FixedIp.address,
+                                   address, address_prefix),
+                   _address_filter(query.join((models.FloatingIp,
+                                               floating_join)),
+                                   models.FloatingIp.address,
+                                   address, address_prefix)]
+
+    rows = {}
+    for rows_query in queries:
+        for row in rows_query.all():
+            rows[row[0], row[3]] = tuple(row)
+
+    return [{'instance_uuid': instance_uuid,
+             'address': fixed_address,
+             'floating_address': floating_address}
+            for fixed_ip_id, instance_uuid, fixed_address, floating_address
+            in sorted(rows.values())]
+
+
 @require_admin_context
 def fixed_ip_get_network(context, address):
     fixed_ip_ref = fixed_ip_get_by_address(context, address)
@@ -1339,6 +1486,21 @@ def virtual_interface_get_by_instance(context, instance_uuid):
     return vif_refs
 
 
+@require_context
+def virtual_interface_get_by_instances(context, instance_uuids):
+    """Gets all virtual interfaces for many instances, in one query.
+
+    :param instance_uuids: = uuids of the instances to retrieve vifs for
+    """
+    if not instance_uuids:
+        return []
+    vif_refs = _virtual_interface_query(context).\
+                       filter(models.VirtualInterface.instance_uuid.in_(
+                               instance_uuids)).\
+                       all()
+    return vif_refs
+
+
 @require_context
 def virtual_interface_get_by_instance_and_network(context, instance_uuid,
                                                   network_id):
@@ -1538,20 +1700,25 @@ def instance_get_all(context, columns_to_join=None):
 
 @require_context
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
-                                limit=None, marker=None):
+                                limit=None, marker=None,
+                                columns_to_join=None, use_slave=False):
     """Return instances that match all filters.  Deleted instances
     will be returned by default, unless there's a filter that says
-    otherwise"""
+    otherwise.
 
-    sort_fn = {'desc': desc, 'asc': asc}
+    Only the relationships named in columns_to_join are loaded; by
+    default these are info_cache, security_groups, metadata and
+    instance_type.  Results are paged on (sort_key, id), so the cost of
+    fetching a page does not depend on how deep into the list it is."""
 
-    session = get_session()
-    query_prefix = session.query(models.Instance).\
-            options(joinedload('info_cache')).\
-            options(joinedload('security_groups')).\
-            options(joinedload('metadata')).\
-            options(joinedload('instance_type')).\
-            order_by(sort_fn[sort_dir](getattr(models.Instance, sort_key)))
+    if columns_to_join is None:
+        columns_to_join = ['info_cache', 'security_groups',
+                           'metadata', 'instance_type']
+
+    session = get_session(slave=use_slave)
+    query_prefix = session.query(models.Instance)
+    for column in columns_to_join:
+        query_prefix = query_prefix.options(joinedload(column))
 
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
@@ -1594,13 +1761,13 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     query_prefix = regex_filter(query_prefix, models.Instance, filters)
 
     # paginate query
+    sort_keys = [sort_key]
+    if sort_key != 'id':
+        sort_keys.append('id')
     if marker is not None:
-        try:
-            marker = instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound as e:
-            raise exception.MarkerNotFound(marker)
+        marker = _instance_get_marker(context, marker, session=session)
     query_prefix = paginate_query(query_prefix, models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
+                           sort_keys,
                            marker=marker,
                            sort_dir=sort_dir)
 
@@ -1608,9 +1775,28 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     return instances
 
 
+def _instance_get_marker(context, marker, session=None):
+    """Look up the marker instance without any of its joins.
+
+    paginate_query only needs the sort key values of the marker, so
+    there is no point in loading its relationships.
+    """
+    result = model_query(context, models.Instance, session=session,
+                         project_only=True).\
+                filter_by(uuid=marker).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return result
+
+
 def regex_filter(query, model, filters):
     """Applies regular expression filtering to a query.
 
+    Expressions anchored with '^' are also matched on their literal
+    prefix with = or LIKE, so the database can use an index before it
+    evaluates the regular expression.
+
     Returns the updated query.
 
     :param query: query to apply filters to
@@ -1633,16 +1819,26 @@ def regex_filter(query, model, filters):
             continue
         if 'property' == type(column_attr).__name__:
             continue
-        query = query.filter(column_attr.op(db_regexp_op)(
-                                    str(filters[filter_name])))
+        value = str(filters[filter_name])
+        # Anchored expressions can be narrowed down by their literal
+        # prefix, which can use an index unlike the regexp operator.
+        if db_regexp_op != 'LIKE' and value.startswith('^'):
+            literal, rest = utils.regex_literal_prefix(value[1:])
+            if literal and rest == '$':
+                query = query.filter(column_attr == literal)
+                continue
+            if literal:
+                query = query.filter(column_attr.like('%s%%' % literal))
+        query = query.filter(column_attr.op(db_regexp_op)(value))
     return query
 
 
 @require_context
 def instance_get_active_by_window(context, begin, end=None,
-                                  project_id=None, host=None):
+                                  project_id=None, host=None,
+                                  use_slave=False):
     """Return instances that were active during window."""
-    session = get_session()
+    session = get_session(slave=use_slave)
     query = session.query(models.Instance)
 
     query = query.filter(or_(models.Instance.terminated_at == None,
@@ -1659,9 +1855,10 @@ def instance_get_active_by_window(context, begin, end=None,
 
 @require_admin_context
 def instance_get_active_by_window_joined(context, begin, end=None,
-                                         project_id=None, host=None):
+                                         project_id=None, host=None,
+                                         use_slave=False):
     """Return instances and joins that were active during window."""
-    session = get_session()
+    session = get_session(slave=use_slave)
     query = session.query(models.Instance)
 
     query = query.options(joinedload('info_cache')).\
@@ -1857,6 +2054,38 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False):
     return (old_instance_ref, instance_ref)
 
 
+@require_admin_context
+def instance_power_states_update(context, host, power_states):
+    """Set the power state of many instances, skipping instances which
+    moved off host or have a task pending.
+
+    :param power_states: dict of instance uuid to power state
+    :returns: set of the uuids of the instances updated
+    """
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Instance.uuid, session=session,
+                           read_deleted="no").\
+                        filter(models.Instance.uuid.in_(power_states.keys())).\
+                        filter_by(host=host).\
+                        filter_by(task_state=None).\
+                        with_lockmode('update').\
+                        all()
+        uuids = [row[0] for row in rows]
+
+        by_power_state = {}
+        for uuid in uuids:
+            by_power_state.setdefault(power_states[uuid], []).append(uuid)
+        for power_state, state_uuids in by_power_state.iteritems():
+            model_query(context, models.Instance, session=session,
+                        read_deleted="no").\
+                    filter(models.Instance.uuid.in_(state_uuids)).\
+                    update({'power_state': power_state,
+                            'updated_at': timeutils.utcnow()},
+                           synchronize_session=False)
+    return set(uuids)
+
+
 def instance_add_security_group(context, instance_uuid, security_group_id):
     """Associate the given security group with the given instance"""
     session = get_session()
@@ -2642,25 +2871,108 @@ def reservation_destroy(context, uuid):
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
 
-def _get_quota_usages(context, session):
+def _get_quota_usages(context, session, resources):
     # Broken out for testability
     rows = model_query(context, models.QuotaUsage,
                        read_deleted="no",
                        session=session).\
                    filter_by(project_id=context.project_id).\
+                   filter(models.QuotaUsage.resource.in_(resources)).\
                    with_lockmode('update').\
                    all()
     return dict((row.resource, row) for row in rows)
 
 
+class _QuotaReserveConflict(Exception):
+    """A conditional quota usage update matched no row."""
+    pass
+
+
+def _quota_reserve_fast(context, quotas, deltas, expire, max_age):
+    """Reserve the deltas with one conditional UPDATE per usage.
+
+    This covers the common case where the usages of all the resources
+    exist, are in sync, are not due for a refresh and have room for the
+    deltas.  No sync routine is run and only the usages of the resources
+    in deltas are touched.  Returns None if the caller has to fall back
+    to the locking path of quota_reserve.
+    """
+    elevated = context.elevated()
+    resources = deltas.keys()
+    session = get_session()
+    try:
+        with session.begin():
+            usages = model_query(context, models.QuotaUsage,
+                                 read_deleted="no", session=session).\
+                        filter_by(project_id=context.project_id).\
+                        filter(models.QuotaUsage.resource.in_(resources)).\
+                        all()
+            usages = dict((usage.resource, usage) for usage in usages)
+            if len(usages) != len(deltas):
+                return None
+            # Let quota_reserve warn about usages going negative
+            if any(delta + usages[resource].in_use < 0
+                   for resource, delta in deltas.items()):
+                return None
+
+            # NOTE(johannes): Update the usages in a fixed order, so this
+            # can't deadlock against the locking path or another reserve
+            reservations = []
+            for resource in sorted(deltas):
+                delta = deltas[resource]
+                usage = usages[resource]
+                query = model_query(context, models.QuotaUsage,
+                                    read_deleted="no", session=session).\
+                            filter_by(id=usage.id).\
+                            filter(models.QuotaUsage.in_use >= 0).\
+                            filter(or_(models.QuotaUsage.until_refresh == None,
+                                       models.QuotaUsage.until_refresh > 1))
+                if max_age:
+                    oldest = timeutils.utcnow() - \
+                            datetime.timedelta(seconds=max_age)
+                    query = query.filter(
+                            models.QuotaUsage.updated_at >= oldest)
+
+                # NOTE(Vek): As in quota_reserve, only positive deltas
+                #            are checked against the quota and reserved.
+                if delta >= 0 and quotas[resource] >= 0:
+                    total = models.QuotaUsage.in_use + \
+                            models.QuotaUsage.reserved
+                    query = query.filter(total + delta <= quotas[resource])
+                values = {'until_refresh':
+                              models.QuotaUsage.until_refresh - 1}
+                if delta > 0:
+                    values['reserved'] = models.QuotaUsage.reserved + delta
+
+                if not query.update(values, synchronize_session=False):
+                    raise _QuotaReserveConflict()
+
+                reservation = reservation_create(elevated,
+                                                 str(utils.gen_uuid()),
+                                                 usage,
+                                                 context.project_id,
+                                                 resource, delta, expire,
+                                                 session=session)
+                reservations.append(reservation.uuid)
+    except _QuotaReserveConflict:
+        return None
+
+    return reservations
+
+
 @require_context
 def quota_reserve(context, resources, quotas, deltas, expire,
                   until_refresh, max_age):
+    reservations = _quota_reserve_fast(context, quotas, deltas, expire,
+                                       max_age)
+    if reservations is not None:
+        return reservations
+
     elevated = context.elevated()
     session = get_session()
     with session.begin():
-        # Get the current usages
-        usages = _get_quota_usages(context, session)
+        # Get the current usages of the resources being reserved
+        usages = _get_quota_usages(context, session, deltas.keys())
 
         # Handle usage refresh
         work = set(deltas.keys())
@@ -2695,6 +3007,10 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 sync = resources[resource].sync
 
                 updates = sync(elevated, context.project_id, session)
+                missing = [res for res in updates if res not in usages]
+                if missing:
+                    usages.update(_get_quota_usages(context, session,
+                                                    missing))
                 for res, in_use in updates.items():
                     # Make sure we have a destination for the usage!
                     if res not in usages:
@@ -2785,6 +3101,64 @@ def quota_reserve(context, resources, quotas, deltas, expire,
     return reservations
 
 
+@require_admin_context
+def quota_usage_refresh_stale(context, resources, until_refresh, max_age):
+    """Resync the quota usages which are due for a refresh.
+
+    These are the usages which quota_reserve would resync inline, with
+    the quota usage rows locked, before it could reserve anything.
+    """
+    due = [models.QuotaUsage.in_use < 0,
+           models.QuotaUsage.until_refresh <= 1]
+    if max_age:
+        oldest = timeutils.utcnow() - datetime.timedelta(seconds=max_age)
+        due.append(models.QuotaUsage.updated_at < oldest)
+
+    stale = collections.defaultdict(set)
+    for project_id, resource in model_query(context,
+            models.QuotaUsage.project_id, models.QuotaUsage.resource,
+            read_deleted="no").filter(or_(*due)).all():
+        if getattr(resources.get(resource), 'sync', None):
+            stale[project_id].add(resource)
+
+    for project_id, stale_resources in stale.items():
+        session = get_session()
+        with session.begin():
+            usages = model_query(context, models.QuotaUsage,
+                                 read_deleted="no", session=session).\
+                        filter_by(project_id=project_id).\
+                        with_lockmode('update').\
+                        all()
+            usages = dict((usage.resource, usage) for usage in usages)
+
+            while stale_resources:
+                sync = resources[stale_resources.pop()].sync
+                updates = sync(context, project_id, session)
+                for res, in_use in updates.items():
+                    stale_resources.discard(res)
+                    if res in usages:
+                        usages[res].in_use = in_use
+                        usages[res].until_refresh = until_refresh or None
+                        # Nothing is written if in_use did not change,
+                        # so touch the row to take it out of max_age
+                        usages[res].updated_at = timeutils.utcnow()
+                        usages[res].save(session=session)
+
+
+def _quota_reservation_resources(session, context, reservations):
+    """Return the resources of the listed reservations."""
+
+    # NOTE(johannes): This doesn't lock the reservations, so the lock on
+    # the quota usages is still acquired first.
+    rows = model_query(context, models.Reservation.resource,
+                       read_deleted="no",
+                       session=session).\
+                   filter(models.Reservation.uuid.in_(reservations)).\
+                   distinct().\
+                   all()
+    return [row[0] for row in rows]
+
+
 def _quota_reservations(session, context, reservations):
     """Return the relevant reservations."""
 
@@ -2801,7 +3175,9 @@ def _quota_reservations(session, context, reservations):
 def reservation_commit(context, reservations):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session)
+        resources = _quota_reservation_resources(session, context,
+                                                 reservations)
+        usages = _get_quota_usages(context, session, resources)
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -2819,7 +3195,9 @@ def reservation_commit(context, reservations):
 def reservation_rollback(context, reservations):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session)
+        resources = _quota_reservation_resources(session, context,
+                                                 reservations)
+        usages = _get_quota_usages(context, session, resources)
 
         for reservation in _quota_reservations(session, context, reservations):
             usage = usages[reservation.resource]
@@ -3357,6 +3735,16 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instances(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                        instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_destroy(context, bdm_id):
     session = get_session()
@@ -4625,6 +5013,15 @@ def s3_image_get_by_uuid(context, image_uuid):
     return result
 
 
+def s3_image_get_all_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids"""
+    if not image_uuids:
+        return []
+    return model_query(context, models.S3Image, read_deleted="yes").\
+                 filter(models.S3Image.uuid.in_(image_uuids)).\
+                 all()
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid"""
     try:
@@ -4911,6 +5308,26 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return metadata
 
 
+@require_admin_context
+def aggregate_metadata_get_all_by_host(context):
+    rows = get_session().query(models.AggregateHost.host,
+                               models.AggregateMetadata.key,
+                               models.AggregateMetadata.value).\
+            filter(models.AggregateHost.aggregate_id ==
+                   models.Aggregate.id).\
+            filter(models.AggregateMetadata.aggregate_id ==
+                   models.Aggregate.id).\
+            filter(models.Aggregate.deleted == False).\
+            filter(models.AggregateHost.deleted == False).\
+            filter(models.AggregateMetadata.deleted == False).\
+            all()
+    metadata = {}
+    for host, key, value in rows:
+        metadata.setdefault(host, collections.defaultdict(set))[key].add(
+                value)
+    return metadata
+
+
 @require_admin_context
 def aggregate_update(context, aggregate_id, values):
     session = get_session()
@@ -5149,6 +5566,17 @@ def get_ec2_instance_id_by_uuid(context, instance_id, session=None):
     return result['id']
 
 
+@require_context
+def get_ec2_instance_ids_by_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return {}
+    rows = _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.uuid.in_(instance_uuids)).\
+                    all()
+
+    return dict((row['uuid'], row['id']) for row in rows)
+
+
 @require_context
 def get_instance_uuid_by_ec2_id(context, ec2_id, session=None):
     result = _ec2_instance_get_query(context,
@@ -5251,3 +5679,81 @@ def task_log_end_task(context, task_name,
         task.errors = errors
         task.save(session=session)
     return task
+
+
+##################
+
+
+TENANT_USAGE_ROLLUP = 'tenant_usage_rollup'
+# NOTE: The rollup is not done by any particular host, but task_log.host
+#       can't be NULL and is part of the unique key of task_log.
+TENANT_USAGE_ROLLUP_HOST = ''
+
+
+@require_admin_context
+def tenant_usage_buckets_create(context, period_beginning, period_ending,
+                                buckets):
+    session = get_session()
+    with session.begin():
+        # NOTE: The period is recorded as rolled up in the same transaction
+        #       as its buckets, so the buckets of a period are never seen
+        #       half written.  The task log row goes in first: the unique
+        #       key of task_log makes a concurrent rollup of the same
+        #       period wait for this one and then fail here.
+        task = models.TaskLog()
+        task.task_name = TENANT_USAGE_ROLLUP
+        task.host = TENANT_USAGE_ROLLUP_HOST
+        task.period_beginning = str(period_beginning)
+        task.period_ending = str(period_ending)
+        task.state = "DONE"
+        task.task_items = len(buckets)
+        task.message = "Tenant usage rolled up"
+        try:
+            task.save(session=session)
+        except (exception.Duplicate, IntegrityError):
+            raise exception.TaskAlreadyRunning(task_name=TENANT_USAGE_ROLLUP,
+                                               host=TENANT_USAGE_ROLLUP_HOST)
+
+        for values in buckets:
+            bucket = models.TenantUsageBucket()
+            bucket.update(values)
+            bucket.period_beginning = period_beginning
+            bucket.period_ending = period_ending
+            bucket.save(session=session)
+
+
+@require_admin_context
+def tenant_usage_rolled_up_periods(context, period_beginning, period_ending):
+    rows = model_query(context, models.TaskLog).\
+                filter_by(task_name=TENANT_USAGE_ROLLUP).\
+                filter_by(host=TENANT_USAGE_ROLLUP_HOST).\
+                filter(models.TaskLog.period_beginning >=
+                       str(period_beginning)).\
+                filter(models.TaskLog.period_ending <= str(period_ending)).\
+                order_by(asc(models.TaskLog.period_beginning)).\
+                all()
+
+    return [(timeutils.parse_strtime(row.period_beginning,
+                                     "%Y-%m-%d %H:%M:%S"),
+             timeutils.parse_strtime(row.period_ending, "%Y-%m-%d %H:%M:%S"))
+            for row in rows]
+
+
+@require_admin_context
+def tenant_usage_buckets_get_totals(context, period_beginning, period_ending,
+                                    project_id=None):
+    bucket = models.TenantUsageBucket
+    query = model_query(context, bucket.project_id,
+                        func.sum(bucket.hours),
+                        func.sum(bucket.local_gb_usage),
+                        func.sum(bucket.vcpus_usage),
+                        func.sum(bucket.memory_mb_usage),
+                        read_deleted="no").\
+                filter(bucket.period_beginning >= period_beginning).\
+                filter(bucket.period_ending <= period_ending)
+    if project_id:
+        query = query.filter_by(project_id=project_id)
+
+    return [dict(project_id=row[0], hours=row[1], local_gb_usage=row[2],
+                 vcpus_usage=row[3], memory_mb_usage=row[4])
+            for row in query.group_by(bucket.project_id).all()]
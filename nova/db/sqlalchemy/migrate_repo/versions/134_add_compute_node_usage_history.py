@@ -0,0 +1,75 @@
+# Copyright 2012 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer
+from sqlalchemy import MetaData, Table
+
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    # Needed for the foreign key
+    Table('compute_nodes', meta, autoload=True)
+
+    # New table.
+    compute_node_usage_history = Table('compute_node_usage_history', meta,
+        Column('created_at', DateTime(timezone=False)),
+        Column('updated_at', DateTime(timezone=False)),
+        Column('deleted_at', DateTime(timezone=False)),
+        Column('deleted', Boolean(), default=False),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('compute_node_id',
+                Integer,
+                ForeignKey('compute_nodes.id'),
+                nullable=False),
+        Column('slot', Integer, nullable=False),
+        Column('period_start', DateTime(timezone=False), nullable=False),
+        Column('vcpus', Integer),
+        Column('vcpus_used', Integer),
+        Column('memory_mb', Integer),
+        Column('memory_mb_used', Integer),
+        Column('local_gb', Integer),
+        Column('local_gb_used', Integer),
+        Column('running_vms', Integer),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8'
+        )
+
+    try:
+        compute_node_usage_history.create()
+    except Exception:
+        LOG.error(_("Table |%s| not created!"),
+                  repr(compute_node_usage_history))
+        raise
+
+    Index('compute_node_usage_history_node_slot_idx',
+          compute_node_usage_history.c.compute_node_id,
+          compute_node_usage_history.c.slot,
+          unique=True).create(migrate_engine)
+    Index('compute_node_usage_history_period_start_idx',
+          compute_node_usage_history.c.period_start).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    compute_node_usage_history = Table('compute_node_usage_history', meta,
+                                       autoload=True)
+    compute_node_usage_history.drop()
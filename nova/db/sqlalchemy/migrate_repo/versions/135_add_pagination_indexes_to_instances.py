@@ -0,0 +1,60 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+from sqlalchemy.exc import IntegrityError
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    t = Table('instances', meta, autoload=True)
+
+    # Based on instance_get_all_by_filters paging on (created_at, id)
+    # from: nova/db/sqlalchemy/api.py
+    i = Index('instances_deleted_created_at_id_idx',
+              t.c.deleted, t.c.created_at, t.c.id)
+    try:
+        i.create(migrate_engine)
+    except IntegrityError:
+        pass
+
+    # Based on instance_get_all_by_filters paging on (created_at, id)
+    # within a project
+    # from: nova/db/sqlalchemy/api.py
+    i = Index('instances_project_id_deleted_created_at_id_idx',
+              t.c.project_id, t.c.deleted, t.c.created_at, t.c.id)
+    try:
+        i.create(migrate_engine)
+    except IntegrityError:
+        pass
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    t = Table('instances', meta, autoload=True)
+
+    i = Index('instances_deleted_created_at_id_idx',
+              t.c.deleted, t.c.created_at, t.c.id)
+    i.drop(migrate_engine)
+
+    i = Index('instances_project_id_deleted_created_at_id_idx',
+              t.c.project_id, t.c.deleted, t.c.created_at, t.c.id)
+    i.drop(migrate_engine)
@@ -0,0 +1,62 @@
+# Copyright 2012 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer
+from sqlalchemy import MetaData, String, Table
+
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    # New table.
+    tenant_usage_buckets = Table('tenant_usage_buckets', meta,
+        Column('created_at', DateTime(timezone=False)),
+        Column('updated_at', DateTime(timezone=False)),
+        Column('deleted_at', DateTime(timezone=False)),
+        Column('deleted', Boolean(), default=False),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('period_beginning', DateTime(timezone=False), nullable=False),
+        Column('period_ending', DateTime(timezone=False), nullable=False),
+        Column('project_id', String(length=255)),
+        Column('instance_type_id', Integer),
+        Column('hours', Float),
+        Column('local_gb_usage', Float),
+        Column('vcpus_usage', Float),
+        Column('memory_mb_usage', Float),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8'
+        )
+
+    try:
+        tenant_usage_buckets.create()
+    except Exception:
+        LOG.error(_("Table |%s| not created!"), repr(tenant_usage_buckets))
+        raise
+
+    Index('tenant_usage_buckets_period_project_idx',
+          tenant_usage_buckets.c.period_beginning,
+          tenant_usage_buckets.c.project_id).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    tenant_usage_buckets = Table('tenant_usage_buckets', meta, autoload=True)
+    tenant_usage_buckets.drop()
@@ -0,0 +1,39 @@
+# Copyright 2012 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from migrate.changeset import UniqueConstraint
+from sqlalchemy import MetaData, Table
+
+
+UNIQUE_NAME = 'task_log_task_name_host_period_key'
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    task_log = Table('task_log', meta, autoload=True)
+    UniqueConstraint('task_name', 'host', 'period_beginning',
+                     'period_ending', name=UNIQUE_NAME,
+                     table=task_log).create()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    task_log = Table('task_log', meta, autoload=True)
+    UniqueConstraint('task_name', 'host', 'period_beginning',
+                     'period_ending', name=UNIQUE_NAME,
+                     table=task_log).drop()
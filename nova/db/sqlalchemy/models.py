@@ -181,6 +181,28 @@ class ComputeNodeStat(BASE, NovaBase):
         return "{%d: %s = %s}" % (self.compute_node_id, self.key, self.value)
 
 
+class ComputeNodeUsageHistory(BASE, NovaBase):
+    """Usage of a compute host during a sampling period.
+
+    Each host has a fixed number of slots, reused in turn as periods pass,
+    so the table holds a ring buffer of recent usage per host.
+    """
+    __tablename__ = 'compute_node_usage_history'
+    id = Column(Integer, primary_key=True)
+    compute_node_id = Column(Integer, ForeignKey('compute_nodes.id'),
+                             nullable=False)
+    slot = Column(Integer, nullable=False)
+    period_start = Column(DateTime, nullable=False)
+
+    vcpus = Column(Integer)
+    vcpus_used = Column(Integer)
+    memory_mb = Column(Integer)
+    memory_mb_used = Column(Integer)
+    local_gb = Column(Integer)
+    local_gb_used = Column(Integer)
+    running_vms = Column(Integer)
+
+
 class Certificate(BASE, NovaBase):
     """Represents a x509 certificate"""
     __tablename__ = 'certificates'
@@ -1007,6 +1029,10 @@ class InstanceIdMapping(BASE, NovaBase):
 class TaskLog(BASE, NovaBase):
     """Audit log for background periodic tasks"""
     __tablename__ = 'task_log'
+    __table_args__ = (schema.UniqueConstraint("task_name", "host",
+                                              "period_beginning",
+                                              "period_ending"),
+                      {'mysql_engine': 'InnoDB'})
     id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
     task_name = Column(String(255), nullable=False)
     state = Column(String(255), nullable=False)
@@ -1016,3 +1042,18 @@ class TaskLog(BASE, NovaBase):
     message = Column(String(255), nullable=False)
     task_items = Column(Integer(), default=0)
     errors = Column(Integer(), default=0)
+
+
+class TenantUsageBucket(BASE, NovaBase):
+    """Usage of one flavor by one tenant during a rolled up period"""
+    __tablename__ = 'tenant_usage_buckets'
+    id = Column(Integer, primary_key=True)
+    period_beginning = Column(DateTime, nullable=False)
+    period_ending = Column(DateTime, nullable=False)
+    project_id = Column(String(255))
+    instance_type_id = Column(Integer)
+
+    hours = Column(Float)
+    local_gb_usage = Column(Float)
+    vcpus_usage = Column(Float)
+    memory_mb_usage = Column(Float)
@@ -37,17 +37,30 @@ LOG = logging.getLogger(__name__)
 
 _ENGINE = None
 _MAKER = None
+_SLAVE_ENGINE = None
+_SLAVE_MAKER = None
 
 
-def get_session(autocommit=True, expire_on_commit=False):
-    """Return a SQLAlchemy session."""
-    global _MAKER
+def get_session(autocommit=True, expire_on_commit=False, slave=False):
+    """Return a SQLAlchemy session.
 
-    if _MAKER is None:
-        engine = get_engine()
-        _MAKER = get_maker(engine, autocommit, expire_on_commit)
-
-    session = _MAKER()
+    If slave is True and sql_slave_connection is set, the session reads
+    from the slave database.  It must then only be used for reads.
+    """
+    global _MAKER, _SLAVE_MAKER
+
+    if slave and FLAGS.sql_slave_connection:
+        if _SLAVE_MAKER is None:
+            engine = get_engine(slave=True)
+            _SLAVE_MAKER = get_maker(engine, autocommit, expire_on_commit)
+        maker = _SLAVE_MAKER
+    else:
+        if _MAKER is None:
+            engine = get_engine()
+            _MAKER = get_maker(engine, autocommit, expire_on_commit)
+        maker = _MAKER
+
+    session = maker()
     session.query = nova.exception.wrap_db_error(session.query)
     session.flush = nova.exception.wrap_db_error(session.flush)
     return session
@@ -106,74 +119,89 @@ def is_db_connection_error(args):
     return False
 
 
-def get_engine():
-    """Return a SQLAlchemy engine."""
-    global _ENGINE
+def get_engine(slave=False):
+    """Return a SQLAlchemy engine.
+
+    If slave is True and sql_slave_connection is set, return the engine
+    of the slave database instead.
+    """
+    global _ENGINE, _SLAVE_ENGINE
+    if slave and FLAGS.sql_slave_connection:
+        if _SLAVE_ENGINE is None:
+            _SLAVE_ENGINE = create_engine(FLAGS.sql_slave_connection)
+        return _SLAVE_ENGINE
+
     if _ENGINE is None:
-        connection_dict = sqlalchemy.engine.url.make_url(FLAGS.sql_connection)
-
-        engine_args = {
-            "pool_recycle": FLAGS.sql_idle_timeout,
-            "echo": False,
-            'convert_unicode': True,
-        }
-
-        # Map our SQL debug level to SQLAlchemy's options
-        if FLAGS.sql_connection_debug >= 100:
-            engine_args['echo'] = 'debug'
-        elif FLAGS.sql_connection_debug >= 50:
-            engine_args['echo'] = True
-
-        if "sqlite" in connection_dict.drivername:
-            engine_args["poolclass"] = NullPool
-
-            if FLAGS.sql_connection == "sqlite://":
-                engine_args["poolclass"] = StaticPool
-                engine_args["connect_args"] = {'check_same_thread': False}
-
-        _ENGINE = sqlalchemy.create_engine(FLAGS.sql_connection, **engine_args)
-
-        sqlalchemy.event.listen(_ENGINE, 'checkin', greenthread_yield)
-
-        if 'mysql' in connection_dict.drivername:
-            sqlalchemy.event.listen(_ENGINE, 'checkout', ping_listener)
-        elif 'sqlite' in connection_dict.drivername:
-            if not FLAGS.sqlite_synchronous:
-                sqlalchemy.event.listen(_ENGINE, 'connect',
-                                        synchronous_switch_listener)
-            sqlalchemy.event.listen(_ENGINE, 'connect', add_regexp_listener)
-
-        if (FLAGS.sql_connection_trace and
-                _ENGINE.dialect.dbapi.__name__ == 'MySQLdb'):
-            import MySQLdb.cursors
-            _do_query = debug_mysql_do_query()
-            setattr(MySQLdb.cursors.BaseCursor, '_do_query', _do_query)
-
-        try:
-            _ENGINE.connect()
-        except OperationalError, e:
-            if not is_db_connection_error(e.args[0]):
-                raise
-
-            remaining = FLAGS.sql_max_retries
-            if remaining == -1:
-                remaining = 'infinite'
-            while True:
-                msg = _('SQL connection failed. %s attempts left.')
-                LOG.warn(msg % remaining)
-                if remaining != 'infinite':
-                    remaining -= 1
-                time.sleep(FLAGS.sql_retry_interval)
-                try:
-                    _ENGINE.connect()
-                    break
-                except OperationalError, e:
-                    if (remaining != 'infinite' and remaining == 0) or \
-                       not is_db_connection_error(e.args[0]):
-                        raise
+        _ENGINE = create_engine(FLAGS.sql_connection)
     return _ENGINE
 
 
+def create_engine(sql_connection):
+    """Return a new SQLAlchemy engine connected to sql_connection."""
+    connection_dict = sqlalchemy.engine.url.make_url(sql_connection)
+
+    engine_args = {
+        "pool_recycle": FLAGS.sql_idle_timeout,
+        "echo": False,
+        'convert_unicode': True,
+    }
+
+    # Map our SQL debug level to SQLAlchemy's options
+    if FLAGS.sql_connection_debug >= 100:
+        engine_args['echo'] = 'debug'
+    elif FLAGS.sql_connection_debug >= 50:
+        engine_args['echo'] = True
+
+    if "sqlite" in connection_dict.drivername:
+        engine_args["poolclass"] = NullPool
+
+        if sql_connection == "sqlite://":
+            engine_args["poolclass"] = StaticPool
+            engine_args["connect_args"] = {'check_same_thread': False}
+
+    engine = sqlalchemy.create_engine(sql_connection, **engine_args)
+
+    sqlalchemy.event.listen(engine, 'checkin', greenthread_yield)
+
+    if 'mysql' in connection_dict.drivername:
+        sqlalchemy.event.listen(engine, 'checkout', ping_listener)
+    elif 'sqlite' in connection_dict.drivername:
+        if not FLAGS.sqlite_synchronous:
+            sqlalchemy.event.listen(engine, 'connect',
+                                    synchronous_switch_listener)
+        sqlalchemy.event.listen(engine, 'connect', add_regexp_listener)
+
+    if (FLAGS.sql_connection_trace and
+            engine.dialect.dbapi.__name__ == 'MySQLdb'):
+        import MySQLdb.cursors
+        _do_query = debug_mysql_do_query()
+        setattr(MySQLdb.cursors.BaseCursor, '_do_query', _do_query)
+
+    try:
+        engine.connect()
+    except OperationalError, e:
+        if not is_db_connection_error(e.args[0]):
+            raise
+
+        remaining = FLAGS.sql_max_retries
+        if remaining == -1:
+            remaining = 'infinite'
+        while True:
+            msg = _('SQL connection failed. %s attempts left.')
+            LOG.warn(msg % remaining)
+            if remaining != 'infinite':
+                remaining -= 1
+            time.sleep(FLAGS.sql_retry_interval)
+            try:
+                engine.connect()
+                break
+            except OperationalError, e:
+                if (remaining != 'infinite' and remaining == 0) or \
+                   not is_db_connection_error(e.args[0]):
+                    raise
+    return engine
+
+
 def get_maker(engine, autocommit=True, expire_on_commit=False):
     """Return a SQLAlchemy sessionmaker using the given engine."""
     return sqlalchemy.orm.sessionmaker(bind=engine,
@@ -82,6 +82,12 @@ core_opts = [
                default='sqlite:///$state_path/$sqlite_db',
                help='The SQLAlchemy connection string used to connect to the '
                     'database'),
+    cfg.StrOpt('sql_slave_connection',
+               default='',
+               help='The SQLAlchemy connection string used to connect to a '
+                    'read-only slave of the database. Listing and reporting '
+                    'queries are sent there if it is set, and may see data '
+                    'up to the replication lag old'),
     cfg.StrOpt('api_paste_config',
                default="api-paste.ini",
                help='File name for the paste.deploy config for nova-api'),
@@ -311,6 +317,14 @@ global_opts = [
                default='month',
                help='time period to generate instance usages for.  '
                     'Time period must be hour, day, month or year'),
+    cfg.BoolOpt('tenant_usage_rollup',
+                default=False,
+                help='Roll up the usage of each tenant per day, and answer '
+                     'tenant usage summaries from the rolled up days'),
+    cfg.IntOpt('tenant_usage_rollup_days',
+               default=31,
+               help='Number of past days to keep rolling up tenant usage '
+                    'for'),
     cfg.IntOpt('bandwidth_poll_interval',
                deprecated_name='bandwith_poll_interval',
                default=600,
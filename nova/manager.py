@@ -53,10 +53,13 @@ This module provides Manager, a base class for managers.
 
 """
 
+import time
+
 import eventlet
 
 from nova.db import base
 from nova import flags
+from nova.openstack.common import cfg
 from nova.openstack.common import log as logging
 from nova.openstack.common.plugin import pluginmanager
 from nova.openstack.common.rpc import dispatcher as rpc_dispatcher
@@ -64,7 +67,17 @@ from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import version
 
 
+manager_opts = [
+    cfg.BoolOpt('periodic_tasks_concurrency',
+                default=True,
+                help='Run the periodic tasks marked as concurrent in their '
+                     'own green thread, so a slow task does not delay the '
+                     'others'),
+    ]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(manager_opts)
+flags.DECLARE('periodic_interval', 'nova.service')
 
 
 LOG = logging.getLogger(__name__)
@@ -80,10 +93,17 @@ def periodic_task(*args, **kwargs):
 
         2. With arguments, @periodic_task(ticks_between_runs=N), this will be
            run on every N ticks of the periodic scheduler.
+
+    Each task has its own timer.  With spacing=N, the task is run every N
+    seconds rather than on ticks.  With concurrent=True, the task is run in
+    its own green thread, and a run is skipped if the previous run of the
+    task hasn't finished yet.
     """
     def decorator(f):
         f._periodic_task = True
         f._ticks_between_runs = kwargs.pop('ticks_between_runs', 0)
+        f._periodic_spacing = kwargs.pop('spacing', None)
+        f._periodic_concurrent = kwargs.pop('concurrent', False)
         return f
 
     # NOTE(sirp): The `if` is necessary to allow the decorator to be used with
@@ -118,17 +138,11 @@ class ManagerMeta(type):
         except AttributeError:
             cls._periodic_tasks = []
 
-        try:
-            cls._ticks_to_skip = cls._ticks_to_skip.copy()
-        except AttributeError:
-            cls._ticks_to_skip = {}
-
         for value in cls.__dict__.values():
             if getattr(value, '_periodic_task', False):
                 task = value
                 name = task.__name__
                 cls._periodic_tasks.append((name, task))
-                cls._ticks_to_skip[name] = task._ticks_between_runs
 
 
 class Manager(base.Base):
@@ -141,9 +155,33 @@ class Manager(base.Base):
         if not host:
             host = FLAGS.host
         self.host = host
+        self.periodic_interval = FLAGS.periodic_interval
         self.load_plugins()
+        self._init_periodic_tasks()
         super(Manager, self).__init__(db_driver)
 
+    def _init_periodic_tasks(self):
+        self._periodic_last_run = {}
+        self._periodic_running = {}
+        self._periodic_stats = {}
+
+        # NOTE: tasks which run every N ticks first run N ticks after the
+        # manager started, as if the first tick had just run them.
+        now = time.time()
+        for task_name, task in self._periodic_tasks:
+            if task._periodic_spacing is None and task._ticks_between_runs:
+                self._periodic_last_run[task_name] = (now -
+                                                      self.periodic_interval)
+
+    def set_periodic_interval(self, periodic_interval):
+        """Set the number of seconds between two ticks.
+
+        This is the periodic interval of the service running the manager,
+        which the tasks run on ticks are spaced by.
+        """
+        self.periodic_interval = periodic_interval
+        self._init_periodic_tasks()
+
     def load_plugins(self):
         pluginmgr = pluginmanager.PluginManager('nova', self.__class__)
         pluginmgr.load_plugins()
@@ -156,31 +194,98 @@ class Manager(base.Base):
         '''
         return rpc_dispatcher.RpcDispatcher([self])
 
+    def _periodic_spacing(self, task):
+        """Return the number of seconds between two runs of a task."""
+        if task._periodic_spacing is not None:
+            return task._periodic_spacing
+        return (task._ticks_between_runs + 1) * self.periodic_interval
+
     def periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        Returns the number of seconds until the next task is due.
+        """
+        idle_for = None
         for task_name, task in self._periodic_tasks:
             full_task_name = '.'.join([self.__class__.__name__, task_name])
 
-            ticks_to_skip = self._ticks_to_skip[task_name]
-            if ticks_to_skip > 0:
-                LOG.debug(_("Skipping %(full_task_name)s, %(ticks_to_skip)s"
-                            " ticks left until next run"), locals())
-                self._ticks_to_skip[task_name] -= 1
+            spacing = self._periodic_spacing(task)
+            now = time.time()
+            last_run = self._periodic_last_run.get(task_name)
+            if last_run is not None and now - last_run < spacing:
+                wait = spacing - (now - last_run)
+                LOG.debug(_("Skipping %(full_task_name)s, %(wait).1f"
+                            " seconds left until next run"), locals())
+                if idle_for is None or wait < idle_for:
+                    idle_for = wait
+                continue
+            if idle_for is None or spacing < idle_for:
+                idle_for = spacing
+
+            stats = self._periodic_stats.setdefault(task_name,
+                    {'runs': 0, 'skipped': 0, 'overruns': 0, 'errors': 0,
+                     'last_duration': None, 'max_duration': 0.0,
+                     'total_duration': 0.0})
+
+            running = self._periodic_running.get(task_name)
+            if running is not None and not running.dead:
+                LOG.warn(_("Skipping %(full_task_name)s, the previous run"
+                           " is still running"), locals())
+                stats['skipped'] += 1
                 continue
 
-            self._ticks_to_skip[task_name] = task._ticks_between_runs
+            self._periodic_last_run[task_name] = now
             LOG.debug(_("Running periodic task %(full_task_name)s"), locals())
 
-            try:
-                task(self, context)
+            if (task._periodic_concurrent and FLAGS.periodic_tasks_concurrency
+                and not raise_on_error):
+                self._periodic_running[task_name] = eventlet.spawn(
+                        self._run_periodic_task, context, task_name, task,
+                        spacing, stats, raise_on_error)
+            else:
+                self._run_periodic_task(context, task_name, task, spacing,
+                                        stats, raise_on_error)
                 # NOTE(tiantian): After finished a task, allow manager to
                 # do other work (report_state, processing AMPQ request etc.)
                 eventlet.sleep(0)
-            except Exception as e:
-                if raise_on_error:
-                    raise
-                LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
-                              locals())
+
+        return idle_for
+
+    def _run_periodic_task(self, context, task_name, task, spacing, stats,
+                           raise_on_error):
+        full_task_name = '.'.join([self.__class__.__name__, task_name])
+        start = time.time()
+        try:
+            task(self, context)
+        except Exception as e:
+            stats['errors'] += 1
+            if raise_on_error:
+                raise
+            LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
+                          locals())
+        finally:
+            duration = time.time() - start
+            stats['runs'] += 1
+            stats['last_duration'] = duration
+            stats['max_duration'] = max(stats['max_duration'], duration)
+            stats['total_duration'] += duration
+            if duration > spacing:
+                stats['overruns'] += 1
+                LOG.warn(_("%(full_task_name)s took %(duration).1f seconds,"
+                           " more than its %(spacing)s seconds spacing"),
+                         locals())
+
+    def periodic_task_stats(self):
+        """Return the run statistics of the periodic tasks, by task name.
+
+        For each task: the number of runs, of runs skipped because the
+        previous run hadn't finished, of overruns which took longer than
+        the task spacing, of runs which raised, and the last, max and
+        total durations in seconds.
+        """
+        return dict((task_name, task_stats.copy())
+                    for task_name, task_stats
+                    in self._periodic_stats.iteritems())
 
     def init_host(self):
         """Handle initialization if this is a standalone service.
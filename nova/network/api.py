@@ -25,6 +25,7 @@ from nova import flags
 from nova.network import model as network_model
 from nova.openstack.common import log as logging
 from nova.openstack.common import rpc
+from nova.openstack.common import timeutils
 
 
 FLAGS = flags.FLAGS
@@ -293,17 +294,53 @@ class API(base.Base):
 
     def _get_instance_nw_info(self, context, instance):
         """Returns all network info related to an instance."""
-        args = {'instance_id': instance['id'],
-                'instance_uuid': instance['uuid'],
-                'rxtx_factor': instance['instance_type']['rxtx_factor'],
-                'host': instance['host'],
-                'project_id': instance['project_id']}
+        args = self._get_instance_nw_info_args(instance)
         nw_info = rpc.call(context, FLAGS.network_topic,
                            {'method': 'get_instance_nw_info',
                             'args': args})
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    @staticmethod
+    def _get_instance_nw_info_args(instance):
+        return {'instance_id': instance['id'],
+                'instance_uuid': instance['uuid'],
+                'rxtx_factor': instance['instance_type']['rxtx_factor'],
+                'host': instance['host'],
+                'project_id': instance['project_id']}
+
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of many instances with a single call
+        to the network manager, and refreshes their info caches.
+
+        :returns: dict of instance uuid to NetworkInfo
+        """
+        args = {'instances': [self._get_instance_nw_info_args(instance)
+                              for instance in instances]}
+        nw_infos = rpc.call(context, FLAGS.network_topic,
+                            {'method': 'get_instances_nw_info',
+                             'args': args})
+
+        result = {}
+        for instance in instances:
+            nw_info = network_model.NetworkInfo.hydrate(
+                    nw_infos.get(instance['uuid'], []))
+            # NOTE: the cache is written directly, since an instance
+            # without network has an empty nw_info, for which
+            # update_instance_cache_with_nw_info would call again.
+            # updated_at is set even when the network info is unchanged,
+            # since the cache is healed again once it looks old.
+            try:
+                cache = {'network_info': nw_info.json(),
+                         'updated_at': timeutils.utcnow()}
+                self.db.instance_info_cache_update(context, instance['uuid'],
+                                                   cache)
+            except Exception:
+                LOG.exception(_('Failed storing info cache'),
+                              instance=instance)
+            result[instance['uuid']] = nw_info
+        return result
+
     def validate_networks(self, context, requested_networks):
         """validate the networks passed at the time of creating
         the server
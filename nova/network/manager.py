@@ -53,6 +53,7 @@ import socket
 from eventlet import greenpool
 import netaddr
 
+from nova.common import metadatacache
 from nova.compute import api as compute_api
 from nova import context
 from nova import exception
@@ -247,6 +248,22 @@ class RPCAllocateFixedIP(object):
                                                                 address)
 
 
+def _ip_filter_literal(ip_filter):
+    """Find the literal part of a regular expression over ip addresses.
+
+    Returns a tuple of the address the expression matches exactly, if it
+    is a plain address, and otherwise the prefix all of its matches start
+    with.  Either is None if there is none.
+    """
+    # NOTE: the filter is applied with re.match, so it is always anchored
+    if ip_filter.startswith('^'):
+        ip_filter = ip_filter[1:]
+    literal, rest = utils.regex_literal_prefix(ip_filter)
+    if literal and rest == '$':
+        return literal, None
+    return None, literal or None
+
+
 def wrap_check_policy(func):
     """Check policy corresponding to the wrapped methods prior to execution"""
 
@@ -541,6 +558,9 @@ class FloatingIP(object):
                                'fixed_address': fixed_address,
                                'interface': interface}})
 
+        # public-ipv4 in the metadata of the instance changed
+        self.metadata_cache.invalidate(fixed_ip['instance_uuid'])
+
         return orig_instance_uuid
 
     def _associate_floating_ip(self, context, floating_address, fixed_address,
@@ -613,6 +633,9 @@ class FloatingIP(object):
                       'args': {'address': address,
                                'interface': interface}})
 
+        # public-ipv4 in the metadata of the instance changed
+        self.metadata_cache.invalidate(fixed_ip['instance_uuid'])
+
     def _disassociate_floating_ip(self, context, address, interface):
         """Performs db and driver calls to disassociate floating ip"""
         # disassociate floating ip
@@ -796,6 +819,7 @@ class NetworkManager(manager.SchedulerDependentManager):
         self.security_group_api = compute_api.SecurityGroupAPI()
         self.compute_api = compute_api.API(
                                    security_group_api=self.security_group_api)
+        self.metadata_cache = metadatacache.MetadataCache()
 
         # NOTE(tr3buchet: unless manager subclassing NetworkManager has
         #                 already imported ipam, import nova ipam here
@@ -895,49 +919,70 @@ class NetworkManager(manager.SchedulerDependentManager):
         ip_filter = re.compile(str(filters.get('ip')))
         ipv6_filter = re.compile(str(filters.get('ip6')))
 
-        # NOTE(jkoelker) Should probably figure out a better way to do
-        #                this. But for now it "works", this could suck on
-        #                large installs.
-
-        vifs = self.db.virtual_interface_get_all(context)
         results = []
 
-        for vif in vifs:
-            if vif['instance_uuid'] is None:
-                continue
+        # NOTE(jkoelker) IPv6 addresses are derived from the vif's mac and
+        #                the network, so they can't be searched for in the
+        #                database.
+        if 'ip6' in filters:
+            networks = {}
+            for vif in self.db.virtual_interface_get_all(context):
+                if vif['instance_uuid'] is None:
+                    continue
+
+                network_id = vif['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self._get_network_by_id(context,
+                                                                   network_id)
+                network = networks[network_id]
+                if network['cidr_v6'] is None:
+                    continue
 
-            network = self._get_network_by_id(context, vif['network_id'])
-            fixed_ipv6 = None
-            if network['cidr_v6'] is not None:
                 fixed_ipv6 = ipv6.to_global(network['cidr_v6'],
                                             vif['address'],
                                             context.project_id)
+                if ipv6_filter.match(fixed_ipv6):
+                    results.append({'instance_uuid': vif['instance_uuid'],
+                                    'ip': fixed_ipv6})
 
-            if fixed_ipv6 and ipv6_filter.match(fixed_ipv6):
-                results.append({'instance_uuid': vif['instance_uuid'],
-                                'ip': fixed_ipv6})
+        if 'ip' not in filters and 'fixed_ip' not in filters:
+            return results
 
-            vif_id = vif['id']
-            fixed_ips = self.db.fixed_ips_by_virtual_interface(context,
-                                                               vif_id)
-            for fixed_ip in fixed_ips:
-                if not fixed_ip or not fixed_ip['address']:
-                    continue
-                if fixed_ip['address'] == fixed_ip_filter:
-                    results.append({'instance_uuid': vif['instance_uuid'],
-                                    'ip': fixed_ip['address']})
-                    continue
-                if ip_filter.match(fixed_ip['address']):
-                    results.append({'instance_uuid': vif['instance_uuid'],
-                                    'ip': fixed_ip['address']})
-                    continue
-                for floating_ip in fixed_ip.get('floating_ips', []):
-                    if not floating_ip or not floating_ip['address']:
-                        continue
-                    if ip_filter.match(floating_ip['address']):
-                        results.append({'instance_uuid': vif['instance_uuid'],
-                                        'ip': floating_ip['address']})
-                        continue
+        # Narrow the search down in the database to the addresses equal to
+        # or starting with the literal part of the filter, and only run the
+        # regular expression over what is left.
+        address = None
+        address_prefix = None
+        if 'ip' not in filters:
+            address = fixed_ip_filter
+        elif 'fixed_ip' not in filters:
+            address, address_prefix = _ip_filter_literal(str(filters['ip']))
+
+        fixed_ips = []
+        floating_addresses = {}
+        for row in self.db.fixed_ip_get_by_address_filter(context,
+                address=address, address_prefix=address_prefix):
+            key = (row['instance_uuid'], row['address'])
+            if key not in floating_addresses:
+                fixed_ips.append(key)
+                floating_addresses[key] = []
+            if row['floating_address']:
+                floating_addresses[key].append(row['floating_address'])
+
+        for key in fixed_ips:
+            instance_uuid, fixed_address = key
+            if fixed_address == fixed_ip_filter:
+                results.append({'instance_uuid': instance_uuid,
+                                'ip': fixed_address})
+                continue
+            if ip_filter.match(fixed_address):
+                results.append({'instance_uuid': instance_uuid,
+                                'ip': fixed_address})
+                continue
+            for floating_address in floating_addresses[key]:
+                if ip_filter.match(floating_address):
+                    results.append({'instance_uuid': instance_uuid,
+                                    'ip': floating_address})
 
         return results
 
@@ -1043,6 +1088,48 @@ class NetworkManager(manager.SchedulerDependentManager):
                                                          rxtx_factor, host)
         return nw_info
 
+    @wrap_check_policy
+    def get_instances_nw_info(self, context, instances, **kwargs):
+        """Creates network info lists for many instances at once.
+
+        The virtual interfaces of all the instances are read in one query,
+        and each network is looked up once however many instances use it.
+        This saves a call to the network manager per instance, but the
+        subnets, fixed ips and floating ips of each virtual interface are
+        still looked up one interface at a time by
+        build_network_info_model, through the ipam lib.
+
+        :param instances: list of dicts with the instance_uuid, rxtx_factor
+                          and host of each instance, like the arguments of
+                          get_instance_nw_info
+        :returns: dict of instance uuid to network info list
+        """
+        instance_uuids = [instance['instance_uuid'] for instance in instances]
+        vifs_by_instance = {}
+        for vif in self.db.virtual_interface_get_by_instances(context,
+                                                              instance_uuids):
+            vifs_by_instance.setdefault(vif['instance_uuid'], []).append(vif)
+
+        networks_by_id = {}
+        nw_infos = {}
+        for instance in instances:
+            vifs = vifs_by_instance.get(instance['instance_uuid'], [])
+            networks = {}
+            for vif in vifs:
+                network_id = vif.get('network_id')
+                if network_id is None:
+                    continue
+                if network_id not in networks_by_id:
+                    networks_by_id[network_id] = self._get_network_by_id(
+                            context, network_id)
+                networks[vif['uuid']] = networks_by_id[network_id]
+
+            nw_infos[instance['instance_uuid']] = \
+                    self.build_network_info_model(context, vifs, networks,
+                                                  instance['rxtx_factor'],
+                                                  instance['host'])
+        return nw_infos
+
     def build_network_info_model(self, context, vifs, networks,
                                  rxtx_factor, instance_host):
         """Builds a NetworkInfo object containing all network information
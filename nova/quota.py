@@ -379,6 +379,20 @@ class DbQuotaDriver(object):
 
         db.reservation_expire(context)
 
+    def refresh_usages(self, context, resources):
+        """Resync the usages which are due for a refresh.
+
+        quota_reserve only takes the fast path for usages which are not
+        due for a refresh, so doing this in the background keeps the
+        resyncs out of the reservations.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        """
+
+        db.quota_usage_refresh_stale(context, resources, FLAGS.until_refresh,
+                                     FLAGS.max_age)
+
 
 class BaseResource(object):
     """Describe a single resource for quota checking."""
@@ -756,6 +770,14 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def refresh_usages(self, context):
+        """Resync the usages which are due for a refresh.
+
+        :param context: The request context, for access checks.
+        """
+
+        self._driver.refresh_usages(context, self._resources)
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
@@ -0,0 +1,104 @@
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+In-memory index of the metadata of host aggregates.
+
+Aggregate filters look hosts up here instead of querying the aggregates of
+each host from the db for every request.  The index is reloaded after the
+aggregate API signals a change, and every
+scheduler_aggregate_refresh_interval seconds in case a signal was missed.
+"""
+
+from nova import db
+from nova import flags
+from nova.openstack.common import cfg
+from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
+
+
+aggregate_index_opts = [
+    cfg.IntOpt('scheduler_aggregate_refresh_interval',
+               default=300,
+               help='Seconds between reloads of the aggregate metadata '
+                    'index, in addition to the reloads triggered by '
+                    'aggregate changes.  Set to 0 to reload it on every '
+                    'request.'),
+    ]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(aggregate_index_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class AggregateIndex(object):
+    """Aggregate metadata of every host, and hosts by metadata."""
+
+    def __init__(self):
+        # { <host> : { <key> : set([<value>, ...]) } }
+        self.host_metadata = {}
+        # { (<key>, <value>) : set([<host>, ...]) }
+        self.metadata_hosts = {}
+        self.last_refresh = None
+        self.stale = True
+
+    def invalidate(self):
+        """Reload the index before it is next used."""
+        self.stale = True
+
+    def needs_refresh(self):
+        interval = FLAGS.scheduler_aggregate_refresh_interval
+        return (self.stale or interval <= 0 or
+                timeutils.is_older_than(self.last_refresh, interval))
+
+    def refresh(self, context):
+        """Reload the index, returning the hosts whose metadata changed."""
+        host_metadata = dict((host, dict(metadata)) for host, metadata in
+                db.aggregate_metadata_get_all_by_host(context).iteritems())
+        metadata_hosts = {}
+        for host, metadata in host_metadata.iteritems():
+            for key, values in metadata.iteritems():
+                for value in values:
+                    metadata_hosts.setdefault((key, value), set()).add(host)
+
+        changed_hosts = set(host for host in
+                            set(host_metadata) | set(self.host_metadata)
+                            if (host_metadata.get(host) !=
+                                self.host_metadata.get(host)))
+        if changed_hosts:
+            LOG.debug(_("Aggregate metadata changed for hosts %s") %
+                      ', '.join(sorted(changed_hosts)))
+
+        self.host_metadata = host_metadata
+        self.metadata_hosts = metadata_hosts
+        self.last_refresh = timeutils.utcnow()
+        self.stale = False
+        return changed_hosts
+
+    def get_metadata(self, host, key=None):
+        """Return the metadata of the aggregates of host, as a dict of
+        sets like db.aggregate_metadata_get_by_host().
+        """
+        metadata = self.host_metadata.get(host, {})
+        if key is not None:
+            if key not in metadata:
+                return {}
+            return {key: metadata[key]}
+        return metadata
+
+    def get_hosts(self, key, value):
+        """Return the hosts in an aggregate having key set to value."""
+        return self.metadata_hosts.get((key, value), set())
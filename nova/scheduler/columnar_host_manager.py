@@ -0,0 +1,302 @@
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Host manager keeping host resources in numpy columns.
+
+Filters implementing filter_columns() and cost functions declared with
+least_cost.vectorized() are evaluated over all hosts with array operations.
+Other filters and cost functions are run per host as usual.  To use it, set
+scheduler_host_manager to
+nova.scheduler.columnar_host_manager.ColumnarHostManager.
+"""
+
+import datetime
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from nova import exception
+from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
+from nova.scheduler import host_manager
+from nova.scheduler import least_cost
+from nova.scheduler import profiler
+from nova import utils
+
+
+LOG = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# (column name, numpy dtype name)
+COLUMNS = [
+    ('total_usable_ram_mb', 'int64'),
+    ('free_ram_mb', 'int64'),
+    ('total_usable_disk_gb', 'int64'),
+    ('disk_mb_used', 'int64'),
+    ('free_disk_mb', 'int64'),
+    ('vcpus_total', 'int64'),
+    ('vcpus_used', 'int64'),
+    ('service_updated_at', 'float64'),
+    ('service_disabled', 'bool'),
+    ('capabilities_enabled', 'bool'),
+    ]
+
+
+def _seconds(when):
+    """Seconds since the epoch of a naive UTC datetime, or NaN for None."""
+    if when is None:
+        return float('nan')
+    return utils.total_seconds(when - EPOCH)
+
+
+class HostTable(object):
+    """Resources of many hosts stored in numpy columns, one row per host.
+
+    Rows are handed out by add_row() and recycled by remove_row().
+    """
+
+    def __init__(self, capacity=64):
+        self._capacity = capacity
+        self._next_row = 0
+        self._free_rows = []
+        self.columns = dict((name, numpy.zeros(capacity, dtype=dtype))
+                            for name, dtype in COLUMNS)
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            self.columns[name] = numpy.concatenate(
+                    (column, numpy.zeros_like(column)))
+        self._capacity *= 2
+
+    def add_row(self):
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._next_row == self._capacity:
+                self._grow()
+            row = self._next_row
+            self._next_row += 1
+        for column in self.columns.itervalues():
+            column[row] = 0
+        return row
+
+    def remove_row(self, row):
+        self._free_rows.append(row)
+
+    def get(self, row, name):
+        return self.columns[name][row].item()
+
+    def set(self, row, name, value):
+        if value is None:
+            value = 0
+        self.columns[name][row] = value
+
+
+class HostColumns(object):
+    """Columns of the hosts being filtered or weighed.
+
+    This is what filter_columns() and vectorized cost functions receive.
+    columns[name] is an array with one entry per host, in the order the
+    hosts were given.
+    """
+
+    def __init__(self, table, host_states):
+        self.host_states = host_states
+        self.rows = numpy.fromiter((host_state.row
+                                    for host_state in host_states),
+                                   dtype='int64', count=len(host_states))
+        # Reference time for heartbeat checks, as seconds since the epoch
+        self.now = _seconds(timeutils.utcnow())
+        self._table = table
+        self._columns = {}
+        self._limits = []
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def __getitem__(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._table.columns[name][self.rows]
+            self._columns[name] = column
+        return column
+
+    def all_passing(self):
+        """Return a filter result passing every host."""
+        return numpy.ones(len(self), dtype=bool)
+
+    def set_limit(self, name, values, where=None):
+        """Record an oversubscription limit for the hosts that end up
+        passing, optionally only where `where` is True.
+        """
+        self._limits.append((name, values, where))
+
+    def apply_limits(self, passes):
+        """Store the recorded limits in the passing HostStates."""
+        for name, values, where in self._limits:
+            values = numpy.zeros(len(self)) + values
+            if where is not None:
+                mask = passes & where
+            else:
+                mask = passes
+            indices = numpy.flatnonzero(mask)
+            for index, value in zip(indices.tolist(),
+                                    values[indices].tolist()):
+                self.host_states[index].limits[name] = value
+
+
+def _column_property(name):
+    def getter(self):
+        return self.table.get(self.row, name)
+
+    def setter(self, value):
+        self.table.set(self.row, name, value)
+
+    return property(getter, setter)
+
+
+class ColumnarHostState(host_manager.HostState):
+    """HostState whose consumable resources live in a HostTable row."""
+
+    total_usable_ram_mb = _column_property('total_usable_ram_mb')
+    free_ram_mb = _column_property('free_ram_mb')
+    total_usable_disk_gb = _column_property('total_usable_disk_gb')
+    disk_mb_used = _column_property('disk_mb_used')
+    free_disk_mb = _column_property('free_disk_mb')
+    vcpus_total = _column_property('vcpus_total')
+    vcpus_used = _column_property('vcpus_used')
+
+    def __init__(self, host, topic, capabilities=None, service=None,
+                 table=None):
+        self.table = table
+        self.row = table.add_row()
+        super(ColumnarHostState, self).__init__(host, topic,
+                capabilities=capabilities, service=service)
+
+    def update_capabilities(self, capabilities=None, service=None):
+        super(ColumnarHostState, self).update_capabilities(
+                capabilities=capabilities, service=service)
+        updated_at = (self.service.get('updated_at') or
+                      self.service.get('created_at'))
+        self.table.set(self.row, 'service_updated_at', _seconds(updated_at))
+        self.table.set(self.row, 'service_disabled',
+                       bool(self.service.get('disabled')))
+        self.table.set(self.row, 'capabilities_enabled',
+                       bool(self.capabilities.get('enabled', True)))
+
+
+class ColumnarHostManager(host_manager.HostManager):
+    """HostManager filtering and weighing hosts with array operations."""
+
+    def __init__(self):
+        if numpy is None:
+            raise exception.NovaException(_("ColumnarHostManager requires "
+                                            "numpy, which is not installed"))
+        super(ColumnarHostManager, self).__init__()
+        self.table = HostTable()
+
+    def host_state_cls(self, host, topic, capabilities=None, service=None):
+        return ColumnarHostState(host, topic, capabilities=capabilities,
+                                 service=service, table=self.table)
+
+    def _remove_host_state(self, host):
+        self.table.remove_row(self.host_state_map[host].row)
+        super(ColumnarHostManager, self)._remove_host_state(host)
+
+    def filter_hosts(self, hosts, filter_properties, filters=None):
+        """Filter hosts and return only ones passing all filters"""
+        if filter_properties.get('force_hosts'):
+            return super(ColumnarHostManager, self).filter_hosts(hosts,
+                    filter_properties, filters=filters)
+
+        ignore_hosts = filter_properties.get('ignore_hosts', [])
+        host_states = [host_state for host_state in hosts
+                       if host_state.host not in ignore_hosts]
+        filter_fns = self._choose_host_filters(filters)
+        host_states = self._prune_hosts(host_states, filter_fns,
+                                        filter_properties)
+        if not host_states:
+            return []
+
+        columns = HostColumns(self.table, host_states)
+        passes = columns.all_passing()
+        for filter_fn in filter_fns:
+            filter_obj = getattr(filter_fn, '__self__', None)
+            filter_columns = getattr(filter_obj, 'filter_columns', None)
+            if filter_columns is not None:
+                start = time.time()
+                hosts = passes.sum()
+                passes &= filter_columns(columns, filter_properties)
+                self.profiler.record('filter', profiler.fn_name(filter_fn),
+                                     time.time() - start, hosts.item(),
+                                     (hosts - passes.sum()).item())
+                continue
+            filter_fn = self._wrap_filter(filter_fn, filter_properties)
+            for index in numpy.flatnonzero(passes):
+                if not filter_fn(host_states[index], filter_properties):
+                    passes[index] = False
+
+        columns.apply_limits(passes)
+        filtered_hosts = [host_states[index]
+                          for index in numpy.flatnonzero(passes).tolist()]
+        LOG.debug(_("%(passed)d of %(total)d hosts passed filters"),
+                  {'passed': len(filtered_hosts), 'total': len(host_states)})
+        return filtered_hosts
+
+    def _weigh_columns(self, weighted_fns, host_states, weighing_properties):
+        """Return the scores of host_states as an array, or None if a cost
+        function has no vectorized form.
+        """
+        if not all(hasattr(fn, 'columns_fn') for weight, fn in weighted_fns):
+            return None
+        columns = HostColumns(self.table, host_states)
+        scores = numpy.zeros(len(columns))
+        for weight, fn in self.profiler.wrap_cost_fns(weighted_fns):
+            scores += weight * fn.columns_fn(columns, weighing_properties)
+        return scores
+
+    def weigh_hosts(self, weighted_fns, hosts, weighing_properties):
+        """Return the WeightedHost with the lowest weighted cost"""
+        host_states = list(hosts)
+        scores = None
+        if host_states:
+            scores = self._weigh_columns(weighted_fns, host_states,
+                                         weighing_properties)
+        if scores is None:
+            return super(ColumnarHostManager, self).weigh_hosts(
+                    weighted_fns, host_states, weighing_properties)
+
+        best = scores.argmin()
+        return least_cost.WeightedHost(scores[best].item(),
+                                       host_state=host_states[best])
+
+    def weigh_all_hosts(self, weighted_fns, hosts, weighing_properties):
+        """Return a WeightedHost for each host, in the order given"""
+        host_states = list(hosts)
+        scores = None
+        if host_states:
+            scores = self._weigh_columns(weighted_fns, host_states,
+                                         weighing_properties)
+        if scores is None:
+            return super(ColumnarHostManager, self).weigh_all_hosts(
+                    weighted_fns, host_states, weighing_properties)
+
+        return [least_cost.WeightedHost(score, host_state=host_state)
+                for score, host_state in zip(scores.tolist(), host_states)]
@@ -184,6 +184,15 @@ class Scheduler(object):
         self.host_manager.update_service_capabilities(service_name,
                 host, capabilities)
 
+    def get_scheduler_profile(self):
+        """Return the filter and cost function timings of recent
+        scheduling requests."""
+        return self.host_manager.profiler.dump()
+
+    def update_aggregates(self):
+        """Reload the aggregate index before the next request."""
+        self.host_manager.aggregate_index.invalidate()
+
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
 
@@ -19,10 +19,12 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import operator
 
 from nova import exception
 from nova import flags
+from nova.openstack.common import cfg
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
 from nova.openstack.common.notifier import api as notifier
@@ -31,7 +33,18 @@ from nova.scheduler import least_cost
 from nova.scheduler import scheduler_options
 
 
+filter_scheduler_opts = [
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=True,
+                help='When a request asks for several instances, filter and '
+                     'weigh all hosts once and then only re-evaluate the '
+                     'host chosen for each instance.  This assumes filters '
+                     'and cost functions only look at the host they are '
+                     'given.'),
+    ]
+
 FLAGS = flags.FLAGS
+FLAGS.register_opts(filter_scheduler_opts)
 LOG = logging.getLogger(__name__)
 
 
@@ -251,16 +264,41 @@ class FilterScheduler(driver.Scheduler):
         unfiltered_hosts_dict = self.host_manager.get_all_host_states(
                 elevated, topic)
 
-        # Note: remember, we are using an iterator here. So only
-        # traverse this list once. This can bite you if the hosts
-        # are being scanned in a filter or weighing function.
-        hosts = unfiltered_hosts_dict.itervalues()
-
-        selected_hosts = []
         if instance_uuids:
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+
+        hosts, other_hosts = self.host_manager.partition_hosts(elevated,
+                unfiltered_hosts_dict.itervalues())
+        self.host_manager.profiler.start_request()
+        try:
+            selected_hosts = self._select_hosts(hosts, num_instances,
+                    cost_functions, filter_properties, instance_properties)
+            if (len(selected_hosts) < num_instances and other_hosts and
+                    FLAGS.scheduler_partition_fallback):
+                LOG.debug(_("Not enough hosts in this scheduler's "
+                            "partition, trying the %d other hosts") %
+                          len(other_hosts))
+                selected_hosts += self._select_hosts(other_hosts,
+                        num_instances - len(selected_hosts), cost_functions,
+                        filter_properties, instance_properties)
+        finally:
+            self.host_manager.profiler.finish_request(context)
+
+        selected_hosts.sort(key=operator.attrgetter('weight'))
+        return selected_hosts
+
+    def _select_hosts(self, hosts, num_instances, cost_functions,
+                      filter_properties, instance_properties):
+        """Select up to num_instances hosts out of hosts, consuming the
+        resources of an instance on each selected host.
+        """
+        if num_instances > 1 and FLAGS.scheduler_batch_placement:
+            return self._schedule_batch(hosts, num_instances,
+                    cost_functions, filter_properties, instance_properties)
+
+        selected_hosts = []
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.filter_hosts(hosts,
@@ -277,7 +315,7 @@ class FilterScheduler(driver.Scheduler):
             # weighing and I plan fold weighing into the host manager
             # in a future patch.  I'll address the naming of this
             # variable at that time.
-            weighted_host = least_cost.weighted_sum(cost_functions,
+            weighted_host = self.host_manager.weigh_hosts(cost_functions,
                     hosts, filter_properties)
             LOG.debug(_("Weighted %(weighted_host)s") % locals())
             selected_hosts.append(weighted_host)
@@ -287,7 +325,43 @@ class FilterScheduler(driver.Scheduler):
             weighted_host.host_state.consume_from_instance(
                     instance_properties)
 
-        selected_hosts.sort(key=operator.attrgetter('weight'))
+        return selected_hosts
+
+    def _schedule_batch(self, hosts, num_instances, cost_functions,
+                        filter_properties, instance_properties):
+        """Select hosts for num_instances instances, filtering and
+        weighing all hosts only once.
+
+        Weighted hosts are kept in a heap ordered by weight.  Consuming
+        resources for an instance only changes the host it was placed on,
+        so only that host is filtered and weighed again before going back
+        in the heap.  Ties are broken by the original host order, as in
+        least_cost.weighted_sum().
+        """
+        hosts = self.host_manager.filter_hosts(hosts, filter_properties)
+        LOG.debug(_("Filtered %(hosts)s") % locals())
+
+        weighted_hosts = self.host_manager.weigh_all_hosts(cost_functions,
+                hosts, filter_properties)
+        heap = [(weighted_host.weight, index, weighted_host)
+                for index, weighted_host in enumerate(weighted_hosts)]
+        heapq.heapify(heap)
+
+        selected_hosts = []
+        while heap and len(selected_hosts) < num_instances:
+            weight, index, weighted_host = heapq.heappop(heap)
+            LOG.debug(_("Weighted %(weighted_host)s") % locals())
+            selected_hosts.append(weighted_host)
+
+            host_state = weighted_host.host_state
+            host_state.consume_from_instance(instance_properties)
+            if not self.host_manager.filter_hosts([host_state],
+                                                  filter_properties):
+                continue
+            weighted_host = self.host_manager.weigh_all_hosts(
+                    cost_functions, [host_state], filter_properties)[0]
+            heapq.heappush(heap, (weighted_host.weight, index, weighted_host))
+
         return selected_hosts
 
     def get_cost_functions(self, topic=None):
@@ -25,16 +25,93 @@ from nova.openstack.common import importutils
 
 
 class BaseHostFilter(object):
-    """Base class for host filters."""
+    """Base class for host filters.
+
+    A filter may also implement filter_columns(columns, filter_properties),
+    returning a boolean array with one entry per host in `columns` (see
+    nova.scheduler.columnar_host_manager.HostColumns).  Host managers that
+    keep host resources in columns then evaluate the filter over all hosts
+    at once instead of calling host_passes() for each of them.
+    """
 
     def host_passes(self, host_state, filter_properties):
         raise NotImplementedError()
 
+    def cache_key(self, filter_properties):
+        """Return a hashable key of the request fields host_passes() uses,
+        or None if its results must not be cached.
+
+        Only override this if, for a given key, host_passes() gives the same
+        answer for a host until its capabilities are updated or its
+        HostState changes (see FilterResultCache).
+        """
+        return None
+
+    def candidate_hosts(self, filter_properties, aggregate_index):
+        """Return the set of hosts that can pass the filter according to
+        the scheduler's AggregateIndex, or None if any host can.
+
+        Hosts left out are dropped before any filter runs.
+        """
+        return None
+
     def _full_name(self):
         """module.classname of the filter."""
         return "%s.%s" % (self.__module__, self.__class__.__name__)
 
 
+class FilterResultCache(object):
+    """Remembers the results of cacheable filters for each host.
+
+    Results are keyed by filter class, host and the filter's cache_key()
+    for the request.  All results for a host are dropped when its
+    capabilities timestamp changes or its HostState is updated, either from
+    its compute node or by consuming resources.
+    """
+
+    def __init__(self, max_results_per_host=100):
+        self.max_results_per_host = max_results_per_host
+        self._hosts = {}  # { <host> : (<validity token>, { <key> : bool }) }
+        self.hits = 0
+        self.misses = 0
+
+    def forget(self, host):
+        self._hosts.pop(host, None)
+
+    def wrap(self, filter_fn, filter_properties):
+        """Return filter_fn, caching its results if its filter is
+        cacheable for this request.
+        """
+        filter_obj = getattr(filter_fn, '__self__', None)
+        cache_key = getattr(filter_obj, 'cache_key', None)
+        if cache_key is None:
+            return filter_fn
+        key = cache_key(filter_properties)
+        if key is None:
+            return filter_fn
+        key = (filter_obj._full_name(), key)
+
+        def host_passes(host_state, filter_properties):
+            token = (host_state.capabilities.get('timestamp'),
+                     host_state.updated)
+            entry = self._hosts.get(host_state.host)
+            if (entry is None or entry[0] != token or
+                    len(entry[1]) >= self.max_results_per_host):
+                entry = (token, {})
+                self._hosts[host_state.host] = entry
+            results = entry[1]
+            if key in results:
+                self.hits += 1
+                return results[key]
+            self.misses += 1
+            result = filter_fn(host_state, filter_properties)
+            results[key] = result
+            return result
+
+        host_passes.__name__ = 'cached_%s' % filter_obj.__class__.__name__
+        return host_passes
+
+
 def _is_filter_class(cls):
     """Return whether a class is a valid Host Filter class."""
     return type(cls) is types.TypeType and issubclass(cls, BaseHostFilter)
@@ -26,6 +26,31 @@ LOG = logging.getLogger(__name__)
 class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     """AggregateInstanceExtraSpecsFilter works with InstanceType records."""
 
+    def cache_key(self, filter_properties):
+        # Cached results are dropped for hosts whose aggregate metadata
+        # changes when the scheduler's AggregateIndex is reloaded.
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return None
+        return tuple(sorted(instance_type.get('extra_specs', {}).items()))
+
+    def candidate_hosts(self, filter_properties, aggregate_index):
+        """Hosts having every extra spec without an operator set to the
+        same value in one of their aggregates."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type or 'extra_specs' not in instance_type:
+            return None
+        candidates = None
+        for key, req in instance_type['extra_specs'].iteritems():
+            if key.count(':') or not extra_specs_ops.is_exact(req):
+                continue
+            hosts = aggregate_index.get_hosts(key, req)
+            if candidates is None:
+                candidates = hosts
+            else:
+                candidates = candidates & hosts
+        return candidates
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
@@ -36,8 +61,11 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
         if 'extra_specs' not in instance_type:
             return True
 
-        context = filter_properties['context'].elevated()
-        metadata = db.aggregate_metadata_get_by_host(context, host_state.host)
+        metadata = host_state.aggregate_metadata
+        if metadata is None:
+            context = filter_properties['context'].elevated()
+            metadata = db.aggregate_metadata_get_by_host(context,
+                                                         host_state.host)
 
         for key, req in instance_type['extra_specs'].iteritems():
             # NOTE(jogo) any key containing a scope (scope is terminated
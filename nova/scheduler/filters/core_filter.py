@@ -54,3 +54,18 @@ class CoreFilter(filters.BaseHostFilter):
             host_state.limits['vcpu'] = vcpus_total
 
         return (vcpus_total - host_state.vcpus_used) >= instance_vcpus
+
+    def filter_columns(self, columns, filter_properties):
+        """Vectorized form of host_passes()."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return columns.all_passing()
+
+        instance_vcpus = instance_type['vcpus']
+        # Hosts not reporting VCPUs pass, as in host_passes()
+        vcpus_unknown = columns['vcpus_total'] == 0
+        vcpus_total = columns['vcpus_total'] * FLAGS.cpu_allocation_ratio
+        columns.set_limit('vcpu', vcpus_total, where=vcpus_total > 0)
+
+        return (vcpus_unknown |
+                ((vcpus_total - columns['vcpus_used']) >= instance_vcpus))
@@ -34,6 +34,12 @@ _op_methods = {'=': lambda x, y: float(x) >= float(y),
                's>=': operator.ge}
 
 
+def is_exact(req):
+    """Return whether req only matches values equal to it."""
+    words = req.split()
+    return not words or (words[0] != '<or>' and words[0] not in _op_methods)
+
+
 def match(value, req):
     words = req.split()
 
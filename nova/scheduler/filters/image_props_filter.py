@@ -68,6 +68,13 @@ class ImagePropertiesFilter(filters.BaseHostFilter):
                     "capabilities %(capabilities)s"), locals())
         return False
 
+    def cache_key(self, filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        image_props = spec.get('image', {}).get('properties', {})
+        return (image_props.get('architecture', None),
+                image_props.get('hypervisor_type', None),
+                image_props.get('vm_mode', None))
+
     def host_passes(self, host_state, filter_properties):
         """Check if host passes specified image properties.
 
@@ -86,43 +86,81 @@ class JsonFilter(filters.BaseHostFilter):
         'and': _and,
     }
 
-    def _parse_string(self, string, host_state):
+    def _compile_string(self, string):
         """Strings prefixed with $ are capability lookups in the
         form '$variable' where 'variable' is an attribute in the
         HostState class.  If $variable is a dictionary, you may
         use: $variable.dictkey
-        """
-        if not string:
-            return None
-        if not string.startswith("$"):
-            return string
 
+        Returns a function doing the lookup in a host_state.
+        """
         path = string[1:].split(".")
-        obj = getattr(host_state, path[0], None)
-        if obj is None:
-            return None
-        for item in path[1:]:
-            obj = obj.get(item, None)
+        name = path[0]
+        keys = path[1:]
+
+        def lookup(host_state):
+            obj = getattr(host_state, name, None)
             if obj is None:
                 return None
-        return obj
+            for key in keys:
+                obj = obj.get(key, None)
+                if obj is None:
+                    return None
+            return obj
 
-    def _process_filter(self, query, host_state):
-        """Recursively parse the query structure."""
+        return lookup
+
+    def _compile_query(self, query):
+        """Recursively compile the query structure into a function of
+        a host_state, so the query is only parsed once for all hosts.
+        """
         if not query:
-            return True
+            return lambda host_state: True
         cmd = query[0]
         method = self.commands[cmd]
-        cooked_args = []
+
+        # (argument, is_constant): variables and sub-queries are
+        # functions of the host_state, which are dropped when they
+        # evaluate to None.
+        args = []
         for arg in query[1:]:
             if isinstance(arg, list):
-                arg = self._process_filter(arg, host_state)
+                args.append((self._compile_query(arg), False))
             elif isinstance(arg, basestring):
-                arg = self._parse_string(arg, host_state)
-            if arg is not None:
+                if arg.startswith("$"):
+                    args.append((self._compile_string(arg), False))
+                elif arg:
+                    args.append((arg, True))
+            elif arg is not None:
+                args.append((arg, True))
+
+        if all(is_constant for arg, is_constant in args):
+            result = method(self, [arg for arg, is_constant in args])
+            return lambda host_state: result
+
+        def evaluate(host_state):
+            cooked_args = []
+            for arg, is_constant in args:
+                if not is_constant:
+                    arg = arg(host_state)
+                    if arg is None:
+                        continue
                 cooked_args.append(arg)
-        result = method(self, cooked_args)
-        return result
+            return method(self, cooked_args)
+
+        return evaluate
+
+    def _get_query(self, query):
+        """Return the compiled query, compiling it on first use.
+
+        A filter instance is created for each request, so the query
+        is compiled once per request.
+        """
+        compiled = getattr(self, '_compiled', None)
+        if compiled is None or compiled[0] != query:
+            compiled = (query, self._compile_query(jsonutils.loads(query)))
+            self._compiled = compiled
+        return compiled[1]
 
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can fulfill the requirements
@@ -138,7 +176,7 @@ class JsonFilter(filters.BaseHostFilter):
         # NOTE(comstud): Not checking capabilities or service for
         # enabled/disabled so that a provided json filter can decide
 
-        result = self._process_filter(jsonutils.loads(query), host_state)
+        result = self._get_query(query)(host_state)
         if isinstance(result, list):
             # If any succeeded, include the host
             result = any(result)
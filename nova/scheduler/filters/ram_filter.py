@@ -51,3 +51,16 @@ class RamFilter(filters.BaseHostFilter):
         # save oversubscription limit for compute node to test against:
         host_state.limits['memory_mb'] = memory_mb_limit
         return True
+
+    def filter_columns(self, columns, filter_properties):
+        """Vectorized form of host_passes()."""
+        instance_type = filter_properties.get('instance_type')
+        requested_ram = instance_type['memory_mb']
+        free_ram_mb = columns['free_ram_mb']
+        total_usable_ram_mb = columns['total_usable_ram_mb']
+
+        memory_mb_limit = total_usable_ram_mb * FLAGS.ram_allocation_ratio
+        used_ram_mb = total_usable_ram_mb - free_ram_mb
+        usable_ram = memory_mb_limit - used_ram_mb
+        columns.set_limit('memory_mb', memory_mb_limit)
+        return usable_ram >= requested_ram
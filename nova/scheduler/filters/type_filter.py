@@ -25,6 +25,14 @@ class TypeAffinityFilter(filters.BaseHostFilter):
     (dispersion) set to 1 (-1 by default).
     """
 
+    def cache_key(self, filter_properties):
+        # Instances landing on or leaving the host update its HostState,
+        # which drops cached results for it.
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return None
+        return instance_type['id']
+
     def host_passes(self, host_state, filter_properties):
         """Dynamically limits hosts to one instance type
 
@@ -48,8 +56,10 @@ class AggregateTypeAffinityFilter(filters.BaseHostFilter):
 
     def host_passes(self, host_state, filter_properties):
         instance_type = filter_properties.get('instance_type')
-        context = filter_properties['context'].elevated()
-        metadata = db.aggregate_metadata_get_by_host(
-                     context, host_state.host, key='instance_type')
-        return (len(metadata) == 0 or
-                instance_type['name'] in metadata['instance_type'])
+        metadata = host_state.aggregate_metadata
+        if metadata is None:
+            context = filter_properties['context'].elevated()
+            metadata = db.aggregate_metadata_get_by_host(
+                         context, host_state.host, key='instance_type')
+        names = metadata.get('instance_type')
+        return not names or instance_type['name'] in names
@@ -17,6 +17,7 @@
 Manage hosts in the current zone.
 """
 
+import datetime
 import UserDict
 
 from nova import db
@@ -25,7 +26,11 @@ from nova import flags
 from nova.openstack.common import cfg
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova.scheduler import aggregate_index
 from nova.scheduler import filters
+from nova.scheduler import host_partition
+from nova.scheduler import least_cost
+from nova.scheduler import profiler
 
 host_manager_opts = [
     cfg.MultiStrOpt('scheduler_available_filters',
@@ -45,6 +50,18 @@ host_manager_opts = [
                   ],
                 help='Which filter class names to use for filtering hosts '
                       'when not specified in the request.'),
+    cfg.IntOpt('scheduler_host_state_refresh_interval',
+               default=600,
+               help='Seconds between full reloads of all compute nodes into '
+                    'the cached host states.  In between, only compute '
+                    'nodes changed since the previous load are read.  '
+                    'Set to 0 to reload every compute node on each '
+                    'request.'),
+    cfg.BoolOpt('scheduler_cache_filter_results',
+                default=True,
+                help='Cache the results of filters declaring a cache_key() '
+                     'for each host until its capabilities or resources '
+                     'change.'),
     ]
 
 FLAGS = flags.FLAGS
@@ -94,15 +111,8 @@ class HostState(object):
     def __init__(self, host, topic, capabilities=None, service=None):
         self.host = host
         self.topic = topic
+        self.update_capabilities(capabilities, service)
 
-        # Read-only capability dicts
-
-        if capabilities is None:
-            capabilities = {}
-        self.capabilities = ReadOnlyDict(capabilities.get(topic, None))
-        if service is None:
-            service = {}
-        self.service = ReadOnlyDict(service)
         # Mutable available resources.
         # These will change as resources are virtually "consumed".
         self.total_usable_disk_gb = 0
@@ -115,8 +125,32 @@ class HostState(object):
         # Resource oversubscription values for the compute host:
         self.limits = {}
 
+        # Time of the last update from the db or of the last consumption
+        self.updated = None
+
+        # Metadata of the host's aggregates from the scheduler's
+        # AggregateIndex, None if filters must read it from the db.
+        self.aggregate_metadata = None
+
+    def update_capabilities(self, capabilities=None, service=None):
+        """Replace the read-only capability and service dicts."""
+        if capabilities is None:
+            capabilities = {}
+        self.capabilities = ReadOnlyDict(capabilities.get(self.topic, None))
+        if service is None:
+            service = {}
+        self.service = ReadOnlyDict(service)
+
     def update_from_compute_node(self, compute):
-        """Update information about a host from its compute_node info."""
+        """Update information about a host from its compute_node info.
+
+        Resources consumed by the scheduler since the compute node was
+        last written are kept until the compute node reports again.
+        """
+        updated = compute.get('updated_at') or compute.get('created_at')
+        if self.updated and updated and self.updated > updated:
+            return
+
         all_ram_mb = compute['memory_mb']
 
         # Assume virtual size is all consumed by instances if use qcow2 disk.
@@ -133,6 +167,7 @@ class HostState(object):
         self.free_disk_mb = free_disk_mb
         self.vcpus_total = compute['vcpus']
         self.vcpus_used = compute['vcpus_used']
+        self.updated = updated
 
     def consume_from_instance(self, instance):
         """Incrementally update host state from an instance"""
@@ -142,6 +177,7 @@ class HostState(object):
         self.free_ram_mb -= ram_mb
         self.free_disk_mb -= disk_mb
         self.vcpus_used += vcpus
+        self.updated = timeutils.utcnow()
 
     def passes_filters(self, filter_fns, filter_properties):
         """Return whether or not this host passes filters."""
@@ -182,8 +218,15 @@ class HostManager(object):
 
     def __init__(self):
         self.service_states = {}  # { <host> : { <service> : { cap k : v }}}
+        self.host_state_map = {}  # { <host> : HostState() }
+        self._last_refresh = None
+        self._last_full_refresh = None
         self.filter_classes = filters.get_filter_classes(
                 FLAGS.scheduler_available_filters)
+        self.filter_result_cache = filters.FilterResultCache()
+        self.partitioner = host_partition.HostPartitioner()
+        self.profiler = profiler.SchedulerProfiler()
+        self.aggregate_index = aggregate_index.AggregateIndex()
 
     def _choose_host_filters(self, filters):
         """Since the caller may specify which filters to use we need
@@ -220,11 +263,78 @@ class HostManager(object):
         """Filter hosts and return only ones passing all filters"""
         filtered_hosts = []
         filter_fns = self._choose_host_filters(filters)
+        hosts = self._prune_hosts(hosts, filter_fns, filter_properties)
+        filter_fns = [self._wrap_filter(filter_fn, filter_properties)
+                      for filter_fn in filter_fns]
         for host in hosts:
             if host.passes_filters(filter_fns, filter_properties):
                 filtered_hosts.append(host)
         return filtered_hosts
 
+    def _prune_hosts(self, hosts, filter_fns, filter_properties):
+        """Drop the hosts filters rule out with the aggregate index, see
+        BaseHostFilter.candidate_hosts().
+        """
+        if (self.aggregate_index.last_refresh is None or
+                filter_properties.get('force_hosts')):
+            return hosts
+        candidates = None
+        for filter_fn in filter_fns:
+            filter_obj = getattr(filter_fn, '__self__', None)
+            candidate_hosts = getattr(filter_obj, 'candidate_hosts', None)
+            if candidate_hosts is None:
+                continue
+            filter_hosts = candidate_hosts(filter_properties,
+                                           self.aggregate_index)
+            if filter_hosts is None:
+                continue
+            if candidates is None:
+                candidates = filter_hosts
+            else:
+                candidates = candidates & filter_hosts
+        if candidates is None:
+            return hosts
+        return [host_state for host_state in hosts
+                if host_state.host in candidates]
+
+    def _wrap_filter(self, filter_fn, filter_properties):
+        """Add result caching and profiling to a filter function."""
+        wrapped_fn = filter_fn
+        if FLAGS.scheduler_cache_filter_results:
+            wrapped_fn = self.filter_result_cache.wrap(filter_fn,
+                                                       filter_properties)
+        return self.profiler.wrap_filter(wrapped_fn,
+                                         profiler.fn_name(filter_fn))
+
+    def weigh_hosts(self, weighted_fns, hosts, weighing_properties):
+        """Return the WeightedHost with the lowest weighted cost"""
+        return least_cost.weighted_sum(
+                self.profiler.wrap_cost_fns(weighted_fns), hosts,
+                weighing_properties)
+
+    def weigh_all_hosts(self, weighted_fns, hosts, weighing_properties):
+        """Return a WeightedHost for each host, in the order given"""
+        return least_cost.weigh_all(
+                self.profiler.wrap_cost_fns(weighted_fns), hosts,
+                weighing_properties)
+
+    def partition_hosts(self, context, hosts):
+        """Split hosts into the ones this scheduler owns and the others.
+
+        Without scheduler_partition_hosts, this scheduler owns every host.
+        """
+        if not FLAGS.scheduler_partition_hosts:
+            return list(hosts), []
+        self.partitioner.refresh(context)
+        own_hosts = []
+        other_hosts = []
+        for host_state in hosts:
+            if self.partitioner.owns(host_state.host):
+                own_hosts.append(host_state)
+            else:
+                other_hosts.append(host_state)
+        return own_hosts, other_hosts
+
     def update_service_capabilities(self, service_name, host, capabilities):
         """Update the per-service capabilities based on this notification."""
         LOG.debug(_("Received %(service_name)s service update from "
@@ -236,6 +346,111 @@ class HostManager(object):
         service_caps[service_name] = capab_copy
         self.service_states[host] = service_caps
 
+        host_state = self.host_state_map.get(host)
+        if host_state and host_state.topic == service_name:
+            host_state.update_capabilities(service_caps,
+                                           dict(host_state.service))
+
+    def _update_host_state(self, host, topic, compute, service):
+        """Create or refresh the cached HostState for a compute node."""
+        capabilities = self.service_states.get(host, None)
+        service = dict(service.iteritems())
+        host_state = self.host_state_map.get(host)
+        if host_state:
+            host_state.update_capabilities(capabilities, service)
+        else:
+            host_state = self.host_state_cls(host, topic,
+                    capabilities=capabilities, service=service)
+            self._update_aggregate_metadata(host_state)
+            self.host_state_map[host] = host_state
+        host_state.update_from_compute_node(compute)
+
+    def _update_aggregate_metadata(self, host_state):
+        if self.aggregate_index.last_refresh is not None:
+            host_state.aggregate_metadata = (
+                    self.aggregate_index.get_metadata(host_state.host))
+
+    def _refresh_aggregate_index(self, context):
+        """Reload the aggregate index when it's stale, dropping cached
+        filter results of hosts whose aggregate metadata changed.
+        """
+        if not self.aggregate_index.needs_refresh():
+            return
+        for host in self.aggregate_index.refresh(context):
+            self.filter_result_cache.forget(host)
+        for host_state in self.host_state_map.itervalues():
+            self._update_aggregate_metadata(host_state)
+
+    def _remove_host_state(self, host):
+        """Drop a host that has gone away from the cached host states."""
+        LOG.info(_("Removing dead compute host %(host)s from the "
+                   "host state cache") % locals())
+        del self.host_state_map[host]
+        self.filter_result_cache.forget(host)
+
+    def _refresh_all_host_states(self, context, topic):
+        """Load every compute node and drop hosts that have gone away."""
+        seen_hosts = set()
+        compute_nodes = db.compute_node_get_all(context)
+        for compute in compute_nodes:
+            service = compute['service']
+            if not service:
+                LOG.warn(_("No service for compute ID %s") % compute['id'])
+                continue
+            host = service['host']
+            self._update_host_state(host, topic, compute, service)
+            seen_hosts.add(host)
+
+        for host in set(self.host_state_map) - seen_hosts:
+            self._remove_host_state(host)
+
+    def _refresh_changed_host_states(self, context, topic):
+        """Reload only compute nodes changed since the previous refresh.
+
+        Services are re-read on every call, as ComputeFilter relies on
+        their heartbeat and disabled flag being current.
+        """
+        # NOTE: compute nodes stamp their rows with their own clock, so
+        # look back far enough to tolerate some clock skew.
+        changes_since = self._last_refresh - datetime.timedelta(
+                seconds=FLAGS.service_down_time)
+
+        services = dict((service['id'], service)
+                        for service in db.service_get_all(context)
+                        if service['topic'] == topic)
+        service_hosts = set(service['host'] for service in
+                            services.itervalues())
+        for host in self.host_state_map.keys():
+            if host not in service_hosts:
+                self._remove_host_state(host)
+
+        changed_nodes = db.compute_node_get_all_changed_since(context,
+                changes_since)
+        # Process removals first, a host may have had its compute node
+        # replaced since the previous refresh.
+        for compute in changed_nodes:
+            if not compute['deleted']:
+                continue
+            service = services.get(compute['service_id'])
+            if service and service['host'] in self.host_state_map:
+                self._remove_host_state(service['host'])
+        for compute in changed_nodes:
+            if compute['deleted']:
+                continue
+            service = compute['service']
+            if not service:
+                LOG.warn(_("No service for compute ID %s") % compute['id'])
+                continue
+            self._update_host_state(service['host'], topic, compute,
+                                    service)
+
+        for service in services.itervalues():
+            host_state = self.host_state_map.get(service['host'])
+            if host_state:
+                host_state.update_capabilities(
+                        self.service_states.get(service['host'], None),
+                        dict(service.iteritems()))
+
     def get_all_host_states(self, context, topic):
         """Returns a dict of all the hosts the HostManager
         knows about. Also, each of the consumable resources in HostState
@@ -244,7 +459,12 @@ class HostManager(object):
         For example:
         {'192.168.1.100': HostState(), ...}
 
-        Note: this can be very slow with a lot of instances.
+        HostStates are cached between calls, so resources consumed by
+        earlier requests are kept until the compute node reports newer
+        usage.  Only compute nodes changed since the previous call are
+        read from the db, except every
+        scheduler_host_state_refresh_interval seconds when all of them
+        are reloaded.
         InstanceType table isn't required since a copy is stored
         with the instance (in case the InstanceType changed since the
         instance was created)."""
@@ -253,21 +473,16 @@ class HostManager(object):
             raise NotImplementedError(_(
                 "host_manager only implemented for 'compute'"))
 
-        host_state_map = {}
+        self._refresh_aggregate_index(context)
 
-        # Get resource usage across the available compute nodes:
-        compute_nodes = db.compute_node_get_all(context)
-        for compute in compute_nodes:
-            service = compute['service']
-            if not service:
-                LOG.warn(_("No service for compute ID %s") % compute['id'])
-                continue
-            host = service['host']
-            capabilities = self.service_states.get(host, None)
-            host_state = self.host_state_cls(host, topic,
-                    capabilities=capabilities,
-                    service=dict(service.iteritems()))
-            host_state.update_from_compute_node(compute)
-            host_state_map[host] = host_state
+        now = timeutils.utcnow()
+        interval = FLAGS.scheduler_host_state_refresh_interval
+        if (self._last_full_refresh is None or interval <= 0 or
+                timeutils.is_older_than(self._last_full_refresh, interval)):
+            self._refresh_all_host_states(context, topic)
+            self._last_full_refresh = now
+        else:
+            self._refresh_changed_host_states(context, topic)
+        self._last_refresh = now
 
-        return host_state_map
+        return dict(self.host_state_map)
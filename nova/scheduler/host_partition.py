@@ -0,0 +1,112 @@
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Partition compute hosts between scheduler workers.
+
+Host names are placed on a consistent hash ring of the scheduler services
+that are currently up, so each scheduler owns a disjoint subset of hosts.
+When a scheduler joins or leaves, only the hosts it owned, or is about to
+own, move.
+"""
+
+import bisect
+import hashlib
+
+from nova import db
+from nova import flags
+from nova.openstack.common import cfg
+from nova.openstack.common import log as logging
+from nova import utils
+
+
+host_partition_opts = [
+    cfg.BoolOpt('scheduler_partition_hosts',
+                default=False,
+                help='Split compute hosts between the running schedulers '
+                     'with a consistent hash ring, so each scheduler places '
+                     'instances on its own subset of hosts.'),
+    cfg.IntOpt('scheduler_partition_replicas',
+               default=100,
+               help='Number of points each scheduler gets on the hash '
+                    'ring.  More points spread hosts more evenly.'),
+    cfg.BoolOpt('scheduler_partition_fallback',
+                default=True,
+                help='Place instances on hosts outside the scheduler\'s '
+                     'partition when none of its own hosts can take them.'),
+    ]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(host_partition_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+class HashRing(object):
+    """Consistent hash ring mapping keys to members."""
+
+    def __init__(self, members, replicas=100):
+        self.members = frozenset(members)
+        ring = []
+        for member in self.members:
+            for i in xrange(replicas):
+                ring.append((_hash('%s-%d' % (member, i)), member))
+        ring.sort()
+        self._hashes = [point for point, member in ring]
+        self._members = [member for point, member in ring]
+
+    def get_member(self, key):
+        """Return the member owning key, or None for an empty ring."""
+        if not self._members:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key))
+        return self._members[index % len(self._members)]
+
+
+class HostPartitioner(object):
+    """Keeps track of which compute hosts this scheduler owns."""
+
+    def __init__(self, scheduler_host=None):
+        self.scheduler_host = scheduler_host or FLAGS.host
+        self.ring = HashRing([self.scheduler_host],
+                             FLAGS.scheduler_partition_replicas)
+
+    def _get_schedulers(self, context):
+        """Return the names of the scheduler services that are up.
+
+        This scheduler is always included, its own heartbeat may not have
+        been recorded yet.
+        """
+        services = db.service_get_all_by_topic(context, FLAGS.scheduler_topic)
+        schedulers = set(service['host'] for service in services
+                         if utils.service_is_up(service))
+        schedulers.add(self.scheduler_host)
+        return schedulers
+
+    def refresh(self, context):
+        """Rebuild the ring if schedulers joined or left."""
+        schedulers = self._get_schedulers(context)
+        if schedulers != self.ring.members:
+            LOG.info(_("Rebalancing compute hosts between schedulers: "
+                       "%s") % ', '.join(sorted(schedulers)))
+            self.ring = HashRing(schedulers,
+                                 FLAGS.scheduler_partition_replicas)
+
+    def owns(self, host):
+        return self.ring.get_member(host) == self.scheduler_host
@@ -73,11 +73,32 @@ class WeightedHost(object):
         return "WeightedHost with no host_state"
 
 
+def vectorized(columns_fn):
+    """Declare columns_fn(columns, weighing_properties) as the vectorized
+    form of the decorated cost function.  It returns the costs of all the
+    hosts in `columns` at once, as an array or a single value.
+    """
+    def decorator(cost_fn):
+        cost_fn.columns_fn = columns_fn
+        return cost_fn
+    return decorator
+
+
+def _noop_cost_columns(columns, weighing_properties):
+    return 1
+
+
+@vectorized(_noop_cost_columns)
 def noop_cost_fn(host_state, weighing_properties):
     """Return a pre-weight cost of 1 for each host"""
     return 1
 
 
+def _fill_first_cost_columns(columns, weighing_properties):
+    return columns['free_ram_mb']
+
+
+@vectorized(_fill_first_cost_columns)
 def compute_fill_first_cost_fn(host_state, weighing_properties):
     """More free ram = higher weight. So servers with less free
     ram will be preferred.
@@ -89,6 +110,19 @@ def compute_fill_first_cost_fn(host_state, weighing_properties):
     return host_state.free_ram_mb
 
 
+def weigh_all(weighted_fns, host_states, weighing_properties):
+    """Compute the weighted-sum score of every host.
+
+    :returns: a list of WeightedHost objects, in the order of host_states.
+    """
+    weighted_hosts = []
+    for host_state in host_states:
+        score = sum(weight * fn(host_state, weighing_properties)
+                    for weight, fn in weighted_fns)
+        weighted_hosts.append(WeightedHost(score, host_state=host_state))
+    return weighted_hosts
+
+
 def weighted_sum(weighted_fns, host_states, weighing_properties):
     """Use the weighted-sum method to compute a score for an array of objects.
 
@@ -53,7 +53,7 @@ QUOTAS = quota.QUOTAS
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    RPC_API_VERSION = '2.2'
+    RPC_API_VERSION = '2.4'
 
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         if not scheduler_driver:
@@ -69,6 +69,10 @@ class SchedulerManager(manager.Manager):
         self.driver.update_service_capabilities(service_name, host,
                 capabilities)
 
+    def update_aggregates(self, context):
+        """Process a notification that host aggregates changed."""
+        self.driver.update_aggregates()
+
     def create_volume(self, context, volume_id, snapshot_id,
                       reservations=None, image_id=None):
         try:
@@ -255,6 +259,21 @@ class SchedulerManager(manager.Manager):
 
         return {'resource': resource, 'usage': usage}
 
+    def get_scheduler_profile(self, context):
+        """Return the filter and cost function timings of recent
+        scheduling requests, see nova.scheduler.profiler.
+        """
+        return self.driver.get_scheduler_profile()
+
     @manager.periodic_task
     def _expire_reservations(self, context):
         QUOTAS.expire(context)
+
+    @manager.periodic_task
+    def _refresh_quota_usages(self, context):
+        QUOTAS.refresh_usages(context)
+
+    @manager.periodic_task
+    def _roll_up_tenant_usage(self, context):
+        if FLAGS.tenant_usage_rollup:
+            compute_utils.roll_up_tenant_usage(context)
@@ -74,6 +74,13 @@ class MultiScheduler(driver.Scheduler):
     def schedule_create_volume(self, *args, **kwargs):
         return self.drivers['volume'].schedule_create_volume(*args, **kwargs)
 
+    def get_scheduler_profile(self):
+        return self.drivers['compute'].get_scheduler_profile()
+
+    def update_aggregates(self):
+        for d in self.drivers.values():
+            d.update_aggregates()
+
     def update_service_capabilities(self, service_name, host, capabilities):
         # Multi scheduler is only a holder of sub-schedulers, so
         # pass the capabilities to the schedulers that matter
@@ -0,0 +1,227 @@
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing of the filters and cost functions used for scheduling requests.
+
+While a request is being scheduled, the time spent in each filter and cost
+function is added up, along with the number of hosts each filter was given
+and eliminated.  When the request is done, these totals go into rolling
+histograms covering the most recent requests, which can be dumped through
+SchedulerManager.get_scheduler_profile().
+"""
+
+import collections
+import time
+
+from eventlet import corolocal
+
+from nova import flags
+from nova.openstack.common import cfg
+from nova.openstack.common import log as logging
+from nova.openstack.common.notifier import api as notifier
+
+
+scheduler_profiler_opts = [
+    cfg.BoolOpt('scheduler_profile',
+                default=False,
+                help='Time each filter and cost function used for '
+                     'scheduling requests, and count the hosts each filter '
+                     'eliminates.'),
+    cfg.IntOpt('scheduler_profile_window',
+               default=1000,
+               help='Number of recent scheduling requests the profile '
+                    'statistics are computed over.'),
+    cfg.BoolOpt('scheduler_profile_notifications',
+                default=False,
+                help='Send a scheduler.profile notification with the '
+                     'timings of every scheduling request.'),
+    ]
+
+FLAGS = flags.FLAGS
+FLAGS.register_opts(scheduler_profiler_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """The most recent samples of a value."""
+
+    def __init__(self, size):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def summary(self):
+        """Return the count, mean, maximum and percentiles of the samples."""
+        samples = sorted(self.samples)
+        if not samples:
+            return {'count': 0}
+
+        def percentile(percent):
+            index = int(round(percent / 100.0 * (len(samples) - 1)))
+            return samples[index]
+
+        return {'count': len(samples),
+                'mean': sum(samples) / float(len(samples)),
+                'p50': percentile(50),
+                'p90': percentile(90),
+                'p99': percentile(99),
+                'max': samples[-1]}
+
+
+class RequestProfile(object):
+    """Timings of a single scheduling request."""
+
+    def __init__(self):
+        self.start = time.time()
+        # { (kind, name) : {'seconds': s, 'hosts': n, 'eliminated': n} }
+        self.entries = {}
+
+    def add(self, kind, name, seconds, hosts=0, eliminated=0):
+        entry = self.entries.get((kind, name))
+        if entry is None:
+            entry = {'seconds': 0.0, 'hosts': 0, 'eliminated': 0}
+            self.entries[(kind, name)] = entry
+        entry['seconds'] += seconds
+        entry['hosts'] += hosts
+        entry['eliminated'] += eliminated
+
+
+def fn_name(fn):
+    fn_self = getattr(fn, '__self__', None)
+    if fn_self is not None:
+        return fn_self.__class__.__name__
+    return getattr(fn, '__name__', repr(fn))
+
+
+class SchedulerProfiler(object):
+    """Collects the timings of scheduling requests.
+
+    Each request runs in its own greenthread, so the request being
+    profiled is kept in greenthread local storage.
+    """
+
+    def __init__(self):
+        self._local = corolocal.local()
+        # { (kind, name) : {'seconds': Histogram(),
+        #                   'eliminated': Histogram()} }, filters only
+        # have the latter.
+        self.histograms = {}
+
+    @property
+    def current(self):
+        """The RequestProfile of the request being scheduled, if any."""
+        return getattr(self._local, 'request', None)
+
+    def start_request(self):
+        if FLAGS.scheduler_profile:
+            self._local.request = RequestProfile()
+
+    def finish_request(self, context):
+        request = self.current
+        if request is None:
+            return
+        self._local.request = None
+        request.add('request', 'total', time.time() - request.start)
+
+        for key, entry in request.entries.iteritems():
+            histograms = self.histograms.get(key)
+            if histograms is None:
+                size = FLAGS.scheduler_profile_window
+                histograms = {'seconds': Histogram(size)}
+                if key[0] == 'filter':
+                    histograms['eliminated'] = Histogram(size)
+                self.histograms[key] = histograms
+            for name, histogram in histograms.iteritems():
+                histogram.add(entry[name])
+
+        if FLAGS.scheduler_profile_notifications:
+            payload = dict(host=FLAGS.host, profile=[
+                    dict(entry, kind=kind, name=name)
+                    for (kind, name), entry in request.entries.iteritems()])
+            notifier.notify(context, notifier.publisher_id('scheduler'),
+                            'scheduler.profile', notifier.INFO, payload)
+
+    def record(self, kind, name, seconds, hosts=0, eliminated=0):
+        """Add to the totals of the request being scheduled, if any."""
+        request = self.current
+        if request is not None:
+            request.add(kind, name, seconds, hosts, eliminated)
+
+    def wrap_filter(self, filter_fn, name=None):
+        """Return filter_fn timing itself in the current request, or
+        filter_fn itself when no request is being profiled.
+        """
+        request = self.current
+        if request is None:
+            return filter_fn
+        name = name or fn_name(filter_fn)
+
+        def profiled_filter(host_state, filter_properties):
+            start = time.time()
+            result = filter_fn(host_state, filter_properties)
+            request.add('filter', name, time.time() - start, 1,
+                        0 if result else 1)
+            return result
+
+        return profiled_filter
+
+    def wrap_cost_fns(self, weighted_fns):
+        """Return weighted_fns with each cost function timing itself in
+        the current request.  Vectorized forms are timed as well.
+        """
+        request = self.current
+        if request is None:
+            return weighted_fns
+
+        def wrap(fn):
+            name = fn_name(fn)
+
+            def profiled_cost_fn(host_state, weighing_properties):
+                start = time.time()
+                result = fn(host_state, weighing_properties)
+                request.add('cost_function', name, time.time() - start, 1)
+                return result
+
+            columns_fn = getattr(fn, 'columns_fn', None)
+            if columns_fn is not None:
+                def profiled_columns_fn(columns, weighing_properties):
+                    start = time.time()
+                    result = columns_fn(columns, weighing_properties)
+                    request.add('cost_function', name, time.time() - start,
+                                len(columns))
+                    return result
+
+                profiled_cost_fn.columns_fn = profiled_columns_fn
+            return profiled_cost_fn
+
+        return [(weight, wrap(fn)) for weight, fn in weighted_fns]
+
+    def dump(self):
+        """Return the statistics of the recent requests.
+
+        For example:
+        {'filter': {'RamFilter': {'seconds': {...}, 'eliminated': {...}}},
+         'cost_function': {'compute_fill_first_cost_fn': {'seconds': ...}},
+         'request': {'total': {'seconds': {...}}}}
+        """
+        profile = {}
+        for (kind, name), histograms in self.histograms.iteritems():
+            profile.setdefault(kind, {})[name] = dict(
+                    (key, histogram.summary())
+                    for key, histogram in histograms.iteritems())
+        return profile
@@ -46,6 +46,8 @@ class SchedulerAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         2.0 - Remove 1.x backwards compat
         2.1 - Add image_id to create_volume()
         2.2 - Remove reservations argument to create_volume()
+        2.3 - Add get_scheduler_profile()
+        2.4 - Add update_aggregates()
     '''
 
     #
@@ -102,8 +104,16 @@ class SchedulerAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                                 image_id=image_id),
                   version='2.2')
 
+    def get_scheduler_profile(self, ctxt):
+        return self.call(ctxt, self.make_msg('get_scheduler_profile'),
+                         version='2.3')
+
     def update_service_capabilities(self, ctxt, service_name, host,
             capabilities):
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                 service_name=service_name, host=host,
                 capabilities=capabilities))
+
+    def update_aggregates(self, ctxt):
+        self.fanout_cast(ctxt, self.make_msg('update_aggregates'),
+                version='2.4')
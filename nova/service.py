@@ -433,14 +433,17 @@ class Service(object):
             self.timers.append(pulse)
 
         if self.periodic_interval:
+            self.manager.set_periodic_interval(self.periodic_interval)
             if self.periodic_fuzzy_delay:
                 initial_delay = random.randint(0, self.periodic_fuzzy_delay)
             else:
                 initial_delay = None
 
-            periodic = utils.LoopingCall(self.periodic_tasks)
-            periodic.start(interval=self.periodic_interval,
-                           initial_delay=initial_delay)
+            # NOTE: the manager returns when its next periodic task is due,
+            # so tasks with their own spacing run on time between ticks.
+            periodic = utils.DynamicLoopingCall(self.periodic_tasks)
+            periodic.start(initial_delay=initial_delay,
+                           periodic_interval_max=self.periodic_interval)
             self.timers.append(periodic)
 
     def _create_service_ref(self, context):
@@ -523,9 +526,13 @@ class Service(object):
                 pass
 
     def periodic_tasks(self, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        Returns the number of seconds until the next task is due.
+        """
         ctxt = context.get_admin_context()
-        self.manager.periodic_tasks(ctxt, raise_on_error=raise_on_error)
+        return self.manager.periodic_tasks(ctxt,
+                                           raise_on_error=raise_on_error)
 
     def report_state(self):
         """Update the state of this service in the datastore."""
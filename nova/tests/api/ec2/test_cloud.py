@@ -995,6 +995,42 @@ class CloudTestCase(test.TestCase):
         self.assertEqual(result1[0]['instanceId'],
                          ec2utils.id_to_ec2_inst_id(inst2['uuid']))
 
+    def test_describe_instances_bulk_lookups(self):
+        image_uuid = 'cedef40a-ed67-4d10-800e-17455edce175'
+        kernel_uuid = '76fa36fc-c930-4bf3-8c8a-ea2a2420deb6'
+        instances = [db.instance_create(self.context,
+                                        {'reservation_id': 'a',
+                                         'image_ref': image_uuid,
+                                         'kernel_id': kernel_uuid,
+                                         'instance_type_id': 1,
+                                         'host': 'host1',
+                                         'vm_state': 'active'})
+                     for i in range(3)]
+        comp = db.service_create(self.context, {'host': 'host1',
+                                                'availability_zone': 'zone1',
+                                                'topic': "compute"})
+        ec2_ids = [ec2utils.id_to_ec2_inst_id(instance['uuid'])
+                   for instance in instances]
+
+        def fail(*args, **kwargs):
+            self.fail('looked up per instance')
+
+        for name in ('service_get_all_by_host',
+                     'block_device_mapping_get_all_by_instance',
+                     'get_ec2_instance_id_by_uuid', 's3_image_get_by_uuid'):
+            self.stubs.Set(db, name, fail)
+
+        result = self.cloud.describe_instances(self.context)
+        result = result['reservationSet'][0]['instancesSet']
+        self.assertEqual([i['instanceId'] for i in result], ec2_ids)
+        for i in result:
+            self.assertEqual(i['imageId'], 'ami-00000001')
+            self.assertEqual(i['kernelId'], 'aki-00000002')
+            self.assertEqual(i['placement']['availabilityZone'], 'zone1')
+            self.assertEqual(i['rootDeviceType'], 'instance-store')
+
+        db.service_destroy(self.context, comp['id'])
+
     def test_describe_instances_with_image_deleted(self):
         image_uuid = 'aebef54a-ed67-4d10-912f-14455edce176'
         args1 = {'reservation_id': 'a',
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 from lxml import etree
 from webob import exc
 
@@ -73,13 +75,41 @@ TEST_HYPERS = [
          running_vms=2,
          cpu_info='cpu_info',
          disk_available_least=100)]
+TEST_HISTORY = [
+    dict(compute_node_id=1,
+         period_start=datetime.datetime(2012, 10, 1, 12, 0),
+         vcpus=4,
+         vcpus_used=1,
+         memory_mb=10 * 1024,
+         memory_mb_used=2 * 1024,
+         local_gb=250,
+         local_gb_used=50,
+         running_vms=1),
+    dict(compute_node_id=1,
+         period_start=datetime.datetime(2012, 10, 1, 12, 5),
+         vcpus=4,
+         vcpus_used=2,
+         memory_mb=10 * 1024,
+         memory_mb_used=5 * 1024,
+         local_gb=250,
+         local_gb_used=125,
+         running_vms=2),
+    dict(compute_node_id=2,
+         period_start=datetime.datetime(2012, 10, 1, 12, 5),
+         vcpus=4,
+         vcpus_used=2,
+         memory_mb=10 * 1024,
+         memory_mb_used=5 * 1024,
+         local_gb=250,
+         local_gb_used=125,
+         running_vms=2)]
 TEST_SERVERS = [dict(name="inst1", uuid="uuid1", host="compute1"),
                 dict(name="inst2", uuid="uuid2", host="compute2"),
                 dict(name="inst3", uuid="uuid3", host="compute1"),
                 dict(name="inst4", uuid="uuid4", host="compute2")]
 
 
-def fake_compute_node_get_all(context):
+def fake_compute_node_get_all(context, use_slave=False):
     return TEST_HYPERS
 
 
@@ -120,6 +150,28 @@ def fake_compute_node_statistics(context):
     return result
 
 
+def fake_compute_node_usage_history_get(context, compute_id, since=None):
+    return [period for period in TEST_HISTORY
+            if (period['compute_node_id'] == compute_id and
+                (since is None or period['period_start'] >= since))]
+
+
+def fake_compute_node_usage_history_statistics(context, since=None):
+    fields = ('vcpus', 'vcpus_used', 'memory_mb', 'memory_mb_used',
+              'local_gb', 'local_gb_used', 'running_vms')
+    results = {}
+    for period in TEST_HISTORY:
+        if since is not None and period['period_start'] < since:
+            continue
+        result = results.setdefault(period['period_start'],
+                dict((key, 0) for key in fields + ('count',)))
+        result['period_start'] = period['period_start']
+        result['count'] += 1
+        for key in fields:
+            result[key] += period[key]
+    return [results[key] for key in sorted(results)]
+
+
 def fake_instance_get_all_by_host(context, host):
     results = []
     for inst in TEST_SERVERS:
@@ -143,6 +195,10 @@ class HypervisorsTest(test.TestCase):
                        fake_compute_node_statistics)
         self.stubs.Set(db, 'instance_get_all_by_host',
                        fake_instance_get_all_by_host)
+        self.stubs.Set(db, 'compute_node_usage_history_get',
+                       fake_compute_node_usage_history_get)
+        self.stubs.Set(db, 'compute_node_usage_history_statistics',
+                       fake_compute_node_usage_history_statistics)
 
     def test_view_hypervisor_nodetail_noservers(self):
         result = self.controller._view_hypervisor(TEST_HYPERS[0], False)
@@ -331,6 +387,85 @@ class HypervisorsTest(test.TestCase):
                     running_vms=4,
                     disk_available_least=200)))
 
+    def test_history(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/1/history')
+        result = self.controller.history(req, '1')
+
+        self.assertEqual(result, dict(hypervisor=dict(
+                    id=1,
+                    hypervisor_hostname="hyper1",
+                    history=[
+                        dict(period_start='2012-10-01T12:00:00Z',
+                             vcpus=4,
+                             vcpus_used=1,
+                             memory_mb=10 * 1024,
+                             memory_mb_used=2 * 1024,
+                             local_gb=250,
+                             local_gb_used=50,
+                             running_vms=1),
+                        dict(period_start='2012-10-01T12:05:00Z',
+                             vcpus=4,
+                             vcpus_used=2,
+                             memory_mb=10 * 1024,
+                             memory_mb_used=5 * 1024,
+                             local_gb=250,
+                             local_gb_used=125,
+                             running_vms=2)])))
+
+    def test_history_since(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/1/history'
+                                      '?since=2012-10-01T12:01:00Z')
+        result = self.controller.history(req, '1')
+
+        history = result['hypervisor']['history']
+        self.assertEqual(1, len(history))
+        self.assertEqual('2012-10-01T12:05:00Z', history[0]['period_start'])
+
+    def test_history_invalid_since(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/1/history'
+                                      '?since=yesterday')
+        self.assertRaises(exc.HTTPBadRequest,
+                          self.controller.history, req, '1')
+
+    def test_history_noid(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/3/history')
+        self.assertRaises(exc.HTTPNotFound, self.controller.history, req, '3')
+
+    def test_statistics_history(self):
+        req = fakes.HTTPRequest.blank(
+                '/v2/fake/os-hypervisors/statistics_history')
+        result = self.controller.statistics_history(req)
+
+        self.assertEqual(result, dict(hypervisor_statistics_history=[
+                    dict(period_start='2012-10-01T12:00:00Z',
+                         count=1,
+                         vcpus=4,
+                         vcpus_used=1,
+                         memory_mb=10 * 1024,
+                         memory_mb_used=2 * 1024,
+                         local_gb=250,
+                         local_gb_used=50,
+                         running_vms=1),
+                    dict(period_start='2012-10-01T12:05:00Z',
+                         count=2,
+                         vcpus=8,
+                         vcpus_used=4,
+                         memory_mb=20 * 1024,
+                         memory_mb_used=10 * 1024,
+                         local_gb=500,
+                         local_gb_used=250,
+                         running_vms=4)]))
+
+    def test_statistics_history_since(self):
+        req = fakes.HTTPRequest.blank(
+                '/v2/fake/os-hypervisors/statistics_history'
+                '?since=2012-10-01T12:05:00Z')
+        result = self.controller.statistics_history(req)
+
+        history = result['hypervisor_statistics_history']
+        self.assertEqual(1, len(history))
+        self.assertEqual(2, history[0]['count'])
+
 
 class HypervisorsSerializersTest(test.TestCase):
     def compare_to_exemplar(self, exemplar, hyper):
@@ -509,3 +644,60 @@ class HypervisorsSerializersTest(test.TestCase):
 
         self.assertEqual('hypervisor_statistics', tree.tag)
         self.compare_to_exemplar(exemplar['hypervisor_statistics'], tree)
+
+    def test_history_serializer(self):
+        serializer = hypervisors.HypervisorHistoryTemplate()
+        exemplar = dict(hypervisor=dict(
+                hypervisor_hostname="hyper1",
+                id=1,
+                history=[
+                    dict(period_start='2012-10-01T12:00:00Z',
+                         vcpus=4,
+                         vcpus_used=1,
+                         memory_mb=10 * 1024,
+                         memory_mb_used=2 * 1024,
+                         local_gb=250,
+                         local_gb_used=50,
+                         running_vms=1),
+                    dict(period_start='2012-10-01T12:05:00Z',
+                         vcpus=4,
+                         vcpus_used=2,
+                         memory_mb=10 * 1024,
+                         memory_mb_used=5 * 1024,
+                         local_gb=250,
+                         local_gb_used=125,
+                         running_vms=2)]))
+        text = serializer.serialize(exemplar)
+        tree = etree.fromstring(text)
+
+        self.assertEqual('hypervisor', tree.tag)
+        self.assertEqual('hyper1', tree.get('hypervisor_hostname'))
+        self.assertEqual(1, len(tree))
+        history = tree[0]
+        self.assertEqual('history', history.tag)
+        self.assertEqual(2, len(history))
+        for idx, period in enumerate(history):
+            self.assertEqual('period', period.tag)
+            for key, value in exemplar['hypervisor']['history'][idx].items():
+                self.assertEqual(str(value), period.get(key))
+
+    def test_statistics_history_serializer(self):
+        serializer = hypervisors.HypervisorStatisticsHistoryTemplate()
+        exemplar = dict(hypervisor_statistics_history=[
+                dict(period_start='2012-10-01T12:05:00Z',
+                     count=2,
+                     vcpus=8,
+                     vcpus_used=4,
+                     memory_mb=20 * 1024,
+                     memory_mb_used=10 * 1024,
+                     local_gb=500,
+                     local_gb_used=250,
+                     running_vms=4)])
+        text = serializer.serialize(exemplar)
+        tree = etree.fromstring(text)
+
+        self.assertEqual('hypervisor_statistics_history', tree.tag)
+        self.assertEqual(1, len(tree))
+        self.assertEqual('period', tree[0].tag)
+        self.compare_to_exemplar(exemplar['hypervisor_statistics_history'][0],
+                                 tree[0])
@@ -23,6 +23,7 @@ import webob
 from nova.api.openstack.compute.contrib import simple_tenant_usage
 from nova.compute import api
 from nova import context
+from nova import db
 from nova import flags
 from nova.openstack.common import jsonutils
 from nova.openstack.common import policy as common_policy
@@ -69,7 +70,8 @@ def get_fake_db_instance(start, end, instance_id, tenant_id):
             'terminated_at': end}
 
 
-def fake_instance_get_active_by_window(self, context, begin, end, project_id):
+def fake_instance_get_active_by_window(self, context, begin, end, project_id,
+                                       use_slave=False):
             return [get_fake_db_instance(START,
                                          STOP,
                                          x,
@@ -125,6 +127,30 @@ class SimpleTenantUsageTest(test.TestCase):
         future = NOW + datetime.timedelta(hours=HOURS)
         self._test_verify_index(START, future)
 
+    def test_verify_index_rolled_up(self):
+        self.flags(tenant_usage_rollup=True)
+        rolled_up = (START + datetime.timedelta(hours=6),
+                     START + datetime.timedelta(hours=12))
+
+        def fake_rolled_up_periods(context, period_beginning, period_ending):
+            return [rolled_up]
+
+        def fake_get_totals(context, period_beginning, period_ending,
+                            project_id=None):
+            self.assertEqual((period_beginning, period_ending), rolled_up)
+            return [dict(project_id="faketenant_%s" % x,
+                         hours=SERVERS * 6,
+                         local_gb_usage=SERVERS * (ROOT_GB + EPHEMERAL_GB) * 6,
+                         vcpus_usage=SERVERS * VCPUS * 6,
+                         memory_mb_usage=SERVERS * MEMORY_MB * 6)
+                    for x in xrange(TENANTS)]
+
+        self.stubs.Set(db, 'tenant_usage_rolled_up_periods',
+                       fake_rolled_up_periods)
+        self.stubs.Set(db, 'tenant_usage_buckets_get_totals',
+                       fake_get_totals)
+        self._test_verify_index(START, STOP)
+
     def test_verify_show(self):
         self._test_verify_show(START, STOP)
 
@@ -620,6 +620,94 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class MemcacheLimiterTest(LimiterTest):
+    """
+    Tests for the memcache backed `limits.MemcacheLimiter` class.
+    """
+
+    def setUp(self):
+        """Run before each test."""
+        super(MemcacheLimiterTest, self).setUp()
+        userlimits = {'user:user3': ''}
+        self.limiter = limits.MemcacheLimiter(TEST_LIMITS, **userlimits)
+
+    def test_limiters_share_limits(self):
+        """
+        Ensure limiters using the same memcache share their limits.
+        """
+        other = limits.MemcacheLimiter(TEST_LIMITS)
+        other._cache = self.limiter._cache
+
+        expected = [None] * 5
+        results = list(self._check(5, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        results = [other.check_for_delay("PUT", "/anything")[0]
+                   for x in xrange(6)]
+        self.assertEqual([None] * 5 + [6.0], results)
+
+    def test_leased_requests(self):
+        """
+        Ensure requests are leased from memcache in batches, which are
+        counted as used by the other limiters until they expire.
+        """
+        self.limiter = limits.MemcacheLimiter([
+            limits.Limit("GET", "*", ".*", 100, limits.PER_MINUTE)])
+        other = limits.MemcacheLimiter(self.limiter.limits)
+        other._cache = self.limiter._cache
+
+        self.assertEqual([None], list(self._check(1, "GET", "/anything")))
+
+        results = [other.check_for_delay("GET", "/anything")[0]
+                   for x in xrange(96)]
+        self.assertEqual([None] * 95, results[:95])
+        self.assertAlmostEqual(0.6, results[95])
+
+        # The rest of the lease does not need memcache
+        expected = [None] * 4
+        results = list(self._check(4, "GET", "/anything"))
+        self.assertEqual(expected, results)
+
+        # Past the lease time, requests are counted in memcache again
+        self.time += self.limiter.lease_time
+        results = list(self._check(2, "GET", "/anything"))
+        self.assertEqual(None, results[0])
+        self.assertAlmostEqual(0.2, results[1])
+
+    def test_expired_leases_are_given_back(self):
+        """
+        Ensure the unused part of expired leases is given back, so
+        requests alternating between limiters reach the limit.
+        """
+        self.limiter = limits.MemcacheLimiter([
+            limits.Limit("DELETE", "*", ".*", 100, limits.PER_HOUR)])
+        other = limits.MemcacheLimiter(self.limiter.limits)
+        other._cache = self.limiter._cache
+        # Leases of hourly limits outweigh the leak between requests
+        self.limiter.lease_max_unit = other.lease_max_unit = limits.PER_HOUR
+
+        results = []
+        for x in xrange(100):
+            limiter = (self.limiter, other)[x % 2]
+            results.append(limiter.check_for_delay("DELETE", "/x")[0])
+            self.time += limiter.lease_time * 1.5
+        self.assertEqual([None] * 100, results)
+
+    def test_long_limits_are_not_leased(self):
+        """
+        Ensure limits per hour or day are counted one request at a time.
+        """
+        self.limiter = limits.MemcacheLimiter([
+            limits.Limit("POST", "*", ".*", 50, limits.PER_DAY)])
+        other = limits.MemcacheLimiter(self.limiter.limits)
+        other._cache = self.limiter._cache
+
+        results = [(self.limiter, other)[x % 2].check_for_delay(
+                       "POST", "/servers")[0] for x in xrange(51)]
+        self.assertEqual([None] * 50, results[:50])
+        self.assertAlmostEqual(1728.0, results[50])
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
@@ -58,6 +58,7 @@ from nova.tests.db.fakes import FakeModel
 from nova.tests import fake_network
 from nova.tests.image import fake as fake_image
 from nova import utils
+from nova.virt import event as virtevent
 import nova.volume
 
 
@@ -2255,6 +2256,121 @@ class ComputeTestCase(BaseTestCase):
         self.assertEqual(len(instances), 1)
         self.assertEqual(task_states.STOPPING, instances[0]['task_state'])
 
+    def test_sync_power_states(self):
+        """Power states are listed and written in bulk"""
+        ctxt = context.get_admin_context()
+        running = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING})
+        paused = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING,
+                 'vm_state': vm_states.PAUSED})
+        busy = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING,
+                 'task_state': task_states.REBOOTING})
+        vm_power_states = {running['name']: power_state.RUNNING,
+                           paused['name']: power_state.PAUSED,
+                           busy['name']: power_state.SHUTDOWN}
+        self.stubs.Set(self.compute.driver, 'list_instance_power_states',
+                       lambda: vm_power_states)
+
+        def fake_get_info(instance):
+            self.fail("get_info() shouldn't be called")
+
+        self.stubs.Set(self.compute.driver, 'get_info', fake_get_info)
+
+        updates = []
+        orig_update = db.instance_power_states_update
+
+        def fake_update(context, host, power_states):
+            updates.append(power_states)
+            return orig_update(context, host, power_states)
+
+        self.stubs.Set(db, 'instance_power_states_update', fake_update)
+
+        self.compute._sync_power_states(ctxt)
+
+        self.assertEqual([{paused['uuid']: power_state.PAUSED}], updates)
+        self.assertEqual(power_state.RUNNING, db.instance_get_by_uuid(ctxt,
+                running['uuid'])['power_state'])
+        self.assertEqual(power_state.PAUSED, db.instance_get_by_uuid(ctxt,
+                paused['uuid'])['power_state'])
+        self.assertEqual(power_state.RUNNING, db.instance_get_by_uuid(ctxt,
+                busy['uuid'])['power_state'])
+
+    def test_sync_power_states_by_instance(self):
+        """Power states are queried per instance when not listed"""
+        ctxt = context.get_admin_context()
+        instance = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING,
+                 'vm_state': vm_states.PAUSED})
+
+        def fake_list_instance_power_states():
+            raise NotImplementedError()
+
+        def fake_get_info(instance):
+            return {'state': power_state.PAUSED}
+
+        self.stubs.Set(self.compute.driver, 'list_instance_power_states',
+                       fake_list_instance_power_states)
+        self.stubs.Set(self.compute.driver, 'get_info', fake_get_info)
+
+        self.compute._sync_power_states(ctxt)
+
+        self.assertEqual(power_state.PAUSED, db.instance_get_by_uuid(ctxt,
+                instance['uuid'])['power_state'])
+
+    def test_handle_lifecycle_event(self):
+        """Power states notified by the driver are recorded"""
+        instance = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING,
+                 'vm_state': vm_states.PAUSED})
+
+        self.compute.handle_events(virtevent.LifecycleEvent(
+                instance['uuid'], power_state.PAUSED))
+
+        instance = db.instance_get_by_uuid(context.get_admin_context(),
+                                           instance['uuid'])
+        self.assertEqual(power_state.PAUSED, instance['power_state'])
+
+    def test_handle_lifecycle_event_pending_task(self):
+        """Power states notified during a task are ignored"""
+        instance = self._create_fake_instance(
+                {'host': self.compute.host,
+                 'power_state': power_state.RUNNING,
+                 'task_state': task_states.REBOOTING})
+
+        self.compute.handle_events(virtevent.LifecycleEvent(
+                instance['uuid'], power_state.SHUTDOWN))
+
+        instance = db.instance_get_by_uuid(context.get_admin_context(),
+                                           instance['uuid'])
+        self.assertEqual(power_state.RUNNING, instance['power_state'])
+
+    def test_sync_power_states_with_lifecycle_events(self):
+        """Power states are polled less often when the driver emits events"""
+        self.flags(sync_power_state_event_interval=600)
+        self.stubs.Set(self.compute.driver, 'emits_lifecycle_events',
+                       lambda: True)
+
+        listed = []
+
+        def fake_list_instance_power_states():
+            listed.append(True)
+            return {}
+
+        self.stubs.Set(self.compute.driver, 'list_instance_power_states',
+                       fake_list_instance_power_states)
+
+        ctxt = context.get_admin_context()
+        self.compute._sync_power_states(ctxt)
+        self.compute._sync_power_states(ctxt)
+        self.assertEqual(1, len(listed))
+
     def test_add_instance_fault(self):
         exc_info = None
         instance_uuid = str(utils.gen_uuid())
@@ -2388,79 +2504,63 @@ class ComputeTestCase(BaseTestCase):
 
     def test_heal_instance_info_cache(self):
         # Update on every call for the test
-        self.flags(heal_instance_info_cache_interval=-1)
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_max_age=600)
         ctxt = context.get_admin_context()
 
-        instance_map = {}
-        instances = []
-        for x in xrange(5):
-            uuid = 'fake-uuid-%s' % x
-            instance_map[uuid] = {'uuid': uuid, 'host': FLAGS.host}
-            instances.append(instance_map[uuid])
-
-        call_info = {'get_all_by_host': 0, 'get_by_uuid': 0,
-                'get_nw_info': 0, 'expected_instance': None}
+        now = timeutils.utcnow()
+        fresh = now - datetime.timedelta(seconds=60)
+        stale = now - datetime.timedelta(seconds=3600)
+        instances = [
+            {'uuid': 'fresh', 'host': FLAGS.host,
+             'info_cache': {'created_at': stale, 'updated_at': fresh}},
+            {'uuid': 'stale', 'host': FLAGS.host,
+             'info_cache': {'created_at': stale, 'updated_at': None}},
+            {'uuid': 'no-cache', 'host': FLAGS.host, 'info_cache': None}]
 
         def fake_instance_get_all_by_host(context, host):
-            call_info['get_all_by_host'] += 1
             return instances[:]
 
-        def fake_instance_get_by_uuid(context, instance_uuid):
-            if instance_uuid not in instance_map:
-                raise exception.InstanceNotFound
-            call_info['get_by_uuid'] += 1
-            return instance_map[instance_uuid]
-
-        # NOTE(comstud): Override the stub in setUp()
-        def fake_get_instance_nw_info(context, instance):
-            # Note that this exception gets caught in compute/manager
-            # and is ignored.  However, the below increment of
-            # 'get_nw_info' won't happen, and you'll get an assert
-            # failure checking it below.
-            self.assertEqual(instance, call_info['expected_instance'])
-            call_info['get_nw_info'] += 1
+        healed = []
+
+        def fake_get_instances_nw_info(context, instances):
+            healed.append([instance['uuid'] for instance in instances])
 
         self.stubs.Set(db, 'instance_get_all_by_host',
                 fake_instance_get_all_by_host)
-        self.stubs.Set(db, 'instance_get_by_uuid',
-                fake_instance_get_by_uuid)
-        self.stubs.Set(self.compute.network_api, 'get_instance_nw_info',
-                fake_get_instance_nw_info)
+        self.stubs.Set(self.compute.network_api, 'get_instances_nw_info',
+                fake_get_instances_nw_info)
 
-        call_info['expected_instance'] = instances[0]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 1)
-        self.assertEqual(call_info['get_by_uuid'], 0)
-        self.assertEqual(call_info['get_nw_info'], 1)
+        # All the stale caches are healed in one call
+        self.assertEqual([['stale', 'no-cache']], healed)
 
-        call_info['expected_instance'] = instances[1]
+        instances[0]['info_cache']['updated_at'] = stale
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 1)
-        self.assertEqual(call_info['get_by_uuid'], 1)
-        self.assertEqual(call_info['get_nw_info'], 2)
-
-        # Make an instance switch hosts
-        instances[2]['host'] = 'not-me'
-        # Make an instance disappear
-        instance_map.pop(instances[3]['uuid'])
-        # '2' and '3' should be skipped..
-        call_info['expected_instance'] = instances[4]
+        self.assertEqual(['fresh', 'stale', 'no-cache'], healed[1])
+
+    def test_healed_info_cache_is_fresh(self):
+        """Ensure a healed info_cache is not healed again before
+        heal_instance_info_cache_max_age, even if it did not change."""
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_max_age=600)
+        ctxt = context.get_admin_context()
+        instance = self._create_fake_instance({'host': self.compute.host})
+        stale = timeutils.utcnow() - datetime.timedelta(seconds=3600)
+        db.instance_info_cache_update(ctxt, instance['uuid'],
+                                      {'network_info': '[]',
+                                       'updated_at': stale})
+        calls = []
+
+        def fake_rpc_call(context, topic, msg):
+            calls.append(msg['method'])
+            return {}
+
+        self.stubs.Set(rpc, 'call', fake_rpc_call)
+
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 1)
-        # Incremented for '2' and '4'.. '3' caused a raise above.
-        self.assertEqual(call_info['get_by_uuid'], 3)
-        self.assertEqual(call_info['get_nw_info'], 3)
-        # Should be no more left.
-        self.assertEqual(len(self.compute._instance_uuids_to_heal), 0)
-
-        # This should cause a DB query now so we get first instance
-        # back again
-        call_info['expected_instance'] = instances[0]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 2)
-        # Stays the same, beacuse the instance came from the DB
-        self.assertEqual(call_info['get_by_uuid'], 3)
-        self.assertEqual(call_info['get_nw_info'], 4)
+        self.assertEqual(['get_instances_nw_info'], calls)
 
     def test_poll_unconfirmed_resizes(self):
         instances = [{'uuid': 'fake_uuid1', 'vm_state': vm_states.RESIZED,
@@ -4794,6 +4894,27 @@ class ComputeAPIAggrTestCase(BaseTestCase):
                                                        values[fake_zone][0])
         self.assertEqual(len(aggr['hosts']) - 1, len(expected['hosts']))
 
+    def test_aggregate_host_changes_update_scheduler(self):
+        """Ensure schedulers hear about aggregate host and metadata
+        changes, but not about name changes."""
+        _create_service_entries(self.context, {'fake_zone': ['fake_host']})
+        aggr = self.api.create_aggregate(self.context, 'fake_aggregate',
+                                         'fake_zone')
+        self.mox.StubOutWithMock(self.api.scheduler_rpcapi,
+                                 'update_aggregates')
+        for i in xrange(4):
+            self.api.scheduler_rpcapi.update_aggregates(self.context)
+        self.mox.ReplayAll()
+        self.api.update_aggregate(self.context, aggr['id'],
+                                  {'name': 'new_fake_aggregate'})
+        self.api.update_aggregate(self.context, aggr['id'],
+                                  {'metadata': {'foo_key2': 'foo_value2'}})
+        self.api.add_host_to_aggregate(self.context, aggr['id'], 'fake_host')
+        self.api.update_aggregate_metadata(self.context, aggr['id'],
+                                           {'foo_key1': 'foo_value1'})
+        self.api.remove_host_from_aggregate(self.context, aggr['id'],
+                                            'fake_host')
+
     def test_remove_host_from_aggregate_raise_not_found(self):
         """Ensure ComputeHostNotFound is raised when removing invalid host."""
         _create_service_entries(self.context, {'fake_zone': ['fake_host']})
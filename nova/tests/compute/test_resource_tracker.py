@@ -17,6 +17,7 @@
 
 """Tests for compute resource tracking"""
 
+import datetime
 import uuid
 
 from nova.compute import resource_tracker
@@ -87,6 +88,14 @@ class BaseTestCase(test.TestCase):
         self.stubs.Set(db, 'instance_get_all_by_filters',
                 self._fake_instance_get_all_by_filters)
 
+        self.usage_history = []
+        self.stubs.Set(db, 'compute_node_usage_history_update',
+                self._fake_compute_node_usage_history_update)
+
+    def _fake_compute_node_usage_history_update(self, ctx, compute_node_id,
+            slot, values):
+        self.usage_history.append((compute_node_id, slot, values))
+
     def _create_compute_node(self, values=None):
         compute = {
             "id": 1,
@@ -303,6 +312,60 @@ class ResourceTestCase(BaseTestCase):
         self.assertFalse(self.tracker.disabled)
         self.assertTrue(self.updated)
 
+    def testUsageHistory(self):
+        self.flags(compute_usage_history_interval=300,
+                   compute_usage_history_size=12)
+        now = datetime.datetime(2012, 10, 1, 12, 7, 30)
+        timeutils.set_time_override(now)
+        self.addCleanup(timeutils.clear_time_override)
+        self.usage_history = []
+        self.tracker.usage_history = None
+
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, len(self.usage_history))
+        compute_node_id, slot, values = self.usage_history[0]
+        self.assertEqual(1, compute_node_id)
+        # 2012-10-01 12:05 is period 4496977 since the epoch
+        self.assertEqual(4496977 % 12, slot)
+        self.assertEqual(datetime.datetime(2012, 10, 1, 12, 5),
+                         values['period_start'])
+        self.assertEqual(5, values['memory_mb'])
+        self.assertEqual(0, values['memory_mb_used'])
+        self.assertEqual(6, values['local_gb'])
+        self.assertEqual(1, values['vcpus'])
+        self.assertEqual(0, values['running_vms'])
+
+        # Unchanged usage in the same period isn't stored again
+        timeutils.advance_time_seconds(60)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, len(self.usage_history))
+
+        # Changed usage replaces the usage of the period
+        self._fake_instance(memory_mb=2, root_gb=1, ephemeral_gb=0)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(2, len(self.usage_history))
+        compute_node_id, slot, values = self.usage_history[1]
+        self.assertEqual(4496977 % 12, slot)
+        self.assertEqual(2, values['memory_mb_used'])
+        self.assertEqual(1, values['running_vms'])
+
+        # The next period goes in the next slot
+        timeutils.advance_time_seconds(300)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(3, len(self.usage_history))
+        compute_node_id, slot, values = self.usage_history[2]
+        self.assertEqual(4496978 % 12, slot)
+        self.assertEqual(datetime.datetime(2012, 10, 1, 12, 10),
+                         values['period_start'])
+
+    def testUsageHistoryDisabled(self):
+        self.flags(compute_usage_history_interval=0)
+        self.usage_history = []
+        self.tracker.usage_history = None
+
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual([], self.usage_history)
+
     def testCpuUnlimited(self):
         """Test default of unlimited CPU"""
         self.assertEqual(0, self.tracker.compute_node['vcpus_used'])
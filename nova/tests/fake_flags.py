@@ -21,9 +21,11 @@ from nova import flags
 FLAGS = flags.FLAGS
 
 flags.DECLARE('compute_scheduler_driver', 'nova.scheduler.multi')
+flags.DECLARE('ec2_id_cache_size', 'nova.api.ec2.ec2utils')
 flags.DECLARE('fake_network', 'nova.network.manager')
 flags.DECLARE('iscsi_num_targets', 'nova.volume.driver')
 flags.DECLARE('network_size', 'nova.network.manager')
+flags.DECLARE('periodic_tasks_concurrency', 'nova.manager')
 flags.DECLARE('num_networks', 'nova.network.manager')
 flags.DECLARE('policy_file', 'nova.policy')
 flags.DECLARE('volume_driver', 'nova.volume.manager')
@@ -33,6 +35,7 @@ def set_defaults(conf):
     conf.set_default('api_paste_config', '$state_path/etc/nova/api-paste.ini')
     conf.set_default('compute_driver', 'nova.virt.fake.FakeDriver')
     conf.set_default('connection_type', 'fake')
+    conf.set_default('ec2_id_cache_size', 0)
     conf.set_default('fake_network', True)
     conf.set_default('fake_rabbit', True)
     conf.set_default('flat_network_bridge', 'br100')
@@ -50,3 +53,4 @@ def set_defaults(conf):
     conf.set_default('rpc_response_timeout', 5)
     conf.set_default('rpc_cast_timeout', 5)
     conf.set_default('lock_path', None)
+    conf.set_default('periodic_tasks_concurrency', False)
@@ -140,6 +140,29 @@ class FakeNetworkManager(network_manager.NetworkManager):
             return [ip for ip in self.fixed_ips
                     if ip['virtual_interface_id'] == vif_id]
 
+        def fixed_ip_get_by_address_filter(self, context, address=None,
+                                           address_prefix=None):
+            def matches(ip):
+                if ip is None:
+                    return False
+                if address is not None and ip != address:
+                    return False
+                return ip.startswith(address_prefix or '')
+
+            result = []
+            for fixed_ip in self.fixed_ips:
+                vif = self.vifs[fixed_ip['virtual_interface_id']]
+                floating_ips = [floating_ip['address']
+                                for floating_ip in self.floating_ips
+                                if floating_ip['fixed_ip_id'] ==
+                                    fixed_ip['id']] or [None]
+                for floating_ip in floating_ips:
+                    if matches(fixed_ip['address']) or matches(floating_ip):
+                        result.append({'instance_uuid': vif['instance_uuid'],
+                                       'address': fixed_ip['address'],
+                                       'floating_address': floating_ip})
+            return result
+
     def __init__(self):
         self.db = self.FakeDB()
         self.deallocate_called = None
@@ -526,6 +526,10 @@ class Connection(object):
     def listDomainsID(self):
         return self._running_vms.keys()
 
+    def listDefinedDomains(self):
+        running = set(dom.name() for dom in self._running_vms.itervalues())
+        return [name for name in self._vms if name not in running]
+
     def lookupByID(self, id):
         if id in self._running_vms:
             return self._running_vms[id]
@@ -78,3 +78,42 @@ class ApiTestCase(test.TestCase):
 
     def test_associate_unassociated_floating_ip(self):
         self._do_test_associate_floating_ip(None)
+
+    def test_get_instances_nw_info(self):
+        instances = [{'id': 1, 'uuid': 'uuid1', 'host': 'host1',
+                      'project_id': 'fake-project',
+                      'instance_type': {'rxtx_factor': 1.0}},
+                     {'id': 2, 'uuid': 'uuid2', 'host': 'host1',
+                      'project_id': 'fake-project',
+                      'instance_type': {'rxtx_factor': 1.0}}]
+        calls = []
+
+        def fake_rpc_call(context, topic, msg):
+            calls.append(msg)
+            return {'uuid1': [{'id': 'vif1', 'address': 'fake-mac'}]}
+
+        self.stubs.Set(rpc, 'call', fake_rpc_call)
+
+        caches = {}
+
+        def fake_instance_info_cache_update(context, instance_uuid, cache):
+            caches[instance_uuid] = cache
+
+        self.stubs.Set(self.network_api.db, 'instance_info_cache_update',
+                       fake_instance_info_cache_update)
+
+        nw_infos = self.network_api.get_instances_nw_info(self.context,
+                                                          instances)
+
+        # The network manager is called once for all the instances
+        self.assertEqual(1, len(calls))
+        self.assertEqual('get_instances_nw_info', calls[0]['method'])
+        self.assertEqual(['uuid1', 'uuid2'],
+                         [instance['instance_uuid']
+                          for instance in calls[0]['args']['instances']])
+        self.assertEqual(1, len(nw_infos['uuid1']))
+        self.assertEqual(0, len(nw_infos['uuid2']))
+        self.assertEqual(set(['uuid1', 'uuid2']), set(caches))
+        # The caches are marked fresh even if they did not change
+        for cache in caches.values():
+            self.assertTrue(cache['updated_at'])
@@ -1094,6 +1094,38 @@ class CommonNetworkTestCase(test.TestCase):
             (ctx, '1.2.3.4', 'somehost')
         ], manager.deallocate_fixed_ip_calls)
 
+    def test_get_instances_nw_info(self):
+        manager = fake_network.FakeNetworkManager()
+        vifs = [{'uuid': 'vif1', 'instance_uuid': 'uuid1', 'network_id': 1},
+                {'uuid': 'vif2', 'instance_uuid': 'uuid2', 'network_id': 1},
+                {'uuid': 'vif3', 'instance_uuid': 'uuid2', 'network_id': None}]
+        manager.db.virtual_interface_get_by_instances = \
+                lambda context, instance_uuids: vifs
+
+        network_lookups = []
+
+        def fake_get_network_by_id(context, network_id):
+            network_lookups.append(network_id)
+            return {'id': network_id}
+
+        def fake_build_network_info_model(context, vifs, networks,
+                                          rxtx_factor, instance_host):
+            return [(vif['uuid'], networks.get(vif['uuid'])) for vif in vifs]
+
+        self.stubs.Set(manager, '_get_network_by_id', fake_get_network_by_id)
+        self.stubs.Set(manager, 'build_network_info_model',
+                       fake_build_network_info_model)
+
+        instances = [dict(instance_uuid=uuid, rxtx_factor=1.0, host=HOST)
+                     for uuid in ('uuid1', 'uuid2', 'uuid3')]
+        nw_infos = manager.get_instances_nw_info(self.context, instances)
+
+        # The network shared by both instances is looked up once
+        self.assertEqual([1], network_lookups)
+        self.assertEqual({'uuid1': [('vif1', {'id': 1})],
+                          'uuid2': [('vif2', {'id': 1}), ('vif3', None)],
+                          'uuid3': []}, nw_infos)
+
     def test_remove_fixed_ip_from_instance(self):
         manager = fake_network.FakeNetworkManager()
         manager.remove_fixed_ip_from_instance(self.context, 99, HOST,
@@ -1410,6 +1442,42 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_uuid'], _vifs[2]['instance_uuid'])
 
+    def test_get_instance_uuids_by_floating_ip(self):
+        manager = fake_network.FakeNetworkManager()
+        _vifs = manager.db.virtual_interface_get_all(None)
+        fake_context = context.RequestContext('user', 'project')
+
+        ip = '^173\\.16\\.1\\.2$'
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': ip})
+        self.assertEqual([{'instance_uuid': _vifs[2]['instance_uuid'],
+                           'ip': '173.16.1.2'}], res)
+
+        # The fixed ip matches first
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': '17.\\.16\\.'})
+        self.assertEqual(['172.16.0.1', '172.16.0.2', '173.16.0.2'],
+                         [r['ip'] for r in res])
+
+    def test_get_instance_uuids_by_ip_narrows_db_search(self):
+        manager = fake_network.FakeNetworkManager()
+        fake_context = context.RequestContext('user', 'project')
+        self.mox.StubOutWithMock(manager.db, 'fixed_ip_get_by_address_filter')
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address='10.0.0.1', address_prefix=None).AndReturn([])
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address=None, address_prefix='10.0.').AndReturn([])
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address=None, address_prefix=None).AndReturn([])
+        self.mox.ReplayAll()
+
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'ip': '^10\\.0\\.0\\.1$'})
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'ip': '10\\.0\\.[12]'})
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'ip': '10.0.0.1|10.0.0.2'})
+
     def test_get_network(self):
         manager = fake_network.FakeNetworkManager()
         fake_context = context.RequestContext('user', 'project')
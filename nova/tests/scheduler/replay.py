@@ -0,0 +1,296 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Offline replay of scheduling requests against synthesized hosts.
+
+Compute hosts are generated as HostStates with a mix of sizes and
+hypervisors.  A stream of request_specs, either generated or loaded from a
+file with one JSON request_spec per line, is then run through
+FilterScheduler._schedule() with the configured filters, cost functions and
+host manager, without a database or message queue.  The report gives the
+scheduling throughput, latency percentiles and how well the instances were
+placed.
+
+To run it:
+
+    python -m nova.tests.scheduler.replay --hosts 1000 --requests 5000
+
+Nova flags, e.g. --scheduler_default_filters, can be given after '--'.
+"""
+
+import copy
+import math
+import optparse
+import random
+import sys
+import time
+
+from nova import context
+from nova import flags
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+from nova.scheduler import filter_scheduler
+from nova.scheduler import profiler
+
+
+FLAGS = flags.FLAGS
+
+# (weight, compute node sizes: memory_mb, local_gb, vcpus)
+HOST_SIZES = [
+    (5, dict(memory_mb=32768, local_gb=500, vcpus=8)),
+    (3, dict(memory_mb=65536, local_gb=1000, vcpus=16)),
+    (2, dict(memory_mb=131072, local_gb=2000, vcpus=32)),
+    ]
+
+# (weight, hypervisor_type, supported_instances)
+HYPERVISORS = [
+    (8, 'QEMU', [('x86_64', 'qemu', 'hvm'), ('i686', 'qemu', 'hvm')]),
+    (2, 'xen', [('x86_64', 'xen', 'xen'), ('x86_64', 'xen', 'hvm')]),
+    ]
+
+# (weight, instance type)
+FLAVORS = [
+    (10, dict(id=2, name='m1.small', memory_mb=2048, root_gb=20,
+              ephemeral_gb=0, vcpus=1)),
+    (6, dict(id=3, name='m1.medium', memory_mb=4096, root_gb=40,
+             ephemeral_gb=0, vcpus=2)),
+    (3, dict(id=4, name='m1.large', memory_mb=8192, root_gb=80,
+             ephemeral_gb=0, vcpus=4)),
+    (1, dict(id=5, name='m1.xlarge', memory_mb=16384, root_gb=160,
+             ephemeral_gb=0, vcpus=8)),
+    ]
+
+# (weight, image properties)
+IMAGES = [
+    (8, {}),
+    (1, {'architecture': 'x86_64', 'hypervisor_type': 'xen'}),
+    (1, {'architecture': 'i686'}),
+    ]
+
+
+def _choose(rand, choices):
+    """Pick from a list of (weight, value...) tuples."""
+    total = sum(choice[0] for choice in choices)
+    point = rand.uniform(0, total)
+    for choice in choices:
+        point -= choice[0]
+        if point <= 0:
+            break
+    if len(choice) == 2:
+        return choice[1]
+    return choice[1:]
+
+
+def generate_hosts(num_hosts, seed=0):
+    """Return compute node dicts, including their service, and the
+    capabilities of num_hosts compute hosts.  Hosts start partly used.
+    """
+    rand = random.Random(seed)
+    now = timeutils.utcnow()
+    compute_nodes = []
+    capabilities = {}
+    for i in xrange(num_hosts):
+        host = 'compute%05d' % i
+        size = _choose(rand, HOST_SIZES)
+        hypervisor_type, supported_instances = _choose(rand, HYPERVISORS)
+        used = rand.uniform(0, 0.5)
+        service = dict(id=i, host=host, topic='compute',
+                       disabled=rand.random() < 0.02,
+                       availability_zone='nova',
+                       created_at=now, updated_at=now)
+        compute_nodes.append(dict(id=i, service=service, service_id=i,
+                memory_mb=size['memory_mb'],
+                free_ram_mb=int(size['memory_mb'] * (1 - used)),
+                local_gb=size['local_gb'],
+                local_gb_used=int(size['local_gb'] * used),
+                disk_available_least=int(size['local_gb'] * (1 - used)),
+                free_disk_gb=int(size['local_gb'] * (1 - used)),
+                vcpus=size['vcpus'],
+                vcpus_used=int(size['vcpus'] * used * 2),
+                hypervisor_type=hypervisor_type,
+                created_at=now, updated_at=now))
+        capabilities[host] = dict(enabled=True,
+                hypervisor_type=hypervisor_type,
+                supported_instances=supported_instances,
+                timestamp=now)
+    return compute_nodes, capabilities
+
+
+def generate_requests(num_requests, seed=0):
+    """Return num_requests request_specs for a mix of flavors and images,
+    a few of them for several instances.
+    """
+    rand = random.Random(seed)
+    requests = []
+    for i in xrange(num_requests):
+        instance_type = dict(_choose(rand, FLAVORS), extra_specs={})
+        if rand.random() < 0.1:
+            instance_type['extra_specs'] = {'hypervisor_type': 'QEMU'}
+        num_instances = 1
+        if rand.random() < 0.1:
+            num_instances = rand.randint(2, 10)
+        instance_properties = dict(project_id='project%d' % (i % 50),
+                memory_mb=instance_type['memory_mb'],
+                root_gb=instance_type['root_gb'],
+                ephemeral_gb=instance_type['ephemeral_gb'],
+                vcpus=instance_type['vcpus'],
+                instance_type_id=instance_type['id'],
+                availability_zone=None)
+        image = dict(id='image%d' % (i % 7),
+                     properties=dict(_choose(rand, IMAGES)))
+        requests.append(dict(instance_type=instance_type,
+                             instance_properties=instance_properties,
+                             image=image, num_instances=num_instances))
+    return requests
+
+
+def load_requests(path):
+    """Read request_specs from a file with one JSON request_spec per line."""
+    with open(path) as f:
+        return [jsonutils.loads(line) for line in f if line.strip()]
+
+
+def dump_requests(path, requests):
+    with open(path, 'w') as f:
+        for request_spec in requests:
+            f.write(jsonutils.dumps(request_spec) + '\n')
+
+
+def _load_host_states(host_manager, compute_nodes, capabilities):
+    """Fill host_manager with the synthesized hosts, and make it return
+    them instead of reading compute nodes from the db.
+    """
+    for compute in compute_nodes:
+        host = compute['service']['host']
+        host_manager.service_states[host] = {'compute': capabilities[host]}
+        host_manager._update_host_state(host, 'compute', compute,
+                                        compute['service'])
+    host_manager.get_all_host_states = (lambda context, topic:
+                                        dict(host_manager.host_state_map))
+
+
+def _placement_quality(host_states, requests):
+    """Return how well instances are spread over the usable hosts."""
+    host_states = [host_state for host_state in host_states
+                   if not host_state.service['disabled']]
+    largest_mb = max(request_spec['instance_type']['memory_mb']
+                     for request_spec in requests)
+    free_mb = [max(host_state.free_ram_mb, 0) for host_state in host_states]
+    stranded_mb = sum(mb for mb in free_mb if mb < largest_mb)
+    used = [1 - float(host_state.free_ram_mb) /
+            host_state.total_usable_ram_mb for host_state in host_states]
+    mean_used = sum(used) / len(used)
+    stddev_used = math.sqrt(sum((u - mean_used) ** 2 for u in used) /
+                            len(used))
+    return {
+        # Share of the free ram on hosts too full for the largest flavor
+        'fragmentation': float(stranded_mb) / max(sum(free_mb), 1),
+        'ram_used_mean': mean_used,
+        'ram_used_stddev': stddev_used,
+        }
+
+
+def replay(compute_nodes, capabilities, requests):
+    """Schedule every request and return a report of the results."""
+    ctxt = context.get_admin_context()
+    timeutils.set_time_override(timeutils.utcnow())
+    try:
+        scheduler = filter_scheduler.FilterScheduler()
+        _load_host_states(scheduler.host_manager, compute_nodes,
+                          capabilities)
+
+        latencies = profiler.Histogram(len(requests))
+        placements = {}
+        placed = failed = 0
+        start = time.time()
+        for request_spec in requests:
+            request_spec = copy.deepcopy(request_spec)
+            request_start = time.time()
+            weighted_hosts = scheduler._schedule(ctxt, 'compute',
+                                                 request_spec, {})
+            latencies.add(time.time() - request_start)
+            for weighted_host in weighted_hosts:
+                host = weighted_host.host_state.host
+                placements[host] = placements.get(host, 0) + 1
+            placed += len(weighted_hosts)
+            num_instances = request_spec.get('num_instances', 1)
+            failed += num_instances - len(weighted_hosts)
+        elapsed = time.time() - start
+
+        report = {
+            'requests': len(requests),
+            'seconds': elapsed,
+            'requests_per_second': len(requests) / max(elapsed, 1e-9),
+            'latency': latencies.summary(),
+            'instances_placed': placed,
+            'instances_failed': failed,
+            'hosts_used': len(placements),
+            'placements': placements,
+            }
+        report.update(_placement_quality(
+                scheduler.host_manager.host_state_map.values(), requests))
+        return report
+    finally:
+        timeutils.clear_time_override()
+
+
+def format_report(report):
+    latency = report['latency']
+    lines = [
+        'requests:           %(requests)d in %(seconds).2fs '
+        '(%(requests_per_second).1f/s)' % report,
+        'latency (ms):       p50 %.2f  p90 %.2f  p99 %.2f  max %.2f' % (
+                latency['p50'] * 1000, latency['p90'] * 1000,
+                latency['p99'] * 1000, latency['max'] * 1000),
+        'instances:          %(instances_placed)d placed, '
+        '%(instances_failed)d failed on %(hosts_used)d hosts' % report,
+        'ram used:           mean %(ram_used_mean).3f  '
+        'stddev %(ram_used_stddev).3f' % report,
+        'fragmentation:      %(fragmentation).3f' % report,
+        ]
+    return '\n'.join(lines)
+
+
+def main():
+    parser = optparse.OptionParser(
+            usage='%prog [options] [-- nova flags]')
+    parser.add_option('--hosts', type='int', default=1000,
+                      help='Number of compute hosts to synthesize')
+    parser.add_option('--requests', type='int', default=1000,
+                      help='Number of requests to generate')
+    parser.add_option('--requests-file',
+                      help='Replay the request_specs in this file, one '
+                           'JSON request_spec per line')
+    parser.add_option('--dump-requests',
+                      help='Write the requests to this file')
+    parser.add_option('--seed', type='int', default=0,
+                      help='Random seed for hosts and requests')
+    options, args = parser.parse_args()
+    flags.parse_args([sys.argv[0]] + args, default_config_files=[])
+
+    compute_nodes, capabilities = generate_hosts(options.hosts, options.seed)
+    if options.requests_file:
+        requests = load_requests(options.requests_file)
+    else:
+        requests = generate_requests(options.requests, options.seed)
+    if options.dump_requests:
+        dump_requests(options.dump_requests, requests)
+
+    print format_report(replay(compute_nodes, capabilities, requests))
+
+
+if __name__ == '__main__':
+    main()
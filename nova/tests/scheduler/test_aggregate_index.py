@@ -0,0 +1,86 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For AggregateIndex
+"""
+
+import datetime
+
+from nova import context
+from nova import db
+from nova.openstack.common import timeutils
+from nova.scheduler import aggregate_index
+from nova import test
+
+
+class AggregateIndexTestCase(test.TestCase):
+    """Test case for AggregateIndex class"""
+
+    def setUp(self):
+        super(AggregateIndexTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.index = aggregate_index.AggregateIndex()
+
+    def _create_aggregate(self, name, hosts, metadata):
+        aggregate = db.aggregate_create(self.context,
+                {'name': name, 'availability_zone': 'fake_zone'}, metadata)
+        for host in hosts:
+            db.aggregate_host_add(self.context, aggregate.id, host)
+        return aggregate
+
+    def test_refresh(self):
+        self._create_aggregate('agg1', ['host1', 'host2'],
+                               {'pool': 'gold', 'ssd': 'true'})
+        self._create_aggregate('agg2', ['host2'], {'pool': 'silver'})
+        self.assertEqual(self.index.refresh(self.context),
+                         set(['host1', 'host2']))
+
+        self.assertEqual(self.index.get_metadata('host1'),
+                         {'pool': set(['gold']), 'ssd': set(['true'])})
+        self.assertEqual(self.index.get_metadata('host2', key='pool'),
+                         {'pool': set(['gold', 'silver'])})
+        self.assertEqual(self.index.get_metadata('host2', key='foo'), {})
+        self.assertEqual(self.index.get_metadata('host3'), {})
+        self.assertEqual(self.index.get_hosts('pool', 'gold'),
+                         set(['host1', 'host2']))
+        self.assertEqual(self.index.get_hosts('pool', 'silver'),
+                         set(['host2']))
+        self.assertEqual(self.index.get_hosts('pool', 'bronze'), set())
+
+    def test_refresh_returns_changed_hosts(self):
+        aggregate = self._create_aggregate('agg1', ['host1', 'host2'],
+                                           {'pool': 'gold'})
+        self.index.refresh(self.context)
+        self.assertEqual(self.index.refresh(self.context), set())
+        db.aggregate_host_delete(self.context, aggregate.id, 'host2')
+        self.assertEqual(self.index.refresh(self.context), set(['host2']))
+        db.aggregate_metadata_add(self.context, aggregate.id,
+                                  {'pool': 'silver'})
+        self.assertEqual(self.index.refresh(self.context), set(['host1']))
+        self.assertEqual(self.index.get_hosts('pool', 'gold'), set())
+
+    def test_needs_refresh(self):
+        self.flags(scheduler_aggregate_refresh_interval=60)
+        now = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        timeutils.set_time_override(now)
+        self.addCleanup(timeutils.clear_time_override)
+        self.assertTrue(self.index.needs_refresh())
+        self.index.refresh(self.context)
+        self.assertFalse(self.index.needs_refresh())
+        self.index.invalidate()
+        self.assertTrue(self.index.needs_refresh())
+        self.index.refresh(self.context)
+        timeutils.advance_time_seconds(61)
+        self.assertTrue(self.index.needs_refresh())
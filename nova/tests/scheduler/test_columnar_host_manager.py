@@ -0,0 +1,198 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For ColumnarHostManager
+"""
+
+import datetime
+import random
+
+from nova import context
+from nova import db
+from nova.openstack.common import timeutils
+from nova.scheduler import columnar_host_manager
+from nova.scheduler import filters
+from nova.scheduler import host_manager
+from nova.scheduler import least_cost
+from nova import test
+
+
+FILTERS = ['RamFilter', 'CoreFilter', 'DiskFilter', 'ComputeFilter']
+
+
+class OddHostFilter(filters.BaseHostFilter):
+    """Filter without a vectorized form."""
+
+    def host_passes(self, host_state, filter_properties):
+        return int(host_state.host[4:]) % 2 == 1
+
+
+def _fake_compute_nodes(num_hosts, now):
+    rand = random.Random(42)
+    compute_nodes = []
+    for i in xrange(num_hosts):
+        memory_mb = rand.choice([4096, 16384, 65536])
+        local_gb = rand.choice([100, 500, 2000])
+        vcpus = rand.choice([0, 4, 16])
+        heartbeat = now - datetime.timedelta(seconds=rand.choice([5, 300]))
+        service = dict(id=i, host='host%d' % i, topic='compute',
+                       disabled=rand.random() < 0.1, updated_at=heartbeat,
+                       created_at=heartbeat)
+        compute_nodes.append(dict(id=i, service=service,
+                memory_mb=memory_mb, free_ram_mb=rand.randint(-512, memory_mb),
+                local_gb=local_gb, local_gb_used=rand.randint(0, local_gb),
+                disk_available_least=rand.randint(0, local_gb),
+                vcpus=vcpus, vcpus_used=rand.randint(0, vcpus * 20),
+                updated_at=now, created_at=now))
+    return compute_nodes
+
+
+class ColumnarHostManagerTestCase(test.TestCase):
+    """Test case for ColumnarHostManager class"""
+
+    @test.skip_unless(columnar_host_manager.numpy, "numpy is not installed")
+    def setUp(self):
+        super(ColumnarHostManagerTestCase, self).setUp()
+        self.flags(scheduler_available_filters=[
+                'nova.scheduler.filters.standard_filters',
+                'nova.tests.scheduler.test_columnar_host_manager.'
+                'OddHostFilter'],
+                   scheduler_host_state_refresh_interval=0)
+        self.context = context.get_admin_context()
+        self.now = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        timeutils.set_time_override(self.now)
+        self.addCleanup(timeutils.clear_time_override)
+        compute_nodes = _fake_compute_nodes(200, self.now)
+        self.stubs.Set(db, 'compute_node_get_all',
+                       lambda context: compute_nodes)
+        self.host_manager = columnar_host_manager.ColumnarHostManager()
+        self.expected_manager = host_manager.HostManager()
+
+    def _get_host_states(self, manager):
+        host_states = manager.get_all_host_states(self.context, 'compute')
+        return sorted(host_states.values(), key=lambda h: int(h.host[4:]))
+
+    def _assert_same_hosts(self, expected, actual):
+        self.assertEqual([h.host for h in expected], [h.host for h in actual])
+        for expected_host, actual_host in zip(expected, actual):
+            self.assertEqual(expected_host.limits, actual_host.limits)
+            self.assertEqual(expected_host.free_ram_mb,
+                             actual_host.free_ram_mb)
+
+    def _filter(self, filter_properties, filters=FILTERS):
+        expected = self.expected_manager.filter_hosts(
+                self._get_host_states(self.expected_manager),
+                filter_properties, filters=filters)
+        actual = self.host_manager.filter_hosts(
+                self._get_host_states(self.host_manager),
+                filter_properties, filters=filters)
+        self._assert_same_hosts(expected, actual)
+        return actual
+
+    def test_host_state_columns(self):
+        host_state = self._get_host_states(self.host_manager)[3]
+        self.assertTrue(isinstance(host_state.free_ram_mb, (int, long)))
+        free_ram_mb = host_state.free_ram_mb
+        host_state.consume_from_instance(dict(root_gb=1, ephemeral_gb=0,
+                                              memory_mb=512, vcpus=1))
+        self.assertEqual(host_state.free_ram_mb, free_ram_mb - 512)
+        self.assertEqual(self.host_manager.table.get(host_state.row,
+                                                     'free_ram_mb'),
+                         free_ram_mb - 512)
+
+    def test_filter_hosts_matches_host_passes(self):
+        for memory_mb, vcpus, root_gb in [(512, 1, 10), (8192, 8, 200),
+                                          (32768, 32, 1000)]:
+            instance_type = dict(memory_mb=memory_mb, vcpus=vcpus,
+                                 root_gb=root_gb, ephemeral_gb=0)
+            self._filter({'instance_type': instance_type})
+
+    def test_filter_hosts_with_per_host_filter(self):
+        instance_type = dict(memory_mb=2048, vcpus=2, root_gb=20,
+                             ephemeral_gb=0)
+        filtered = self._filter({'instance_type': instance_type},
+                                filters=['RamFilter', 'OddHostFilter',
+                                         'ComputeFilter'])
+        self.assertTrue(filtered)
+        for host_state in filtered:
+            self.assertEqual(int(host_state.host[4:]) % 2, 1)
+
+    def test_filter_hosts_ignore_and_force(self):
+        instance_type = dict(memory_mb=512, vcpus=1, root_gb=1,
+                             ephemeral_gb=0)
+        filtered = self._filter({'instance_type': instance_type,
+                                 'ignore_hosts': ['host1', 'host2']})
+        self.assertFalse('host1' in [h.host for h in filtered])
+        filtered = self._filter({'instance_type': instance_type,
+                                 'force_hosts': ['host1', 'host2']})
+        self.assertEqual([h.host for h in filtered], ['host1', 'host2'])
+
+    def test_filter_hosts_profiled(self):
+        self.flags(scheduler_profile=True)
+        instance_type = dict(memory_mb=2048, vcpus=2, root_gb=20,
+                             ephemeral_gb=0)
+        profiler = self.host_manager.profiler
+        profiler.start_request()
+        filtered = self.host_manager.filter_hosts(
+                self._get_host_states(self.host_manager),
+                {'instance_type': instance_type},
+                filters=['RamFilter', 'OddHostFilter'])
+        profiler.finish_request(self.context)
+
+        profile = profiler.dump()['filter']
+        ram_eliminated = profile['RamFilter']['eliminated']['max']
+        odd_eliminated = profile['OddHostFilter']['eliminated']['max']
+        self.assertTrue(ram_eliminated > 0)
+        self.assertEqual(200 - ram_eliminated - odd_eliminated,
+                         len(filtered))
+
+    def test_weigh_hosts_matches_weighted_sum(self):
+        weighted_fns = [(-1.0, least_cost.compute_fill_first_cost_fn),
+                        (2.0, least_cost.noop_cost_fn)]
+        hosts = self._get_host_states(self.host_manager)
+        expected = least_cost.weighted_sum(weighted_fns, hosts, {})
+        actual = self.host_manager.weigh_hosts(weighted_fns, hosts, {})
+        self.assertEqual(expected.weight, actual.weight)
+        self.assertTrue(expected.host_state is actual.host_state)
+
+    def test_weigh_all_hosts_matches_weigh_all(self):
+        weighted_fns = [(-1.0, least_cost.compute_fill_first_cost_fn)]
+        hosts = self._get_host_states(self.host_manager)
+        expected = least_cost.weigh_all(weighted_fns, hosts, {})
+        actual = self.host_manager.weigh_all_hosts(weighted_fns, hosts, {})
+        self.assertEqual([(h.weight, h.host_state) for h in expected],
+                         [(h.weight, h.host_state) for h in actual])
+
+    def test_weigh_hosts_falls_back_without_vectorized_form(self):
+        weighted_fns = [(1.0, lambda host_state, props: host_state.row)]
+        hosts = self._get_host_states(self.host_manager)
+        weighted_host = self.host_manager.weigh_hosts(weighted_fns,
+                                                      hosts, {})
+        self.assertEqual(weighted_host.weight, 0)
+
+    def test_removed_host_row_is_reused(self):
+        host_states = self._get_host_states(self.host_manager)
+        row = host_states[0].row
+        self.host_manager._remove_host_state(host_states[0].host)
+        host_state = self.host_manager.host_state_cls('new_host', 'compute')
+        self.assertEqual(host_state.row, row)
+        self.assertEqual(host_state.free_ram_mb, 0)
+
+    def test_table_grows(self):
+        table = columnar_host_manager.HostTable(capacity=2)
+        rows = [table.add_row() for i in xrange(5)]
+        self.assertEqual(rows, range(5))
+        table.set(4, 'vcpus_used', 3)
+        self.assertEqual(table.get(4, 'vcpus_used'), 3)
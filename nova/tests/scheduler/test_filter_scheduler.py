@@ -26,6 +26,7 @@ from nova import exception
 from nova.scheduler import driver
 from nova.scheduler import filter_scheduler
 from nova.scheduler import host_manager
+from nova.scheduler import host_partition
 from nova.scheduler import least_cost
 from nova.tests.scheduler import fakes
 from nova.tests.scheduler import test_scheduler
@@ -155,6 +156,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         """Make sure there's nothing glaringly wrong with _schedule()
         by doing a happy day pass through."""
 
+        self.flags(scheduler_batch_placement=False)
         self.next_weight = 1.0
 
         def _fake_weighted_sum(functions, hosts, options):
@@ -188,6 +190,78 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         for weighted_host in weighted_hosts:
             self.assertTrue(weighted_host.host_state is not None)
 
+    def _schedule_hosts(self, num_instances):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                is_admin=True)
+        fakes.mox_host_manager_db_calls(self.mox, fake_context)
+        self.mox.ReplayAll()
+
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': {'memory_mb': 1024, 'root_gb': 1,
+                                          'ephemeral_gb': 0,
+                                          'vcpus': 1},
+                        'instance_properties': {'project_id': 1,
+                                                'root_gb': 1,
+                                                'memory_mb': 1024,
+                                                'ephemeral_gb': 0,
+                                                'vcpus': 1}}
+        weighted_hosts = sched._schedule(fake_context, 'compute',
+                request_spec, {})
+        self.mox.VerifyAll()
+        self.mox.UnsetStubs()
+        return [(weighted_host.weight, weighted_host.host_state.host)
+                for weighted_host in weighted_hosts]
+
+    def test_schedule_batch_placement(self):
+        """Batch placement picks the same hosts as weighing all hosts
+        for every instance."""
+        self.flags(scheduler_default_filters=['RamFilter'],
+                   ram_allocation_ratio=1.0)
+
+        self.flags(scheduler_batch_placement=False)
+        expected = self._schedule_hosts(20)
+        self.flags(scheduler_batch_placement=True)
+        selected = self._schedule_hosts(20)
+
+        self.assertEqual(expected, selected)
+        # host2, host3 and host4 have 1, 3 and 8 instances worth of
+        # free ram.
+        hosts = [host for weight, host in selected]
+        self.assertEqual(len(hosts), 12)
+        self.assertEqual(hosts.count('host2'), 1)
+        self.assertEqual(hosts.count('host3'), 3)
+        self.assertEqual(hosts.count('host4'), 8)
+
+    def _partition_hosts(self, own_hosts):
+        self.flags(scheduler_partition_hosts=True,
+                   scheduler_default_filters=['RamFilter'],
+                   ram_allocation_ratio=1.0)
+        self.stubs.Set(host_partition.HostPartitioner, 'refresh',
+                       lambda self, context: None)
+        self.stubs.Set(host_partition.HostPartitioner, 'owns',
+                       lambda self, host: host in own_hosts)
+
+    def test_schedule_partitioned_hosts(self):
+        self._partition_hosts(['host2', 'host3'])
+        hosts = [host for weight, host in self._schedule_hosts(4)]
+        self.assertEqual(sorted(hosts), ['host2', 'host3', 'host3', 'host3'])
+
+    def test_schedule_partition_fallback(self):
+        self._partition_hosts(['host2', 'host3'])
+        hosts = [host for weight, host in self._schedule_hosts(20)]
+        self.assertEqual(len(hosts), 12)
+        self.assertEqual(hosts.count('host2'), 1)
+        self.assertEqual(hosts.count('host3'), 3)
+        self.assertEqual(hosts.count('host4'), 8)
+
+    def test_schedule_partition_without_fallback(self):
+        self._partition_hosts(['host2', 'host3'])
+        self.flags(scheduler_partition_fallback=False)
+        hosts = [host for weight, host in self._schedule_hosts(20)]
+        self.assertEqual(sorted(hosts), ['host2', 'host3', 'host3', 'host3'])
+
     def test_schedule_prep_resize_doesnt_update_host(self):
         fake_context = context.RequestContext('user', 'project',
                 is_admin=True)
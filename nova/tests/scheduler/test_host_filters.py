@@ -23,6 +23,7 @@ from nova import db
 from nova import exception
 from nova import flags
 from nova.openstack.common import jsonutils
+from nova.scheduler import aggregate_index
 from nova.scheduler import filters
 from nova.scheduler.filters import extra_specs_ops
 from nova.scheduler.filters.trusted_filter import AttestationService
@@ -501,6 +502,13 @@ class HostFiltersTestCase(test.TestCase):
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
         #False since type matches aggregate, metadata
         self.assertFalse(filt_cls.host_passes(host, filter2_properties))
+        # Same results from the scheduler's aggregate index
+        self.stubs.Set(db, 'aggregate_metadata_get_by_host', None)
+        host.aggregate_metadata = {}
+        self.assertTrue(filt_cls.host_passes(host, filter2_properties))
+        host.aggregate_metadata = {'instance_type': set(['fake1'])}
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertFalse(filt_cls.host_passes(host, filter2_properties))
 
     def test_ram_filter_fails_on_memory(self):
         self._stub_service_is_up(True)
@@ -783,6 +791,41 @@ class HostFiltersTestCase(test.TestCase):
         assertion = self.assertTrue if passes else self.assertFalse
         assertion(filt_cls.host_passes(host, filter_properties))
 
+        # Same result from the scheduler's aggregate index, which
+        # doesn't prune hosts that pass.
+        index = aggregate_index.AggregateIndex()
+        index.refresh(self.context.elevated())
+        host.aggregate_metadata = index.get_metadata('host1')
+        self.stubs.Set(db, 'aggregate_metadata_get_by_host', None)
+        assertion(filt_cls.host_passes(host, filter_properties))
+        candidates = filt_cls.candidate_hosts(filter_properties, index)
+        if passes and candidates is not None:
+            self.assertTrue('host1' in candidates)
+
+    def test_aggregate_filter_candidate_hosts(self):
+        filt_cls = self.class_map['AggregateInstanceExtraSpecsFilter']()
+        index = aggregate_index.AggregateIndex()
+        index.metadata_hosts = {('opt1', '1'): set(['host1', 'host2']),
+                                ('opt2', '2'): set(['host2', 'host3'])}
+
+        def _candidates(extra_specs):
+            filter_properties = {'context': self.context,
+                'instance_type': {'memory_mb': 1024,
+                                  'extra_specs': extra_specs}}
+            return filt_cls.candidate_hosts(filter_properties, index)
+
+        self.assertEqual(_candidates({'opt1': '1'}),
+                         set(['host1', 'host2']))
+        self.assertEqual(_candidates({'opt1': '1', 'opt2': '2'}),
+                         set(['host2']))
+        self.assertEqual(_candidates({'opt1': '2'}), set())
+        # Specs with operators or scopes don't prune
+        self.assertEqual(_candidates({'opt1': '1', 'opt2': '>= 1',
+                                      'trust:trusted_host': 'true'}),
+                         set(['host1', 'host2']))
+        self.assertEqual(_candidates({'opt2': '<or> 2 <or> 3'}), None)
+        self.assertEqual(_candidates({}), None)
+
     def test_aggregate_filter_fails_extra_specs_deleted_host(self):
         self._stub_service_is_up(True)
         filt_cls = self.class_map['AggregateInstanceExtraSpecsFilter']()
@@ -1157,6 +1200,34 @@ class HostFiltersTestCase(test.TestCase):
         }
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
 
+    def test_json_filter_query_compiled_once(self):
+        filt_cls = self.class_map['JsonFilter']()
+        loads = []
+        real_loads = jsonutils.loads
+        self.stubs.Set(jsonutils, 'loads',
+                       lambda s: loads.append(s) or real_loads(s))
+        raw = ['and', ['>=', '$free_ram_mb', 1024],
+                      ['=', '$capabilities.enabled', True]]
+        filter_properties = {
+            'scheduler_hints': {
+                'query': jsonutils.dumps(raw),
+            },
+        }
+        results = []
+        for free_ram_mb in [512, 1024, 2048]:
+            host = fakes.FakeHostState('host1', 'compute',
+                    {'free_ram_mb': free_ram_mb,
+                     'capabilities': {'enabled': True}})
+            results.append(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(results, [False, True, True])
+        self.assertEqual(len(loads), 1)
+
+        # A different query is compiled again
+        filter_properties['scheduler_hints']['query'] = jsonutils.dumps(
+                ['<', '$free_ram_mb', 1024])
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(len(loads), 2)
+
     def test_trusted_filter_default_passes(self):
         self._stub_service_is_up(True)
         filt_cls = self.class_map['TrustedFilter']()
@@ -1278,3 +1349,107 @@ class HostFiltersTestCase(test.TestCase):
         retry = dict(num_attempts=1, hosts=['host3', 'host1'])
         filter_properties = dict(retry=retry)
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+
+class CountingFilter(filters.BaseHostFilter):
+    """Cacheable filter counting how often it is evaluated."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def cache_key(self, filter_properties):
+        return filter_properties.get('size')
+
+    def host_passes(self, host_state, filter_properties):
+        self.calls += 1
+        return filter_properties['size'] < 10
+
+
+class FilterResultCacheTestCase(test.TestCase):
+    """Test case for FilterResultCache."""
+
+    def setUp(self):
+        super(FilterResultCacheTestCase, self).setUp()
+        self.cache = filters.FilterResultCache()
+        self.filt = CountingFilter()
+        self.host = fakes.FakeHostState('host1', 'compute',
+                {'capabilities': {'timestamp': 1}})
+
+    def _passes(self, size, host=None):
+        filter_properties = {'size': size}
+        filter_fn = self.cache.wrap(self.filt.host_passes, filter_properties)
+        return filter_fn(host or self.host, filter_properties)
+
+    def test_results_are_cached_by_key(self):
+        self.assertTrue(self._passes(1))
+        self.assertTrue(self._passes(1))
+        self.assertFalse(self._passes(20))
+        self.assertFalse(self._passes(20))
+        self.assertEqual(self.filt.calls, 2)
+        self.assertEqual(self.cache.hits, 2)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_results_are_cached_by_host(self):
+        host2 = fakes.FakeHostState('host2', 'compute',
+                {'capabilities': {'timestamp': 1}})
+        self._passes(1)
+        self._passes(1, host=host2)
+        self.assertEqual(self.filt.calls, 2)
+
+    def test_capabilities_update_invalidates(self):
+        self._passes(1)
+        self.host.capabilities = {'timestamp': 2}
+        self._passes(1)
+        self.assertEqual(self.filt.calls, 2)
+
+    def test_host_state_update_invalidates(self):
+        self._passes(1)
+        self.host.consume_from_instance(dict(root_gb=0, ephemeral_gb=0,
+                                             memory_mb=0, vcpus=0))
+        self._passes(1)
+        self.assertEqual(self.filt.calls, 2)
+
+    def test_forget(self):
+        self._passes(1)
+        self.cache.forget('host1')
+        self._passes(1)
+        self.assertEqual(self.filt.calls, 2)
+
+    def test_results_per_host_are_bounded(self):
+        self.cache.max_results_per_host = 2
+        self._passes(1)
+        self._passes(2)
+        self._passes(3)
+        self._passes(1)
+        self.assertEqual(self.filt.calls, 4)
+
+    def test_not_cacheable(self):
+        filt = filters.BaseHostFilter()
+        self.assertEqual(self.cache.wrap(filt.host_passes, {}),
+                         filt.host_passes)
+        self.filt.cache_key = lambda filter_properties: None
+        self.assertEqual(self.cache.wrap(self.filt.host_passes, {}),
+                         self.filt.host_passes)
+        self.assertEqual(self.cache.wrap('not-a-method', {}), 'not-a-method')
+
+    def test_standard_filter_cache_keys(self):
+        classes = filters.get_filter_classes(
+                ['nova.scheduler.filters.standard_filters'])
+        class_map = dict((cls.__name__, cls) for cls in classes)
+        instance_type = {'id': 3, 'extra_specs': {'b': '2', 'a': '1'}}
+        image = {'properties': {'architecture': 'x86_64'}}
+        filter_properties = {'instance_type': instance_type,
+                             'request_spec': {'image': image}}
+
+        def _key(name):
+            return class_map[name]().cache_key(filter_properties)
+
+        self.assertEqual(_key('ComputeCapabilitiesFilter'),
+                         (('a', '1'), ('b', '2')))
+        self.assertEqual(_key('AggregateInstanceExtraSpecsFilter'),
+                         (('a', '1'), ('b', '2')))
+        self.assertEqual(_key('ImagePropertiesFilter'),
+                         ('x86_64', None, None))
+        self.assertEqual(_key('TypeAffinityFilter'), 3)
+        self.assertEqual(_key('RamFilter'), None)
+        self.assertEqual(_key('AvailabilityZoneFilter'), None)
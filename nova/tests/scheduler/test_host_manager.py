@@ -16,10 +16,14 @@
 Tests For HostManager
 """
 
+import datetime
+
+import mox
 
 from nova import db
 from nova import exception
 from nova.openstack.common import timeutils
+from nova.scheduler import filters
 from nova.scheduler import host_manager
 from nova import test
 from nova.tests.scheduler import fakes
@@ -35,12 +39,23 @@ class ComputeFilterClass2(object):
         pass
 
 
+class PruningFilter(filters.BaseHostFilter):
+    def candidate_hosts(self, filter_properties, aggregate_index):
+        return aggregate_index.get_hosts('pool', 'gold')
+
+    def host_passes(self, host_state, filter_properties):
+        return True
+
+
 class HostManagerTestCase(test.TestCase):
     """Test case for HostManager class"""
 
     def setUp(self):
         super(HostManagerTestCase, self).setUp()
         self.host_manager = host_manager.HostManager()
+        self.aggregate_metadata = {}
+        self.stubs.Set(db, 'aggregate_metadata_get_all_by_host',
+                       lambda context: self.aggregate_metadata)
 
     def test_choose_host_filters_not_found(self):
         self.flags(scheduler_default_filters='ComputeFilterClass3')
@@ -86,6 +101,62 @@ class HostManagerTestCase(test.TestCase):
         self.assertEqual(len(filtered_hosts), 1)
         self.assertEqual(filtered_hosts[0], fake_host2)
 
+    def _add_host_states(self, *hosts):
+        for host in hosts:
+            self.host_manager.host_state_map[host] = fakes.FakeHostState(
+                    host, 'compute', {})
+
+    def test_refresh_aggregate_index(self):
+        self._add_host_states('host1', 'host2')
+        self.aggregate_metadata = {'host1': {'pool': set(['gold'])}}
+        self.host_manager._refresh_aggregate_index('fake_context')
+        host_state_map = self.host_manager.host_state_map
+        self.assertEqual(host_state_map['host1'].aggregate_metadata,
+                         {'pool': set(['gold'])})
+        self.assertEqual(host_state_map['host2'].aggregate_metadata, {})
+
+        # Not reloaded until invalidated
+        forgotten = []
+        self.stubs.Set(self.host_manager.filter_result_cache, 'forget',
+                       forgotten.append)
+        self.aggregate_metadata = {'host1': {'pool': set(['gold'])},
+                                   'host2': {'pool': set(['gold'])}}
+        self.host_manager._refresh_aggregate_index('fake_context')
+        self.assertEqual(host_state_map['host2'].aggregate_metadata, {})
+        self.host_manager.aggregate_index.invalidate()
+        self.host_manager._refresh_aggregate_index('fake_context')
+        self.assertEqual(host_state_map['host2'].aggregate_metadata,
+                         {'pool': set(['gold'])})
+        self.assertEqual(forgotten, ['host2'])
+
+        # New hosts get the aggregate metadata too
+        self.host_manager._update_host_state('host3', 'compute',
+                fakes.COMPUTE_NODES[0], {})
+        self.assertEqual(host_state_map['host3'].aggregate_metadata, {})
+
+    def test_filter_hosts_prunes_with_aggregate_index(self):
+        self.host_manager.filter_classes = [PruningFilter]
+        self._add_host_states('host1', 'host2', 'host3')
+        hosts = sorted(self.host_manager.host_state_map.values(),
+                       key=lambda host_state: host_state.host)
+
+        # No pruning until the index is loaded
+        filtered = self.host_manager.filter_hosts(hosts, {},
+                                                  filters=['PruningFilter'])
+        self.assertEqual(len(filtered), 3)
+
+        self.aggregate_metadata = {'host2': {'pool': set(['gold'])},
+                                   'host3': {'pool': set(['silver'])}}
+        self.host_manager._refresh_aggregate_index('fake_context')
+        filtered = self.host_manager.filter_hosts(hosts, {},
+                                                  filters=['PruningFilter'])
+        self.assertEqual([h.host for h in filtered], ['host2'])
+
+        # Forced hosts aren't pruned
+        filtered = self.host_manager.filter_hosts(hosts,
+                {'force_hosts': ['host1']}, filters=['PruningFilter'])
+        self.assertEqual([h.host for h in filtered], ['host1'])
+
     def test_update_service_capabilities(self):
         service_states = self.host_manager.service_states
         self.assertDictMatch(service_states, {})
@@ -156,6 +227,133 @@ class HostManagerTestCase(test.TestCase):
         # 8191GB
         self.assertEqual(host_states['host4'].free_disk_mb, 8388608)
 
+    def _fake_service(self, service_id, host, **kwargs):
+        service = dict(id=service_id, host=host, topic='compute',
+                       disabled=False)
+        service.update(kwargs)
+        return service
+
+    def _fake_compute_node(self, compute_id, service, free_ram_mb,
+                           updated_at, deleted=False):
+        return dict(id=compute_id, service_id=service['id'],
+                    service=None if deleted else service, deleted=deleted,
+                    local_gb=1024, memory_mb=1024, vcpus=1,
+                    disk_available_least=512, free_ram_mb=free_ram_mb,
+                    vcpus_used=0, local_gb_used=0, updated_at=updated_at,
+                    created_at=None)
+
+    def test_get_all_host_states_refreshes_changed_nodes(self):
+        context = 'fake_context'
+        start = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        later = start + datetime.timedelta(seconds=30)
+        service1 = self._fake_service(1, 'host1')
+        service2 = self._fake_service(2, 'host2')
+        service3 = self._fake_service(3, 'host3')
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'service_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+
+        db.compute_node_get_all(context).AndReturn([
+                self._fake_compute_node(1, service1, 512, start),
+                self._fake_compute_node(2, service2, 512, start)])
+        db.service_get_all(context).AndReturn([service1,
+                dict(service2, disabled=True), service3])
+        since = start - datetime.timedelta(seconds=60)
+        db.compute_node_get_all_changed_since(context, since).AndReturn([
+                self._fake_compute_node(1, service1, 256, later),
+                self._fake_compute_node(3, service3, 1024, later)])
+
+        self.mox.ReplayAll()
+        timeutils.set_time_override(start)
+        host_states = self.host_manager.get_all_host_states(context,
+                                                            'compute')
+        self.assertEqual(sorted(host_states.keys()), ['host1', 'host2'])
+        host1_state = host_states['host1']
+
+        timeutils.set_time_override(later)
+        host_states = self.host_manager.get_all_host_states(context,
+                                                            'compute')
+        timeutils.clear_time_override()
+
+        self.assertEqual(sorted(host_states.keys()),
+                         ['host1', 'host2', 'host3'])
+        # HostStates are kept between requests
+        self.assertTrue(host_states['host1'] is host1_state)
+        self.assertEqual(host_states['host1'].free_ram_mb, 256)
+        self.assertEqual(host_states['host2'].free_ram_mb, 512)
+        self.assertTrue(host_states['host2'].service['disabled'])
+        self.assertEqual(host_states['host3'].free_ram_mb, 1024)
+
+    def test_get_all_host_states_removes_dead_hosts(self):
+        context = 'fake_context'
+        start = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        later = start + datetime.timedelta(seconds=30)
+        service1 = self._fake_service(1, 'host1')
+        service2 = self._fake_service(2, 'host2')
+        service3 = self._fake_service(3, 'host3')
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'service_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+
+        db.compute_node_get_all(context).AndReturn([
+                self._fake_compute_node(1, service1, 512, start),
+                self._fake_compute_node(2, service2, 512, start),
+                self._fake_compute_node(3, service3, 512, start)])
+        # host2's service was destroyed, host3's compute node was deleted
+        db.service_get_all(context).AndReturn([service1, service3])
+        db.compute_node_get_all_changed_since(context,
+                mox.IgnoreArg()).AndReturn([
+                self._fake_compute_node(3, service3, 512, later,
+                                        deleted=True)])
+
+        self.mox.ReplayAll()
+        timeutils.set_time_override(start)
+        self.host_manager.get_all_host_states(context, 'compute')
+        timeutils.set_time_override(later)
+        host_states = self.host_manager.get_all_host_states(context,
+                                                            'compute')
+        timeutils.clear_time_override()
+
+        self.assertEqual(host_states.keys(), ['host1'])
+
+    def test_get_all_host_states_full_refresh(self):
+        self.flags(scheduler_host_state_refresh_interval=0)
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(host_manager.LOG, 'warn')
+
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        host_manager.LOG.warn("No service for compute ID 5")
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES[:2])
+
+        self.mox.ReplayAll()
+        self.host_manager.get_all_host_states(context, 'compute')
+        host_states = self.host_manager.get_all_host_states(context,
+                                                            'compute')
+        self.assertEqual(sorted(host_states.keys()), ['host1', 'host2'])
+
+    def test_update_service_capabilities_updates_host_state(self):
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(host_manager.LOG, 'warn')
+
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        host_manager.LOG.warn("No service for compute ID 5")
+
+        self.mox.ReplayAll()
+        host_states = self.host_manager.get_all_host_states(context,
+                                                            'compute')
+        self.host_manager.update_service_capabilities('compute', 'host1',
+                dict(enabled=False))
+
+        self.assertFalse(host_states['host1'].capabilities['enabled'])
+        self.assertEqual(host_states['host1'].service,
+                         fakes.COMPUTE_NODES[0]['service'])
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class"""
@@ -247,3 +445,28 @@ class HostStateTestCase(test.TestCase):
         self.mox.ReplayAll()
         result = fake_host.passes_filters(filter_fns, filter_properties)
         self.assertTrue(result)
+
+    def test_consumed_resources_kept_until_compute_node_updates(self):
+        fake_host = host_manager.HostState('host1', 'compute')
+        start = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        compute = dict(local_gb=1024, memory_mb=1024, vcpus=1,
+                       disk_available_least=512, free_ram_mb=1024,
+                       vcpus_used=0, local_gb_used=0, updated_at=start)
+        instance = dict(root_gb=0, ephemeral_gb=0, memory_mb=512, vcpus=1)
+
+        fake_host.update_from_compute_node(compute)
+        timeutils.set_time_override(start + datetime.timedelta(seconds=1))
+        fake_host.consume_from_instance(instance)
+        timeutils.clear_time_override()
+
+        # Same compute node row again: consumption is kept
+        fake_host.update_from_compute_node(compute)
+        self.assertEqual(fake_host.free_ram_mb, 512)
+        self.assertEqual(fake_host.vcpus_used, 1)
+
+        # Newer compute node row replaces it
+        compute['updated_at'] = start + datetime.timedelta(seconds=2)
+        compute['free_ram_mb'] = 768
+        fake_host.update_from_compute_node(compute)
+        self.assertEqual(fake_host.free_ram_mb, 768)
+        self.assertEqual(fake_host.vcpus_used, 0)
@@ -0,0 +1,131 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For host partitioning between schedulers
+"""
+
+import datetime
+
+from nova import context
+from nova import db
+from nova.openstack.common import timeutils
+from nova.scheduler import host_manager
+from nova.scheduler import host_partition
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+HOSTS = ['compute%d' % i for i in xrange(1000)]
+
+
+class HashRingTestCase(test.TestCase):
+    """Test case for HashRing class"""
+
+    def test_empty_ring(self):
+        ring = host_partition.HashRing([])
+        self.assertEqual(ring.get_member('compute1'), None)
+
+    def test_keys_are_spread(self):
+        ring = host_partition.HashRing(['sched1', 'sched2', 'sched3'])
+        counts = {}
+        for host in HOSTS:
+            member = ring.get_member(host)
+            counts[member] = counts.get(member, 0) + 1
+        self.assertEqual(sorted(counts), ['sched1', 'sched2', 'sched3'])
+        for count in counts.itervalues():
+            self.assertTrue(200 < count < 500)
+
+    def test_only_keys_of_new_member_move(self):
+        ring = host_partition.HashRing(['sched1', 'sched2', 'sched3'])
+        new_ring = host_partition.HashRing(['sched1', 'sched2', 'sched3',
+                                            'sched4'])
+        for host in HOSTS:
+            member = new_ring.get_member(host)
+            if member != 'sched4':
+                self.assertEqual(member, ring.get_member(host))
+
+
+class HostPartitionerTestCase(test.TestCase):
+    """Test case for HostPartitioner class"""
+
+    def setUp(self):
+        super(HostPartitionerTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.now = datetime.datetime(2012, 10, 1, 12, 0, 0)
+        timeutils.set_time_override(self.now)
+        self.addCleanup(timeutils.clear_time_override)
+        self.services = []
+        self.stubs.Set(db, 'service_get_all_by_topic',
+                       lambda context, topic: self.services)
+
+    def _add_scheduler(self, host, seconds_ago=0):
+        heartbeat = self.now - datetime.timedelta(seconds=seconds_ago)
+        self.services.append(dict(host=host, topic='scheduler',
+                                  updated_at=heartbeat, created_at=heartbeat))
+
+    def _partition(self, scheduler_host):
+        partitioner = host_partition.HostPartitioner(scheduler_host)
+        partitioner.refresh(self.context)
+        return set(host for host in HOSTS if partitioner.owns(host))
+
+    def test_alone(self):
+        self.assertEqual(self._partition('sched1'), set(HOSTS))
+
+    def test_partitions_are_disjoint(self):
+        for host in ['sched1', 'sched2', 'sched3']:
+            self._add_scheduler(host)
+        partitions = [self._partition(host)
+                      for host in ['sched1', 'sched2', 'sched3']]
+        self.assertEqual(sum(len(partition) for partition in partitions),
+                         len(HOSTS))
+        self.assertEqual(set.union(*partitions), set(HOSTS))
+
+    def test_dead_scheduler_is_left_out(self):
+        self._add_scheduler('sched1')
+        self._add_scheduler('sched2', seconds_ago=3600)
+        self.assertEqual(self._partition('sched1'), set(HOSTS))
+
+    def test_rebalance(self):
+        self._add_scheduler('sched1')
+        partitioner = host_partition.HostPartitioner('sched1')
+        partitioner.refresh(self.context)
+        self.assertTrue(partitioner.owns('compute1'))
+        self._add_scheduler('sched2')
+        partitioner.refresh(self.context)
+        self.assertEqual(partitioner.ring.members,
+                         frozenset(['sched1', 'sched2']))
+        owned = [host for host in HOSTS if partitioner.owns(host)]
+        self.assertTrue(0 < len(owned) < len(HOSTS))
+
+    def test_host_manager_partition_hosts(self):
+        self.flags(scheduler_partition_hosts=True)
+        self._add_scheduler('sched1')
+        self._add_scheduler('sched2')
+        manager = host_manager.HostManager()
+        manager.partitioner = host_partition.HostPartitioner('sched1')
+        host_states = [fakes.FakeHostState(host, 'compute', {})
+                       for host in HOSTS[:100]]
+        own, others = manager.partition_hosts(self.context, host_states)
+        self.assertEqual(len(own) + len(others), 100)
+        self.assertTrue(own and others)
+        for host_state in own:
+            self.assertTrue(manager.partitioner.owns(host_state.host))
+
+    def test_host_manager_not_partitioned(self):
+        manager = host_manager.HostManager()
+        host_states = [fakes.FakeHostState(host, 'compute', {})
+                       for host in HOSTS[:10]]
+        self.assertEqual(manager.partition_hosts(self.context, host_states),
+                         (host_states, []))
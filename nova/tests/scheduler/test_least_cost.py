@@ -88,6 +88,21 @@ class LeastCostTestCase(test.TestCase):
         self.assertEqual(weighted_host.weight, 10512)
         self.assertEqual(weighted_host.host_state.host, 'host1')
 
+    def test_weigh_all(self):
+        fn_tuples = [(1.0, offset), (1.0, scale)]
+        hostinfo_list = self._get_all_hosts()
+
+        options = {}
+        weighted_hosts = least_cost.weigh_all(fn_tuples, hostinfo_list,
+                                              options)
+        self.assertEqual([weighted_host.host_state
+                          for weighted_host in weighted_hosts],
+                         list(hostinfo_list))
+        weights = dict((weighted_host.host_state.host, weighted_host.weight)
+                       for weighted_host in weighted_hosts)
+        self.assertEqual(weights, {'host1': 11536, 'host2': 13072,
+                                   'host3': 19216, 'host4': 34576})
+
 
 class TestWeightedHost(test.TestCase):
     def test_dict_conversion_without_host_state(self):
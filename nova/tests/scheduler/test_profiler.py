@@ -0,0 +1,124 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For SchedulerProfiler
+"""
+
+from nova import context
+from nova.openstack.common.notifier import api as notifier_api
+from nova.openstack.common.notifier import test_notifier
+from nova.scheduler import least_cost
+from nova.scheduler import profiler
+from nova import test
+from nova.tests.scheduler import fakes
+from nova import utils
+
+
+class HistogramTestCase(test.TestCase):
+    """Test case for Histogram class"""
+
+    def test_summary(self):
+        histogram = profiler.Histogram(100)
+        for value in xrange(200):
+            histogram.add(value)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['mean'], 149.5)
+        self.assertEqual(summary['p50'], 150)
+        self.assertEqual(summary['p99'], 198)
+        self.assertEqual(summary['max'], 199)
+
+    def test_empty(self):
+        self.assertEqual(profiler.Histogram(10).summary(), {'count': 0})
+
+
+class SchedulerProfilerTestCase(test.TestCase):
+    """Test case for SchedulerProfiler class"""
+
+    def setUp(self):
+        super(SchedulerProfilerTestCase, self).setUp()
+        self.flags(scheduler_profile=True,
+                   scheduler_default_filters=['RamFilter', 'ComputeFilter'],
+                   ram_allocation_ratio=1.0)
+        self.context = context.get_admin_context()
+        self.host_manager = fakes.FakeHostManager()
+        self.profiler = self.host_manager.profiler
+        self.host_states = [
+                fakes.FakeHostState('host%d' % i, 'compute',
+                                    dict(free_ram_mb=1024 * i,
+                                         total_usable_ram_mb=4096,
+                                         service={'disabled': i == 3}))
+                for i in xrange(4)]
+        self.stubs.Set(utils, 'service_is_up', lambda service: True)
+        self.filter_properties = {'instance_type': {'memory_mb': 1500}}
+
+    def _schedule(self):
+        self.profiler.start_request()
+        hosts = self.host_manager.filter_hosts(self.host_states,
+                                               self.filter_properties)
+        self.host_manager.weigh_hosts(
+                [(-1.0, least_cost.compute_fill_first_cost_fn)], hosts,
+                self.filter_properties)
+        self.profiler.finish_request(self.context)
+        return hosts
+
+    def test_not_profiling(self):
+        self.flags(scheduler_profile=False)
+        self._schedule()
+        self.assertEqual(self.profiler.dump(), {})
+        weighted_fns = [(1.0, least_cost.noop_cost_fn)]
+        self.assertTrue(self.profiler.wrap_cost_fns(weighted_fns) is
+                        weighted_fns)
+
+    def test_filters_and_cost_functions(self):
+        hosts = self._schedule()
+        self.assertEqual([h.host for h in hosts], ['host2'])
+
+        profile = self.profiler.dump()
+        self.assertEqual(sorted(profile), ['cost_function', 'filter',
+                                           'request'])
+        ram = profile['filter']['RamFilter']
+        self.assertEqual(ram['seconds']['count'], 1)
+        # host0 and host1 don't have enough ram
+        self.assertEqual(ram['eliminated']['max'], 2)
+        compute = profile['filter']['ComputeFilter']
+        self.assertEqual(compute['eliminated']['max'], 1)
+        self.assertEqual(
+                profile['cost_function']['compute_fill_first_cost_fn'][
+                    'seconds']['count'], 1)
+        self.assertEqual(profile['request']['total']['seconds']['count'], 1)
+
+    def test_window(self):
+        self.flags(scheduler_profile_window=3)
+        for i in xrange(5):
+            self._schedule()
+        profile = self.profiler.dump()
+        self.assertEqual(profile['request']['total']['seconds']['count'], 3)
+
+    def test_notifications(self):
+        self.flags(scheduler_profile_notifications=True,
+                   notification_driver=[test_notifier.__name__])
+        notifier_api._reset_drivers()
+        self.addCleanup(notifier_api._reset_drivers)
+        test_notifier.NOTIFICATIONS = []
+        self._schedule()
+        self.assertEqual(len(test_notifier.NOTIFICATIONS), 1)
+        notification = test_notifier.NOTIFICATIONS[0]
+        self.assertEqual(notification['event_type'], 'scheduler.profile')
+        entries = dict((entry['name'], entry)
+                       for entry in notification['payload']['profile'])
+        self.assertEqual(entries['RamFilter']['hosts'], 4)
+        self.assertEqual(entries['RamFilter']['eliminated'], 2)
+        self.assertEqual(entries['ComputeFilter']['hosts'], 2)
@@ -0,0 +1,70 @@
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler replay benchmark
+"""
+
+import os
+import tempfile
+
+from nova.scheduler import columnar_host_manager
+from nova import test
+from nova.tests.scheduler import replay
+
+
+class ReplayTestCase(test.TestCase):
+    """Replays a small request stream as a scheduler regression check"""
+
+    def setUp(self):
+        super(ReplayTestCase, self).setUp()
+        self.compute_nodes, self.capabilities = replay.generate_hosts(40)
+        self.requests = replay.generate_requests(100)
+
+    def _replay(self):
+        return replay.replay(self.compute_nodes, self.capabilities,
+                             self.requests)
+
+    def test_replay(self):
+        report = self._replay()
+        num_instances = sum(request_spec['num_instances']
+                            for request_spec in self.requests)
+        self.assertEqual(report['requests'], 100)
+        self.assertEqual(report['instances_placed'] +
+                         report['instances_failed'], num_instances)
+        self.assertEqual(sum(report['placements'].values()),
+                         report['instances_placed'])
+        self.assertTrue(report['instances_placed'] > 0)
+        self.assertEqual(report['latency']['count'], 100)
+        self.assertTrue(0 <= report['fragmentation'] <= 1)
+        self.assertTrue(replay.format_report(report))
+
+    def test_replay_is_deterministic(self):
+        self.assertEqual(self._replay()['placements'],
+                         self._replay()['placements'])
+
+    @test.skip_unless(columnar_host_manager.numpy, "numpy is not installed")
+    def test_columnar_host_manager_places_the_same(self):
+        expected = self._replay()
+        self.flags(scheduler_host_manager='nova.scheduler.'
+                   'columnar_host_manager.ColumnarHostManager')
+        self.assertEqual(self._replay()['placements'],
+                         expected['placements'])
+
+    def test_dump_and_load_requests(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        replay.dump_requests(path, self.requests)
+        self.assertEqual(replay.load_requests(path), self.requests)
@@ -96,3 +96,11 @@ class SchedulerRpcAPITestCase(test.TestCase):
                 rpc_method='cast', volume_id="fake_volume",
                 snapshot_id="fake_snapshots", image_id="fake_image",
                 version='2.2')
+
+    def test_get_scheduler_profile(self):
+        self._test_scheduler_api('get_scheduler_profile', rpc_method='call',
+                version='2.3')
+
+    def test_update_aggregates(self):
+        self._test_scheduler_api('update_aggregates',
+                rpc_method='fanout_cast', version='2.4')
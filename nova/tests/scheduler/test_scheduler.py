@@ -89,6 +89,21 @@ class SchedulerManagerTestCase(test.TestCase):
                 service_name=service_name, host=host,
                 capabilities=capabilities)
 
+    def test_update_aggregates(self):
+        self.mox.StubOutWithMock(self.manager.driver, 'update_aggregates')
+        self.manager.driver.update_aggregates()
+        self.mox.ReplayAll()
+        self.manager.update_aggregates(self.context)
+
+    def test_get_scheduler_profile(self):
+        self.mox.StubOutWithMock(self.manager.driver,
+                'get_scheduler_profile')
+        self.manager.driver.get_scheduler_profile().AndReturn(
+                {'filter': {}})
+        self.mox.ReplayAll()
+        result = self.manager.get_scheduler_profile(self.context)
+        self.assertEqual(result, {'filter': {}})
+
     def test_show_host_resources(self):
         host = 'fake_host'
 
@@ -37,6 +37,7 @@ from nova.api.ec2 import apirequest
 from nova.api.ec2 import ec2utils
 from nova import block_device
 from nova import context
+from nova import db
 from nova import exception
 from nova import flags
 from nova.openstack.common import timeutils
@@ -146,6 +147,54 @@ class Ec2utilsTestCase(test.TestCase):
         self.assertEqual(ec2utils.id_to_ec2_snap_id(28), 'snap-0000001c')
         self.assertEqual(ec2utils.id_to_ec2_vol_id(27), 'vol-0000001b')
 
+    def test_id_mapping_cache_evicts_least_recently_used(self):
+        self.flags(ec2_id_cache_size=2)
+        cache = ec2utils.IdMappingCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats(), {'hits': 3, 'misses': 1, 'size': 2})
+
+    def test_id_mapping_cache_order_stays_bounded(self):
+        self.flags(ec2_id_cache_size=2)
+        cache = ec2utils.IdMappingCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        for i in range(100):
+            self.assertEqual(cache.get('a'), 1)
+        self.assertTrue(len(cache._order) <= 32)
+
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_instance_id_mapping_cached(self):
+        self.flags(ec2_id_cache_size=10)
+        ec2utils.ID_MAPPING_CACHE.clear()
+        instance_uuid = 'b65cee2f-8c69-4aeb-be2f-f79742548fc2'
+        calls = []
+
+        def fake_get_ec2_instance_id_by_uuid(context, instance_id):
+            calls.append(instance_id)
+            return 30
+
+        self.stubs.Set(db, 'get_ec2_instance_id_by_uuid',
+                       fake_get_ec2_instance_id_by_uuid)
+
+        ctxt = context.get_admin_context()
+        for i in range(2):
+            self.assertEqual(ec2utils.id_to_ec2_inst_id(instance_uuid),
+                             'i-0000001e')
+        self.assertEqual(calls, [instance_uuid])
+        # the reverse mapping is cached as well
+        self.assertEqual(ec2utils.ec2_inst_id_to_uuid(ctxt, 'i-0000001e'),
+                         instance_uuid)
+
     def test_dict_from_dotted_str(self):
         in_str = [('BlockDeviceMapping.1.DeviceName', '/dev/sda1'),
                   ('BlockDeviceMapping.1.Ebs.SnapshotId', 'snap-0000001c'),
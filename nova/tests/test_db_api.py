@@ -21,8 +21,10 @@
 
 import datetime
 
+from nova.compute import power_state
 from nova import context
 from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
 from nova import exception
 from nova import flags
 from nova.openstack.common import timeutils
@@ -73,6 +75,43 @@ class DbApiTestCase(test.TestCase):
                                                 {'display_name': 't.*st.'})
         self.assertEqual(2, len(result))
 
+    def test_instance_get_all_by_filters_use_slave(self):
+        self.create_instances_with_args()
+        slave_sessions = []
+        real_get_session = sqlalchemy_api.get_session
+
+        def fake_get_session(*args, **kwargs):
+            slave_sessions.append(kwargs.get('slave', False))
+            return real_get_session(*args, **kwargs)
+
+        self.stubs.Set(sqlalchemy_api, 'get_session', fake_get_session)
+
+        # Without a slave database configured the main one is read
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                use_slave=True)
+        self.assertEqual(1, len(result))
+        self.assertEqual([True], slave_sessions)
+
+        db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual([True, False], slave_sessions)
+
+    def test_instance_get_all_by_filters_anchored_regex(self):
+        self.create_instances_with_args(display_name='test1')
+        self.create_instances_with_args(display_name='test12')
+        self.create_instances_with_args(display_name='TEST1')
+        self.create_instances_with_args(display_name='atest1')
+
+        def _get(display_name):
+            filters = {'display_name': display_name}
+            return sorted(instance['display_name'] for instance in
+                          db.instance_get_all_by_filters(self.context,
+                                                         filters))
+
+        self.assertEqual(['test1'], _get('^test1$'))
+        self.assertEqual(['test1', 'test12'], _get('^test1'))
+        self.assertEqual(['test12'], _get('^test1.$'))
+        self.assertEqual(['atest1', 'test1'], _get('^.*test1$'))
+
     def test_instance_get_all_by_filters_regex_unsupported_db(self):
         """Ensure that the 'LIKE' operator is used for unsupported dbs."""
         self.flags(sql_connection="notdb://")
@@ -143,6 +182,38 @@ class DbApiTestCase(test.TestCase):
                           self.context, {'display_name': '%test%'},
                           marker=str(utils.gen_uuid()))
 
+    def test_instance_get_all_by_filters_paginate_same_sort_key(self):
+        created_at = timeutils.utcnow()
+        instances = [self.create_instances_with_args(created_at=created_at)
+                     for i in xrange(5)]
+        expected = [inst['uuid'] for inst in instances]
+
+        uuids = []
+        marker = None
+        while True:
+            result = db.instance_get_all_by_filters(self.context, {},
+                                                    sort_dir='asc',
+                                                    limit=2, marker=marker)
+            if not result:
+                break
+            uuids.extend(inst['uuid'] for inst in result)
+            marker = result[-1]['uuid']
+        self.assertEqual(expected, uuids)
+
+    def test_instance_get_all_by_filters_columns_to_join(self):
+        inst = self.create_instances_with_args(metadata={'foo': 'bar'})
+
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                columns_to_join=[])
+        self.assertEqual(inst['uuid'], result[0]['uuid'])
+        self.assertFalse('metadata' in result[0].__dict__)
+        self.assertFalse('info_cache' in result[0].__dict__)
+
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                columns_to_join=['metadata'])
+        self.assertTrue('metadata' in result[0].__dict__)
+        self.assertFalse('info_cache' in result[0].__dict__)
+
     def test_migration_get_unconfirmed_by_dest_compute(self):
         ctxt = context.get_admin_context()
 
@@ -244,6 +315,30 @@ class DbApiTestCase(test.TestCase):
         self.assertRaises(exception.DuplicateVlan,
                           db.network_create_safe, ctxt, values2)
 
+    def test_instance_power_states_update(self):
+        ctxt = context.get_admin_context()
+        values = {'host': 'host1', 'power_state': power_state.RUNNING}
+        instance1 = db.instance_create(ctxt, values)
+        instance2 = db.instance_create(ctxt, values)
+        moved = db.instance_create(ctxt, dict(values, host='host2'))
+        busy = db.instance_create(ctxt, dict(values, task_state='rebooting'))
+
+        power_states = dict((instance['uuid'], power_state.SHUTDOWN)
+                            for instance in (instance1, moved, busy))
+        power_states[instance2['uuid']] = power_state.PAUSED
+        updated = db.instance_power_states_update(ctxt, 'host1',
+                                                  power_states)
+
+        self.assertEqual(set([instance1['uuid'], instance2['uuid']]),
+                         updated)
+        expected = {instance1['uuid']: power_state.SHUTDOWN,
+                    instance2['uuid']: power_state.PAUSED,
+                    moved['uuid']: power_state.RUNNING,
+                    busy['uuid']: power_state.RUNNING}
+        for uuid, state in expected.iteritems():
+            self.assertEqual(state,
+                    db.instance_get_by_uuid(ctxt, uuid)['power_state'])
+
     def test_instance_update_with_instance_uuid(self):
         """ test instance_update() works when an instance UUID is passed """
         ctxt = context.get_admin_context()
@@ -406,6 +501,42 @@ class DbApiTestCase(test.TestCase):
         data = db.network_get_associated_fixed_ips(ctxt, 1, 'nothing')
         self.assertEqual(len(data), 0)
 
+    def test_fixed_ip_get_by_address_filter(self):
+        ctxt = context.get_admin_context()
+        instance = db.instance_create(ctxt, {})
+        values = {'address': 'bar', 'instance_uuid': instance['uuid']}
+        vif = db.virtual_interface_create(ctxt, values)
+        for address in ('10.0.0.1', '10.0.1.1'):
+            values = {'address': address,
+                      'allocated': True,
+                      'instance_uuid': instance['uuid'],
+                      'virtual_interface_id': vif['id']}
+            fixed_address = db.fixed_ip_create(ctxt, values)
+        fixed_ip = db.fixed_ip_get_by_address(ctxt, fixed_address)
+        db.floating_ip_create(ctxt, {'address': '172.16.0.1',
+                                     'fixed_ip_id': fixed_ip['id']})
+        # Not allocated to a vif
+        db.fixed_ip_create(ctxt, {'address': '10.0.0.2'})
+
+        data = db.fixed_ip_get_by_address_filter(ctxt)
+        self.assertEqual([('10.0.0.1', None), ('10.0.1.1', '172.16.0.1')],
+                         [(r['address'], r['floating_address'])
+                          for r in data])
+        self.assertEqual(instance['uuid'], data[0]['instance_uuid'])
+
+        data = db.fixed_ip_get_by_address_filter(ctxt,
+                                                 address_prefix='10.0.0')
+        self.assertEqual(['10.0.0.1'], [r['address'] for r in data])
+
+        data = db.fixed_ip_get_by_address_filter(ctxt, address='172.16.0.1')
+        self.assertEqual(['10.0.1.1'], [r['address'] for r in data])
+
+        # Pairs matching by both addresses are only returned once
+        data = db.fixed_ip_get_by_address_filter(ctxt, address_prefix='1')
+        self.assertEqual([('10.0.0.1', None), ('10.0.1.1', '172.16.0.1')],
+                         [(r['address'], r['floating_address'])
+                          for r in data])
+
     def _timeout_test(self, ctxt, timeout, multi_host):
         values = {'host': 'foo'}
         instance = db.instance_create(ctxt, values)
@@ -525,6 +656,38 @@ class DbApiTestCase(test.TestCase):
         _compare(bw_usages[2], expected_bw_usages[2])
         timeutils.clear_time_override()
 
+    def test_tenant_usage_buckets(self):
+        ctxt = context.get_admin_context()
+        day1 = datetime.datetime(2012, 10, 1)
+        day2 = datetime.datetime(2012, 10, 2)
+        day3 = datetime.datetime(2012, 10, 3)
+        bucket = dict(project_id='project1', instance_type_id=1, hours=24,
+                      local_gb_usage=240, vcpus_usage=48,
+                      memory_mb_usage=24 * 512)
+        db.tenant_usage_buckets_create(ctxt, day1, day2, [bucket])
+        db.tenant_usage_buckets_create(ctxt, day2, day3,
+                                       [bucket, dict(bucket, project_id='p2')])
+        self.assertRaises(exception.TaskAlreadyRunning,
+                          db.tenant_usage_buckets_create, ctxt, day1, day2,
+                          [bucket])
+        self.assertTrue(db.task_log_get(ctxt, 'tenant_usage_rollup',
+                                        str(day1), str(day2), ''))
+
+        self.assertEqual(db.tenant_usage_rolled_up_periods(ctxt, day1, day3),
+                         [(day1, day2), (day2, day3)])
+        self.assertEqual(db.tenant_usage_rolled_up_periods(
+                ctxt, day1 + datetime.timedelta(hours=1), day3),
+                [(day2, day3)])
+
+        totals = db.tenant_usage_buckets_get_totals(ctxt, day1, day3,
+                                                    'project1')
+        self.assertEqual(totals, [dict(project_id='project1', hours=48,
+                                       local_gb_usage=480, vcpus_usage=96,
+                                       memory_mb_usage=48 * 512)])
+        totals = db.tenant_usage_buckets_get_totals(ctxt, day2, day3)
+        self.assertEqual(sorted(t['project_id'] for t in totals),
+                         ['p2', 'project1'])
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate',
@@ -692,6 +855,31 @@ class AggregateDBApiTestCase(test.TestCase):
                                                key='good')
         self.assertFalse('good' in r2)
 
+    def test_aggregate_metadata_get_all_by_host(self):
+        """Ensure we can get the aggregate metadata of every host."""
+        ctxt = context.get_admin_context()
+        values = {'name': 'fake_aggregate2',
+            'availability_zone': 'fake_avail_zone', }
+        values2 = {'name': 'fake_aggregate3',
+            'availability_zone': 'fake_avail_zone', }
+        a1 = _create_aggregate_with_hosts(context=ctxt)
+        a2 = _create_aggregate_with_hosts(context=ctxt, values=values,
+                metadata={'fake_key1': 'other_value'})
+        a3 = _create_aggregate_with_hosts(context=ctxt, values=values2,
+                hosts=['bar.openstack.org'], metadata={'badkey': 'bad'})
+        db.aggregate_metadata_delete(ctxt, a1.id, 'fake_key2')
+        r1 = db.aggregate_metadata_get_all_by_host(ctxt)
+        self.assertEqual(sorted(r1), ['bar.openstack.org',
+                                      'foo.openstack.org'])
+        self.assertEqual(r1['foo.openstack.org'],
+                         {'fake_key1': set(['fake_value1', 'other_value'])})
+        self.assertEqual(r1['bar.openstack.org'],
+                         {'badkey': set(['bad'])})
+        # Hosts removed from their aggregate are left out
+        db.aggregate_host_delete(ctxt, a3.id, 'bar.openstack.org')
+        self.assertFalse('bar.openstack.org' in
+                         db.aggregate_metadata_get_all_by_host(ctxt))
+
     def test_aggregate_get_by_host_not_found(self):
         """Ensure AggregateHostNotFound is raised with unknown host."""
         ctxt = context.get_admin_context()
@@ -954,6 +1142,27 @@ class CapacityTestCase(test.TestCase):
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(3, int(stats['num_vm_building']))
 
+    def test_compute_node_get_all_changed_since(self):
+        before = timeutils.utcnow() - datetime.timedelta(seconds=1)
+        item = self._create_helper('host1')
+        after = timeutils.utcnow() + datetime.timedelta(seconds=1)
+
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, before)
+        self.assertEqual([item['id']], [node['id'] for node in nodes])
+        self.assertEqual('host1', nodes[0]['service']['host'])
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, after)
+        self.assertEqual([], nodes)
+
+    def test_compute_node_get_all_changed_since_deleted(self):
+        item = self._create_helper('host1')
+        since = timeutils.utcnow()
+        db.service_destroy(self.ctxt, self.service['id'])
+
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual([item['id']], [node['id'] for node in nodes])
+        self.assertTrue(nodes[0]['deleted'])
+        self.assertEqual(None, nodes[0]['service'])
+
     def test_compute_node_update(self):
         item = self._create_helper('host1')
 
@@ -994,6 +1203,84 @@ class CapacityTestCase(test.TestCase):
         self.assertEqual(num_instance_stat['key'], stat['key'])
         self.assertEqual(1, int(stat['value']))
 
+    def _usage(self, period_start, **kwargs):
+        usage = dict(period_start=period_start, vcpus=2, vcpus_used=1,
+                     memory_mb=1024, memory_mb_used=512, local_gb=2048,
+                     local_gb_used=20, running_vms=1)
+        usage.update(kwargs)
+        return usage
+
+    def test_compute_node_usage_history(self):
+        item = self._create_helper('host1')
+        t1 = datetime.datetime(2012, 10, 1, 12, 0)
+        t2 = datetime.datetime(2012, 10, 1, 12, 5)
+        db.compute_node_usage_history_update(self.ctxt, item['id'], 0,
+                                             self._usage(t1))
+        db.compute_node_usage_history_update(self.ctxt, item['id'], 1,
+                                             self._usage(t2, vcpus_used=2))
+
+        history = db.compute_node_usage_history_get(self.ctxt, item['id'])
+        self.assertEqual([t1, t2], [usage['period_start']
+                                    for usage in history])
+        self.assertEqual([1, 2], [usage['vcpus_used'] for usage in history])
+
+        history = db.compute_node_usage_history_get(self.ctxt, item['id'],
+                                                    since=t2)
+        self.assertEqual([t2], [usage['period_start'] for usage in history])
+
+    def test_compute_node_usage_history_slot_reused(self):
+        item = self._create_helper('host1')
+        t1 = datetime.datetime(2012, 10, 1, 12, 0)
+        t2 = datetime.datetime(2012, 10, 1, 12, 5)
+        db.compute_node_usage_history_update(self.ctxt, item['id'], 0,
+                                             self._usage(t1))
+        db.compute_node_usage_history_update(self.ctxt, item['id'], 0,
+                                             self._usage(t2, vcpus_used=2))
+
+        history = db.compute_node_usage_history_get(self.ctxt, item['id'])
+        self.assertEqual(1, len(history))
+        self.assertEqual(t2, history[0]['period_start'])
+        self.assertEqual(2, history[0]['vcpus_used'])
+
+    def test_compute_node_usage_history_statistics(self):
+        item1 = self._create_helper('host1')
+        item2 = db.compute_node_create(self.ctxt,
+                                       dict(self.compute_node_dict, stats={}))
+        t1 = datetime.datetime(2012, 10, 1, 12, 0)
+        t2 = datetime.datetime(2012, 10, 1, 12, 5)
+        db.compute_node_usage_history_update(self.ctxt, item1['id'], 0,
+                                             self._usage(t1))
+        db.compute_node_usage_history_update(self.ctxt, item1['id'], 1,
+                                             self._usage(t2))
+        db.compute_node_usage_history_update(self.ctxt, item2['id'], 1,
+                                             self._usage(t2, running_vms=3))
+
+        stats = db.compute_node_usage_history_statistics(self.ctxt)
+        self.assertEqual(2, len(stats))
+        self.assertEqual(dict(period_start=t1, count=1, vcpus=2,
+                              vcpus_used=1, memory_mb=1024,
+                              memory_mb_used=512, local_gb=2048,
+                              local_gb_used=20, running_vms=1), stats[0])
+        self.assertEqual(dict(period_start=t2, count=2, vcpus=4,
+                              vcpus_used=2, memory_mb=2048,
+                              memory_mb_used=1024, local_gb=4096,
+                              local_gb_used=40, running_vms=4), stats[1])
+
+        stats = db.compute_node_usage_history_statistics(self.ctxt, since=t2)
+        self.assertEqual([t2], [period['period_start'] for period in stats])
+
+    def test_compute_node_usage_history_deleted_with_node(self):
+        item = self._create_helper('host1')
+        t1 = datetime.datetime(2012, 10, 1, 12, 0)
+        db.compute_node_usage_history_update(self.ctxt, item['id'], 0,
+                                             self._usage(t1))
+        db.service_destroy(self.ctxt, self.service['id'])
+
+        history = db.compute_node_usage_history_get(self.ctxt, item['id'])
+        self.assertEqual([], history)
+        stats = db.compute_node_usage_history_statistics(self.ctxt)
+        self.assertEqual([], stats)
+
 
 class TestIpAllocation(test.TestCase):
 
@@ -991,6 +991,81 @@ class LibvirtConnTestCase(test.TestCase):
         # None should be listed, since we fake deleted the last one
         self.assertEquals(len(instances), 0)
 
+    def test_list_instance_power_states(self):
+        class FakeDomain(object):
+            def __init__(self, name, state):
+                self._name = name
+                self._state = state
+
+            def name(self):
+                return self._name
+
+            def info(self):
+                return [self._state, None, None, None, None]
+
+        running = FakeDomain('running', libvirt_driver.VIR_DOMAIN_RUNNING)
+        shutoff = FakeDomain('shutoff', libvirt_driver.VIR_DOMAIN_SHUTOFF)
+
+        def fake_lookup_by_id(domain_id):
+            if domain_id == 2:
+                raise libvirt.libvirtError("we deleted an instance!")
+            return running
+
+        self.mox.StubOutWithMock(libvirt_driver.LibvirtDriver, '_conn')
+        libvirt_driver.LibvirtDriver._conn.lookupByID = fake_lookup_by_id
+        libvirt_driver.LibvirtDriver._conn.lookupByName = lambda name: shutoff
+        libvirt_driver.LibvirtDriver._conn.numOfDomains = lambda: 3
+        libvirt_driver.LibvirtDriver._conn.listDomainsID = lambda: [0, 1, 2]
+        libvirt_driver.LibvirtDriver._conn.listDefinedDomains = \
+                lambda: ['shutoff']
+
+        self.mox.ReplayAll()
+        conn = libvirt_driver.LibvirtDriver(False)
+        power_states = conn.list_instance_power_states()
+        # Domain 0 is skipped and domain 2 was deleted while listing
+        self.assertEqual({'running': power_state.RUNNING,
+                          'shutoff': power_state.SHUTDOWN}, power_states)
+
+    def test_lifecycle_events_dispatch(self):
+        class FakeDomain(object):
+            def UUIDString(self):
+                return 'fake-uuid'
+
+        class FakeConnection(object):
+            def domainEventRegisterAny(self, *args):
+                pass
+
+        events = []
+        conn = libvirt_driver.LibvirtDriver(False)
+        conn.register_event_listener(events.append)
+        conn._init_events_pipe()
+        self.assertFalse(conn.emits_lifecycle_events())
+        conn._register_lifecycle_events(FakeConnection())
+        self.assertTrue(conn.emits_lifecycle_events())
+
+        conn._event_lifecycle_callback(None, FakeDomain(),
+                                       libvirt_driver.VIR_DOMAIN_EVENT_DEFINED,
+                                       0, conn)
+        conn._event_lifecycle_callback(None, FakeDomain(),
+                                       libvirt_driver.VIR_DOMAIN_EVENT_STOPPED,
+                                       0, conn)
+        conn._dispatch_events()
+
+        # The DEFINED event doesn't change the power state
+        self.assertEqual(1, len(events))
+        self.assertEqual('fake-uuid', events[0].uuid)
+        self.assertEqual(power_state.SHUTDOWN, events[0].power_state)
+
+    def test_lifecycle_events_registration_failure(self):
+        class FakeConnection(object):
+            def domainEventRegisterAny(self, *args):
+                raise libvirt.libvirtError("events not supported")
+
+        conn = libvirt_driver.LibvirtDriver(False)
+        conn._init_events_pipe()
+        conn._register_lifecycle_events(FakeConnection())
+        self.assertFalse(conn.emits_lifecycle_events())
+
     def test_get_all_block_devices(self):
         xml = [
             # NOTE(vish): id 0 is skipped
@@ -2292,21 +2367,96 @@ class LibvirtConnTestCase(test.TestCase):
         conn._destroy(instance)
 
     def test_available_least_handles_missing(self):
-        """Ensure destroy calls managedSaveRemove for saved instance"""
+        """Ensure disks missing since they were probed are ignored"""
         conn = libvirt_driver.LibvirtDriver(False)
 
-        def list_instances():
-            return ['fake']
-        self.stubs.Set(conn, 'list_instances', list_instances)
-
-        def get_info(instance_name):
-            raise exception.InstanceNotFound()
-        self.stubs.Set(conn, 'get_instance_disk_info', get_info)
+        def get_domain_resources(disks=False):
+            return {1: {'vcpus': 1, 'xml': None,
+                        'disks': [{'path': '/nonexistent/disk',
+                                   'virt_disk_size': 10 * 1024 ** 3}]}}
+        self.stubs.Set(conn, '_get_domain_resources', get_domain_resources)
 
         result = conn.get_disk_available_least()
         space = fake_libvirt_utils.get_fs_info(FLAGS.instances_path)['free']
         self.assertEqual(result, space / 1024 ** 3)
 
+    def test_domain_resources_are_probed_once(self):
+        dummyxml = ("<domain type='kvm'><name>instance-0000000a</name>"
+                    "<devices>"
+                    "<disk type='file'><driver name='qemu' type='qcow2'/>"
+                    "<source file='/test/disk'/>"
+                    "<target dev='vda' bus='virtio'/></disk>"
+                    "</devices></domain>")
+
+        class FakeDomain(object):
+            def vcpus(self):
+                return ([], [None, None])
+
+            def XMLDesc(self, flags):
+                return dummyxml
+
+        domain_ids = [1, 2]
+        lookups = []
+
+        def fake_lookup_by_id(dom_id):
+            lookups.append(dom_id)
+            return FakeDomain()
+
+        self.create_fake_libvirt_mock(lookupByID=fake_lookup_by_id,
+                                      numOfDomains=lambda: len(domain_ids),
+                                      listDomainsID=lambda: domain_ids)
+
+        GB = 1024 ** 3
+        probes = []
+
+        def fake_get_disk_size(path):
+            probes.append(path)
+            return 20 * GB
+
+        self.stubs.Set(libvirt_driver.disk, 'get_disk_size',
+                       fake_get_disk_size)
+        self.stubs.Set(os.path, 'getsize', lambda path: 5 * GB)
+
+        self.mox.ReplayAll()
+        conn = libvirt_driver.LibvirtDriver(False)
+        # The disks are only probed for get_disk_available_least
+        self.assertEqual(4, conn.get_vcpu_used())
+        self.assertEqual(0, len(probes))
+        least = conn.get_disk_available_least()
+        self.assertEqual(4, conn.get_vcpu_used())
+        self.assertEqual([1, 2], lookups)
+        self.assertEqual(2, len(probes))
+
+        # Only the newly started domain is probed
+        domain_ids[:] = [2, 3]
+        self.assertEqual(4, conn.get_vcpu_used())
+        self.assertEqual([1, 2, 3], lookups)
+        self.assertEqual(2, len(probes))
+        self.assertEqual(least, conn.get_disk_available_least())
+        self.assertEqual([1, 2, 3], lookups)
+        self.assertEqual(3, len(probes))
+
+    def test_vcpu_used_does_no_disk_io(self):
+        class FakeDomain(object):
+            def vcpus(self):
+                return ([], [None, None])
+
+            def XMLDesc(self, flags):
+                return "<domain type='kvm'><devices/></domain>"
+
+        self.create_fake_libvirt_mock(lookupByID=lambda dom_id: FakeDomain(),
+                                      numOfDomains=lambda: 1,
+                                      listDomainsID=lambda: [1])
+
+        def fake_get_disk_info_from_xml(xml):
+            raise OSError(errno.EACCES, 'Permission denied')
+
+        self.mox.ReplayAll()
+        conn = libvirt_driver.LibvirtDriver(False)
+        self.stubs.Set(conn, '_get_disk_info_from_xml',
+                       fake_get_disk_info_from_xml)
+        self.assertEqual(2, conn.get_vcpu_used())
+
     def test_cpu_info(self):
         conn = libvirt_driver.LibvirtDriver(True)
 
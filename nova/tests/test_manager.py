@@ -0,0 +1,159 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for the periodic tasks of nova.manager
+"""
+
+import eventlet
+from eventlet import event
+
+from nova import context
+from nova import manager
+from nova import test
+
+
+class FakeTime(object):
+    """Stands in for the time module in nova.manager."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class PeriodicManager(manager.Manager):
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        self.release = event.Event()
+        super(PeriodicManager, self).__init__(*args, **kwargs)
+
+    @manager.periodic_task
+    def every_tick(self, context):
+        self.calls.append('every_tick')
+
+    @manager.periodic_task(ticks_between_runs=2)
+    def every_three_ticks(self, context):
+        self.calls.append('every_three_ticks')
+
+    @manager.periodic_task(spacing=10)
+    def every_ten_seconds(self, context):
+        self.calls.append('every_ten_seconds')
+
+    @manager.periodic_task(spacing=5, concurrent=True)
+    def slow(self, context):
+        self.calls.append('slow')
+        self.release.wait()
+
+
+class PeriodicTasksTestCase(test.TestCase):
+    def setUp(self):
+        super(PeriodicTasksTestCase, self).setUp()
+        self.flags(periodic_interval=60)
+        self.clock = FakeTime()
+        self.stubs.Set(manager, 'time', self.clock)
+        self.context = context.get_admin_context()
+        self.manager = PeriodicManager()
+        self.manager.release.send()
+
+    def test_tasks_run_on_their_own_timers(self):
+        idle = self.manager.periodic_tasks(self.context)
+        self.assertEqual(['every_ten_seconds', 'every_tick', 'slow'],
+                         sorted(self.manager.calls))
+        # The slow task is due again first
+        self.assertEqual(5, idle)
+
+        self.manager.calls = []
+        self.clock.now += 10
+        self.manager.periodic_tasks(self.context)
+        self.assertEqual(['every_ten_seconds', 'slow'],
+                         sorted(self.manager.calls))
+
+    def test_ticks_are_converted_to_seconds(self):
+        # Tasks on ticks first run N ticks after the manager started
+        self.clock.now += 119
+        self.manager.periodic_tasks(self.context)
+        self.assertFalse('every_three_ticks' in self.manager.calls)
+
+        self.clock.now += 1
+        self.manager.periodic_tasks(self.context)
+        self.assertTrue('every_three_ticks' in self.manager.calls)
+
+    def test_concurrent_task_is_skipped_while_running(self):
+        self.flags(periodic_tasks_concurrency=True)
+        self.manager.release = event.Event()
+
+        self.manager.periodic_tasks(self.context)
+        eventlet.sleep(0)
+        self.clock.now += 5
+        self.manager.periodic_tasks(self.context)
+        eventlet.sleep(0)
+        self.assertEqual(1, self.manager.calls.count('slow'))
+
+        self.manager.release.send()
+        self.manager._periodic_running['slow'].wait()
+        stats = self.manager.periodic_task_stats()
+        self.assertEqual(1, stats['slow']['runs'])
+        self.assertEqual(1, stats['slow']['skipped'])
+
+        self.clock.now += 5
+        self.manager.periodic_tasks(self.context)
+        eventlet.sleep(0)
+        self.assertEqual(2, self.manager.calls.count('slow'))
+
+    def test_stats_record_overruns(self):
+        clock = self.clock
+
+        def slow(self, context):
+            clock.now += 30
+
+        self.stubs.Set(PeriodicManager, '_periodic_tasks',
+                       [('slow', manager.periodic_task(spacing=10)(slow))])
+
+        self.manager.periodic_tasks(self.context)
+
+        stats = self.manager.periodic_task_stats()['slow']
+        self.assertEqual(1, stats['runs'])
+        self.assertEqual(1, stats['overruns'])
+        self.assertEqual(30, stats['last_duration'])
+        self.assertEqual(0, stats['errors'])
+
+    def test_stats_record_errors(self):
+        def fail(self, context):
+            raise test.TestingException()
+
+        self.stubs.Set(PeriodicManager, '_periodic_tasks',
+                       [('fail', manager.periodic_task(fail))])
+
+        self.manager.periodic_tasks(self.context)
+        self.assertEqual(1, self.manager.periodic_task_stats()['fail'][
+                'errors'])
+
+        self.clock.now += 60
+        self.assertRaises(test.TestingException,
+                          self.manager.periodic_tasks, self.context,
+                          raise_on_error=True)
+
+    def test_ticks_follow_the_service_interval(self):
+        self.manager.set_periodic_interval(5)
+        self.manager.periodic_tasks(self.context)
+
+        self.manager.calls = []
+        self.clock.now += 5
+        self.manager.periodic_tasks(self.context)
+        self.assertTrue('every_tick' in self.manager.calls)
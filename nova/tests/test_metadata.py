@@ -28,6 +28,7 @@ import webob
 from nova.api.metadata import base
 from nova.api.metadata import handler
 from nova import block_device
+from nova.common import metadatacache
 from nova import db
 from nova.db.sqlalchemy import api
 from nova import exception
@@ -405,3 +406,97 @@ class MetadataHandlerTestCase(test.TestCase):
                                 fake_get_metadata=fake_get_metadata,
                                 headers=None)
         self.assertEqual(response.status_int, 500)
+
+
+class RenderedMetadataTestCase(test.TestCase):
+    def setUp(self):
+        super(RenderedMetadataTestCase, self).setUp()
+        fake_network.stub_out_nw_api_get_instance_nw_info(self.stubs,
+                                                          spectacular=True)
+        self.instance = INSTANCES[0]
+        self.mdinst = fake_InstanceMetadata(self.stubs, copy(self.instance),
+            address='192.168.0.3')
+
+    def test_rendered_lookups(self):
+        documents = json.loads(json.dumps(self.mdinst.render()))
+        rendered = base.RenderedMetadata(documents)
+
+        for path in ("/", "/latest", "/2009-04-04/meta-data/",
+                     "/2009-04-04/meta-data/public-keys/0/openssh-key",
+                     "/2009-04-04/meta-data/local-ipv4",
+                     "/2009-04-04/user-data", "/openstack",
+                     "/openstack/2012-08-10",
+                     "/openstack/latest/meta_data.json",
+                     "/openstack/latest/user_data"):
+            self.assertEqual(base.ec2_md_print(rendered.lookup(path)),
+                             base.ec2_md_print(self.mdinst.lookup(path)))
+
+        self.assertRaises(base.InvalidMetadataPath, rendered.lookup,
+                          "/9999-99-99/meta-data")
+
+    def test_cache_invalidate(self):
+        self.flags(metadata_prerender=True)
+        cache = metadatacache.MetadataCache()
+        cache.add(self.mdinst)
+        documents = cache.get('192.168.0.3', self.instance['uuid'])
+        self.assertEqual(documents['uuid'], self.instance['uuid'])
+
+        cache.invalidate(self.instance['uuid'])
+        self.assertEqual(cache.get('192.168.0.3', self.instance['uuid']),
+                         None)
+
+    def test_cache_is_keyed_by_instance(self):
+        cache = metadatacache.MetadataCache()
+        cache.add(self.mdinst)
+        self.assertEqual(cache.get('192.168.0.3', 'other-uuid'), None)
+
+    def _fake_fixed_ip_owner(self, instance_uuid):
+        def fake_fixed_ip_get_by_address(context, address):
+            return {'address': address, 'instance_uuid': instance_uuid}
+
+        def fake_get_fixed_ip_by_address(self, context, address):
+            raise AssertionError('nova-network was called')
+
+        self.stubs.Set(db, 'fixed_ip_get_by_address',
+                       fake_fixed_ip_get_by_address)
+        self.stubs.Set(network.API, 'get_fixed_ip_by_address',
+                       fake_get_fixed_ip_by_address)
+
+    def test_handler_renders_once(self):
+        self.flags(metadata_prerender=True)
+        self._fake_fixed_ip_owner(self.instance['uuid'])
+        calls = []
+
+        def fake_get_metadata_by_instance_uuid(instance_uuid, address):
+            calls.append((instance_uuid, address))
+            return self.mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_instance_uuid',
+                       fake_get_metadata_by_instance_uuid)
+
+        app = handler.MetadataRequestHandler()
+        for i in range(2):
+            request = webob.Request.blank("/2009-04-04/user-data")
+            request.remote_addr = '192.168.0.3'
+            response = request.get_response(app)
+            self.assertEqual(response.body, USER_DATA_STRING)
+
+        self.assertEqual(calls, [(self.instance['uuid'], '192.168.0.3')])
+
+    def test_handler_checks_fixed_ip_owner(self):
+        self.flags(metadata_prerender=True)
+        app = handler.MetadataRequestHandler()
+        app._rendered.add(self.mdinst)
+
+        # The fixed ip was released and given to another instance
+        other = dict(copy(self.instance), uuid='other-uuid', user_data=None)
+        other_md = fake_InstanceMetadata(self.stubs, other,
+                                         address='192.168.0.3')
+        self._fake_fixed_ip_owner('other-uuid')
+        self.stubs.Set(base, 'get_metadata_by_instance_uuid',
+                       lambda instance_uuid, address: other_md)
+
+        request = webob.Request.blank("/2009-04-04/user-data")
+        request.remote_addr = '192.168.0.3'
+        response = request.get_response(app)
+        self.assertEqual(response.status_int, 404)
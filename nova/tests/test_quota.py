@@ -331,6 +331,9 @@ class FakeDriver(object):
     def expire(self, context):
         self.called.append(('expire', context))
 
+    def refresh_usages(self, context, resources):
+        self.called.append(('refresh_usages', context, resources))
+
 
 class BaseResourceTestCase(test.TestCase):
     def test_no_flag(self):
@@ -705,6 +708,16 @@ class QuotaEngineTestCase(test.TestCase):
                 ('expire', context),
                 ])
 
+    def test_refresh_usages(self):
+        context = FakeContext(None, None)
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.refresh_usages(context)
+
+        self.assertEqual(driver.called, [
+                ('refresh_usages', context, quota_obj._resources),
+                ])
+
     def test_resources(self):
         quota_obj = self._make_quota_obj(None)
 
@@ -1437,8 +1450,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_quota_usages(context, session):
-            return self.usages.copy()
+        def fake_get_quota_usages(context, session, resources):
+            return dict((k, v) for k, v in self.usages.items()
+                        if k in resources)
+
+        def fake_quota_reserve_fast(context, quotas, deltas, expire,
+                                    max_age):
+            # The conditional updates are exercised against the database
+            # in QuotaReserveFastPathTestCase
+            return None
 
         def fake_quota_usage_create(context, project_id, resource, in_use,
                                     reserved, until_refresh, session=None,
@@ -1463,6 +1483,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.stubs.Set(sqa_api, 'get_session', fake_get_session)
         self.stubs.Set(sqa_api, '_get_quota_usages', fake_get_quota_usages)
+        self.stubs.Set(sqa_api, '_quota_reserve_fast',
+                       fake_quota_reserve_fast)
         self.stubs.Set(sqa_api, 'quota_usage_create', fake_quota_usage_create)
         self.stubs.Set(sqa_api, 'reservation_create', fake_reservation_create)
 
@@ -1940,3 +1962,108 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                      project_id='test_project',
                      delta=-2 * 1024),
                 ])
+
+
+class QuotaReserveFastPathTestCase(test.TestCase):
+    def setUp(self):
+        super(QuotaReserveFastPathTestCase, self).setUp()
+        self.context = context.RequestContext('fake_user', 'fake_project')
+        self.admin_context = context.get_admin_context()
+        self.in_use = dict(instances=2, cores=4)
+        self.sync_called = []
+
+        def make_sync(res_name):
+            def sync(context, project_id, session):
+                self.sync_called.append(res_name)
+                return {res_name: self.in_use[res_name]}
+            return sync
+
+        self.resources = dict(
+            (name, quota.ReservableResource(name, make_sync(name)))
+            for name in ('instances', 'cores'))
+        self.quotas = dict(instances=10, cores=20)
+        self.expire = timeutils.utcnow() + datetime.timedelta(seconds=3600)
+
+    def tearDown(self):
+        timeutils.clear_time_override()
+        super(QuotaReserveFastPathTestCase, self).tearDown()
+
+    def _reserve(self, until_refresh=0, max_age=0, **deltas):
+        return sqa_api.quota_reserve(self.context, self.resources,
+                                     self.quotas, deltas, self.expire,
+                                     until_refresh, max_age)
+
+    def _usages(self):
+        usages = db.quota_usage_get_all_by_project(self.context,
+                                                   'fake_project')
+        del usages['project_id']
+        return usages
+
+    def test_reserve_skips_sync_once_usages_exist(self):
+        self._reserve(instances=1, cores=2)
+        self.assertEqual(sorted(self.sync_called), ['cores', 'instances'])
+
+        self.sync_called = []
+        reservations = self._reserve(instances=1, cores=2)
+        self.assertEqual(self.sync_called, [])
+        self.assertEqual(len(reservations), 2)
+        self.assertEqual(self._usages(), dict(
+                instances=dict(in_use=2, reserved=2),
+                cores=dict(in_use=4, reserved=4)))
+
+    def test_reserve_over_quota(self):
+        self._reserve(instances=1)
+        self.assertRaises(exception.OverQuota, self._reserve, instances=8)
+        self.assertEqual(self._usages()['instances'],
+                         dict(in_use=2, reserved=1))
+
+    def test_refresh_stale_usages(self):
+        self._reserve(until_refresh=2, instances=1)
+        self.in_use['instances'] = 5
+        self.sync_called = []
+
+        sqa_api.quota_usage_refresh_stale(self.admin_context, self.resources,
+                                          2, 0)
+        self.assertEqual(self.sync_called, [])
+
+        self._reserve(until_refresh=2, instances=1)
+        sqa_api.quota_usage_refresh_stale(self.admin_context, self.resources,
+                                          2, 0)
+        self.assertEqual(self.sync_called, ['instances'])
+        self.assertEqual(self._usages()['instances'],
+                         dict(in_use=5, reserved=2))
+
+    def test_refresh_stale_usages_max_age(self):
+        timeutils.set_time_override()
+        self._reserve(instances=1)
+        self._reserve(instances=1)
+        timeutils.advance_time_seconds(61)
+        self.sync_called = []
+
+        sqa_api.quota_usage_refresh_stale(self.admin_context, self.resources,
+                                          0, 60)
+        self.assertEqual(self.sync_called, ['instances'])
+
+        # The usage is in sync, but it is not due again
+        self.sync_called = []
+        sqa_api.quota_usage_refresh_stale(self.admin_context, self.resources,
+                                          0, 60)
+        self.assertEqual(self.sync_called, [])
+
+    def test_commit_fast_path_reservations(self):
+        self._reserve(instances=1, cores=2)
+        reservations = self._reserve(instances=1, cores=2)
+
+        sqa_api.reservation_commit(self.context, reservations)
+        self.assertEqual(self._usages(), dict(
+                instances=dict(in_use=3, reserved=1),
+                cores=dict(in_use=6, reserved=2)))
+
+    def test_rollback_fast_path_reservations(self):
+        self._reserve(instances=1, cores=2)
+        reservations = self._reserve(instances=1, cores=2)
+
+        sqa_api.reservation_rollback(self.context, reservations)
+        self.assertEqual(self._usages(), dict(
+                instances=dict(in_use=2, reserved=1),
+                cores=dict(in_use=4, reserved=2)))
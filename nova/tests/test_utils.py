@@ -322,6 +322,19 @@ class GenericUtilsTestCase(test.TestCase):
         hostname = "<}\x1fh\x10e\x08l\x02l\x05o\x12!{>"
         self.assertEqual("hello", utils.sanitize_hostname(hostname))
 
+    def test_regex_literal_prefix(self):
+        self.assertEqual(('test', ''), utils.regex_literal_prefix('test'))
+        self.assertEqual(('test1', '$'),
+                         utils.regex_literal_prefix('test1$'))
+        self.assertEqual(('te', 's*t'), utils.regex_literal_prefix('tes*t'))
+        self.assertEqual(('10.0.', '.*'),
+                         utils.regex_literal_prefix('10\\.0\\..*'))
+        self.assertEqual(('', '.*'), utils.regex_literal_prefix('.*'))
+        self.assertEqual(('', 'a|b'), utils.regex_literal_prefix('a|b'))
+        self.assertEqual(('my', '_vm'), utils.regex_literal_prefix('my_vm'))
+        self.assertEqual(('a', '\\\\b'),
+                         utils.regex_literal_prefix('a\\\\b'))
+
     def test_bool_from_str(self):
         self.assertTrue(utils.bool_from_str('1'))
         self.assertTrue(utils.bool_from_str('2'))
@@ -20,6 +20,7 @@ import sys
 import traceback
 
 from nova.compute.manager import ComputeManager
+from nova.compute import power_state
 from nova import exception
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -399,6 +400,13 @@ class _VirtDriverTestCase(_FakeDriverBackendTestCase):
         self.assertIn('num_cpu', info)
         self.assertIn('cpu_time', info)
 
+    @catch_notimplementederror
+    def test_list_instance_power_states(self):
+        instance_ref, network_info = self._get_running_instance()
+        power_states = self.connection.list_instance_power_states()
+        self.assertEqual(power_state.RUNNING,
+                         power_states[instance_ref['name']])
+
     @catch_notimplementederror
     def test_get_info_for_unknown_instance(self):
         self.assertRaises(exception.NotFound,
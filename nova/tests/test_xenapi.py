@@ -325,6 +325,22 @@ class XenAPIVMTestCase(stubs.XenAPITestBase):
         instances = self.conn.list_instances()
         self.assertEquals(instances, [])
 
+    def test_list_instance_power_states(self):
+        host_ref = self.conn._session.get_xenapi_host()
+        other_host_ref = xenapi_fake.create_host('other')
+        xenapi_fake.create_vm('running', 'Running', is_a_template=False,
+                              resident_on=host_ref)
+        xenapi_fake.create_vm('halted', 'Halted', is_a_template=False,
+                              resident_on='OpaqueRef:NULL')
+        xenapi_fake.create_vm('elsewhere', 'Running', is_a_template=False,
+                              resident_on=other_host_ref)
+        xenapi_fake.create_vm('template', 'Halted', is_a_template=True,
+                              resident_on='OpaqueRef:NULL')
+
+        power_states = self.conn.list_instance_power_states()
+        self.assertEqual({'running': power_state.RUNNING,
+                          'halted': power_state.SHUTDOWN}, power_states)
+
     def test_get_rrd_server(self):
         self.flags(xenapi_connection_url='myscheme://myaddress/')
         server_info = vm_utils._get_rrd_server()
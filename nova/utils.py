@@ -567,6 +567,46 @@ class LoopingCall(object):
         return self.done.wait()
 
 
+class DynamicLoopingCall(LoopingCall):
+    """A looping call which sleeps, after each call of the function, for
+    the number of seconds the function returned, bounded by
+    periodic_interval_max.
+    """
+
+    def start(self, initial_delay=None, periodic_interval_max=None):
+        self._running = True
+        done = event.Event()
+
+        def _inner():
+            if initial_delay:
+                greenthread.sleep(initial_delay)
+
+            try:
+                while self._running:
+                    idle = self.f(*self.args, **self.kw)
+                    if not self._running:
+                        break
+
+                    if periodic_interval_max is not None:
+                        if idle is None or idle > periodic_interval_max:
+                            idle = periodic_interval_max
+                    greenthread.sleep(idle or 0)
+            except LoopingCallDone, e:
+                self.stop()
+                done.send(e.retvalue)
+            except Exception:
+                LOG.exception(_('in dynamic looping call'))
+                done.send_exception(*sys.exc_info())
+                return
+            else:
+                done.send(True)
+
+        self.done = done
+
+        greenthread.spawn(_inner)
+        return self.done
+
+
 def xhtml_escape(value):
     """Escapes a string so it is valid within XML or XHTML.
 
@@ -1122,6 +1162,41 @@ def sanitize_hostname(hostname):
     return hostname
 
 
+def regex_literal_prefix(pattern):
+    """Split a regular expression into the literal text all of its matches
+    start with and the rest of the expression.
+
+    The literal part stops at the first special character, and never
+    contains the SQL wildcards '%' and '_' or a backslash, the default
+    LIKE escape character, so it can be matched with LIKE 'prefix%'.
+    An expression with alternatives has no literal part.
+    """
+    if '|' in pattern:
+        return '', pattern
+
+    literal = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            char = pattern[i + 1:i + 2]
+            if not char or char.isalnum() or char in '%_\\':
+                break
+            width = 2
+        elif char in '.^$*+?{}[]()%_':
+            break
+        else:
+            width = 1
+        # A quantifier after this character makes it optional
+        quantifier = pattern[i + width:i + width + 1]
+        if quantifier and quantifier in '*?{':
+            break
+        literal += char
+        i += width
+
+    return literal, pattern[i:]
+
+
 def read_cached_file(filename, cache_info, reload_func=None):
     """Read from a file if it has been modified.
 
@@ -108,6 +108,16 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def list_instance_power_states(self):
+        """Return the power states of all the instances known to the
+        virtualization layer.
+
+        Returns a dict mapping instance names to power_state codes, so the
+        power states of every instance on the host can be synced without a
+        get_info() call per instance.
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -679,3 +689,31 @@ class ComputeDriver(object):
             }
         """
         raise NotImplementedError()
+
+    def register_event_listener(self, callback):
+        """Register a callback to receive events.
+
+        The callback is invoked with a nova.virt.event.Event for each event
+        emitted by the driver.  It is called from a green thread, so it may
+        block on I/O like any other nova code.
+        """
+        self._event_callback = callback
+
+    def emit_event(self, event):
+        """Dispatch an event to the registered listener, if any."""
+        callback = getattr(self, '_event_callback', None)
+        if callback is None:
+            LOG.debug(_("Discarding event %s"), event)
+            return
+        try:
+            LOG.debug(_("Emitting event %s"), event)
+            callback(event)
+        except Exception:
+            LOG.exception(_("Exception dispatching event %s"), event)
+
+    def emits_lifecycle_events(self):
+        """Return True if the driver emits a nova.virt.event.LifecycleEvent
+        whenever an instance changes power state, so the power states need
+        to be polled only as a safety net.
+        """
+        return False
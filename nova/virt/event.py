@@ -0,0 +1,62 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Asynchronous events emitted by the virt drivers.
+
+A driver which can watch the hypervisor emits these events to the
+listener registered by the compute manager, so instance state changes are
+seen as they happen instead of at the next poll.
+"""
+
+import time
+
+
+class Event(object):
+    """Base class for all events emitted by a driver."""
+
+    def __init__(self, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.timestamp = timestamp
+
+
+class InstanceEvent(Event):
+    """Base class for all events affecting an instance."""
+
+    def __init__(self, uuid, timestamp=None):
+        super(InstanceEvent, self).__init__(timestamp)
+        self.uuid = uuid
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.uuid)
+
+
+class LifecycleEvent(InstanceEvent):
+    """An instance changed power state, e.g. it was started, paused or
+    stopped on the hypervisor.
+
+    power_state is the power_state code the instance moved to.
+    """
+
+    def __init__(self, uuid, power_state, timestamp=None):
+        super(LifecycleEvent, self).__init__(uuid, timestamp)
+        self.power_state = power_state
+
+    def __repr__(self):
+        return "<%s: %s, %s>" % (self.__class__.__name__, self.uuid,
+                                 self.power_state)
@@ -73,6 +73,10 @@ class FakeDriver(driver.ComputeDriver):
     def list_instances(self):
         return self.instances.keys()
 
+    def list_instance_power_states(self):
+        return dict((name, instance.state)
+                    for name, instance in self.instances.iteritems())
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         pass
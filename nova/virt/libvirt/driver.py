@@ -50,7 +50,9 @@ import sys
 import tempfile
 import uuid
 
+from eventlet import greenio
 from eventlet import greenthread
+from eventlet import patcher
 from eventlet import tpool
 from lxml import etree
 from xml.dom import minidom
@@ -74,6 +76,7 @@ from nova import utils
 from nova.virt import configdrive
 from nova.virt.disk import api as disk
 from nova.virt import driver
+from nova.virt import event as virtevent
 from nova.virt import firewall
 from nova.virt.libvirt import config
 from nova.virt.libvirt import firewall as libvirt_firewall
@@ -82,6 +85,9 @@ from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
 from nova.virt import netutils
 
+native_threading = patcher.original("threading")
+native_Queue = patcher.original("Queue")
+
 libvirt = None
 
 LOG = logging.getLogger(__name__)
@@ -165,6 +171,11 @@ libvirt_opts = [
                 default=True,
                 help='Use a separated OS thread pool to realize non-blocking'
                      ' libvirt calls'),
+    cfg.BoolOpt('libvirt_lifecycle_events',
+                default=True,
+                help='Listen to the domain lifecycle events of libvirt, and '
+                     'update the power states of the instances as soon as '
+                     'they change'),
     # force_config_drive is a string option, to allow for future behaviors
     #  (e.g. use config_drive based on image properties)
     cfg.StrOpt('force_config_drive',
@@ -246,6 +257,29 @@ LIBVIRT_POWER_STATE = {
     VIR_DOMAIN_PMSUSPENDED: power_state.SUSPENDED,
 }
 
+# virDomainEventID
+VIR_DOMAIN_EVENT_ID_LIFECYCLE = 0
+
+# virDomainEventType
+VIR_DOMAIN_EVENT_DEFINED = 0
+VIR_DOMAIN_EVENT_UNDEFINED = 1
+VIR_DOMAIN_EVENT_STARTED = 2
+VIR_DOMAIN_EVENT_SUSPENDED = 3
+VIR_DOMAIN_EVENT_RESUMED = 4
+VIR_DOMAIN_EVENT_STOPPED = 5
+VIR_DOMAIN_EVENT_SHUTDOWN = 6
+VIR_DOMAIN_EVENT_PMSUSPENDED = 7
+
+# NOTE: DEFINED and UNDEFINED don't change the power state, and SHUTDOWN
+# is always followed by STOPPED once the domain is really powered off.
+LIBVIRT_EVENT_POWER_STATE = {
+    VIR_DOMAIN_EVENT_STARTED: power_state.RUNNING,
+    VIR_DOMAIN_EVENT_SUSPENDED: power_state.PAUSED,
+    VIR_DOMAIN_EVENT_RESUMED: power_state.RUNNING,
+    VIR_DOMAIN_EVENT_STOPPED: power_state.SHUTDOWN,
+    VIR_DOMAIN_EVENT_PMSUSPENDED: power_state.SUSPENDED,
+}
+
 MIN_LIBVIRT_VERSION = (0, 9, 6)
 # When the above version matches/exceeds this version
 # delete it & corresponding code using it
@@ -268,6 +302,9 @@ class LibvirtDriver(driver.ComputeDriver):
         self._host_state = None
         self._initiator = None
         self._wrapped_conn = None
+        self._event_queue = None
+        self._lifecycle_events_registered = False
+        self._domain_resources = {}
         self.read_only = read_only
         self.firewall_driver = firewall.load_driver(
             default=DEFAULT_FIREWALL_DRIVER,
@@ -326,7 +363,103 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return True
 
+    def _native_thread(self):
+        """Run the libvirt event loop, which calls back
+        _event_lifecycle_callback.  Runs in a native thread, so it must not
+        touch any green thread primitive.
+        """
+        while True:
+            libvirt.virEventRunDefaultImpl()
+
+    def _dispatch_thread(self):
+        """Dispatch the events queued by the native thread to the
+        registered listener.  Runs in a green thread.
+        """
+        while True:
+            self._dispatch_events()
+
+    def _dispatch_events(self):
+        # Wait until the native thread notifies that events are queued
+        self._event_notify_recv.read(1)
+
+        while not self._event_queue.empty():
+            try:
+                event = self._event_queue.get(block=False)
+            except native_Queue.Empty:
+                break
+            self.emit_event(event)
+
+    def _queue_event(self, event):
+        """Queue an event from the native thread, and wake up the
+        dispatch green thread through the notification pipe.
+        """
+        self._event_queue.put(event)
+        self._event_notify_send.write(' ')
+        self._event_notify_send.flush()
+
+    @staticmethod
+    def _event_lifecycle_callback(conn, dom, event, detail, opaque):
+        """Translate a libvirt domain lifecycle event into a power state
+        transition.  Called by libvirt in the native thread.
+        """
+        self = opaque
+        vm_power_state = LIBVIRT_EVENT_POWER_STATE.get(event)
+        if vm_power_state is not None:
+            self._queue_event(virtevent.LifecycleEvent(dom.UUIDString(),
+                                                       vm_power_state))
+
+    def _init_events_pipe(self):
+        self._event_queue = native_Queue.Queue()
+        rpipe, wpipe = os.pipe()
+        self._event_notify_send = greenio.GreenPipe(wpipe, 'wb', 0)
+        self._event_notify_recv = greenio.GreenPipe(rpipe, 'rb', 0)
+
+    def _init_events(self):
+        """Start listening to the libvirt domain lifecycle events.
+
+        libvirt delivers events from its event loop, which has to be run in
+        a native thread since it blocks.  The events are handed over to a
+        green thread through a native queue.
+        """
+        if not hasattr(libvirt, 'virEventRegisterDefaultImpl'):
+            LOG.warn(_("libvirt doesn't support domain lifecycle events, "
+                       "power states will only be polled"))
+            return
+
+        self._init_events_pipe()
+
+        # NOTE: the event loop implementation must be registered before
+        # the connection is opened, so reopen any existing connection.
+        libvirt.virEventRegisterDefaultImpl()
+        self._wrapped_conn = None
+
+        event_thread = native_threading.Thread(target=self._native_thread,
+                                               name='libvirtEventHandler')
+        event_thread.setDaemon(True)
+        event_thread.start()
+
+        greenthread.spawn(self._dispatch_thread)
+
+    def _register_lifecycle_events(self, conn):
+        self._lifecycle_events_registered = False
+        try:
+            conn.domainEventRegisterAny(None,
+                                        VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+                                        self._event_lifecycle_callback,
+                                        self)
+        except libvirt.libvirtError:
+            LOG.exception(_("Failed to register for domain lifecycle "
+                            "events"))
+            return
+        self._lifecycle_events_registered = True
+
+    def emits_lifecycle_events(self):
+        return self._lifecycle_events_registered
+
     def init_host(self, host):
+        if FLAGS.libvirt_lifecycle_events:
+            self._init_events()
+
         if not self.has_min_version(MIN_LIBVIRT_VERSION):
             major = MIN_LIBVIRT_VERSION[0]
             minor = MIN_LIBVIRT_VERSION[1]
@@ -346,6 +479,13 @@ class LibvirtDriver(driver.ComputeDriver):
                     (libvirt.virDomain, libvirt.virConnect),
                     self._connect, self.uri, self.read_only)
 
+            # NOTE: domain IDs may be reused once libvirtd restarts, so the
+            # resources cached by domain ID are dropped on reconnection.
+            self._domain_resources = {}
+
+            if self._event_queue is not None:
+                self._register_lifecycle_events(self._wrapped_conn)
+
         return self._wrapped_conn
 
     _conn = property(_get_connection)
@@ -431,6 +571,31 @@ class LibvirtDriver(driver.ComputeDriver):
                 pass
         return names
 
+    def list_instance_power_states(self):
+        """Efficient override of base list_instance_power_states method.
+
+        Defined domains which aren't running are included, like get_info()
+        would find them.
+        """
+        domains = []
+        for domain_id in self.list_instance_ids():
+            # We skip domains with ID 0 (hypervisors).
+            if domain_id != 0:
+                domains.append((self._conn.lookupByID, domain_id))
+        for name in self._conn.listDefinedDomains():
+            domains.append((self._conn.lookupByName, name))
+
+        power_states = {}
+        for lookup, key in domains:
+            try:
+                domain = lookup(key)
+                power_states[domain.name()] = \
+                        LIBVIRT_POWER_STATE[domain.info()[0]]
+            except libvirt.libvirtError:
+                # Instance was deleted while listing... ignore it
+                pass
+        return power_states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for (network, mapping) in network_info:
@@ -2005,19 +2170,73 @@ class LibvirtDriver(driver.ComputeDriver):
 
         """
 
-        total = 0
+        return sum(resources['vcpus'] for resources
+                   in self._get_domain_resources().itervalues())
+
+    def _get_domain_resources(self, disks=False):
+        """Return the vCPU and disk usage of the running domains, by domain
+        ID.
+
+        The usage of a domain is probed once, when it is first seen
+        running, and cached until it stops: a domain gets a new ID each
+        time it starts, and its vCPUs and disks only change while it is
+        stopped, e.g. for a resize.  So on a steady host this only lists
+        the domain IDs.
+
+        The disks of a domain are only probed when disks is True, so that
+        callers which only need the vCPUs do no disk I/O.
+        """
+        resources = {}
         for dom_id in self.list_instance_ids():
-            dom = self._conn.lookupByID(dom_id)
-            vcpus = dom.vcpus()
-            if vcpus is None:
-                # dom.vcpus is not implemented for lxc, but returning 0 for
-                # a used count is hardly useful for something measuring usage
-                total += 1
-            else:
-                total += len(vcpus[1])
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
-        return total
+            domain_resources = self._domain_resources.get(dom_id)
+            if domain_resources is None:
+                try:
+                    domain_resources = self._probe_domain_resources(dom_id)
+                except libvirt.libvirtError:
+                    # Instance was deleted while listing... ignore it
+                    continue
+                # NOTE(gtt116): give change to do other task.
+                greenthread.sleep(0)
+            if disks and domain_resources['disks'] is None:
+                domain_resources['disks'] = self._probe_domain_disks(
+                        dom_id, domain_resources['xml'])
+                greenthread.sleep(0)
+            resources[dom_id] = domain_resources
+        self._domain_resources = resources
+        return resources
+
+    def _probe_domain_resources(self, dom_id):
+        dom = self._conn.lookupByID(dom_id)
+        vcpus = dom.vcpus()
+        if vcpus is None:
+            # dom.vcpus is not implemented for lxc, but returning 0 for
+            # a used count is hardly useful for something measuring usage
+            vcpus = 1
+        else:
+            vcpus = len(vcpus[1])
+
+        # We skip domains with ID 0 (hypervisors).
+        xml = None
+        if dom_id != 0:
+            xml = dom.XMLDesc(0)
+        return {'vcpus': vcpus, 'xml': xml, 'disks': None}
+
+    def _probe_domain_disks(self, dom_id, xml):
+        """Return the disks of a domain, or None if they have to be
+        probed again on the next call."""
+        if xml is None:
+            return []
+
+        try:
+            return [{'path': info['path'],
+                     'virt_disk_size': info['virt_disk_size']}
+                    for info in self._get_disk_info_from_xml(xml)]
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            LOG.error(_("Getting disk size of domain %(dom_id)s: %(e)s") %
+                      locals())
+            return None
 
     def get_memory_mb_used(self):
         """Get the free memory size(MB) of physical computer.
@@ -2645,10 +2864,17 @@ class LibvirtDriver(driver.ComputeDriver):
                   'disk_size':'83886080'},...]"
 
         """
-        disk_info = []
-
         virt_dom = self._lookup_by_name(instance_name)
         xml = virt_dom.XMLDesc(0)
+        return jsonutils.dumps(self._get_disk_info_from_xml(xml))
+
+    @staticmethod
+    def _get_disk_info_from_xml(xml):
+        """Return the info of the file backed disks of a domain XML, as
+        described in get_instance_disk_info.
+        """
+        disk_info = []
+
         doc = etree.fromstring(xml)
         disk_nodes = doc.findall('.//devices/disk')
         path_nodes = doc.findall('.//devices/disk/source')
@@ -2680,7 +2906,7 @@ class LibvirtDriver(driver.ComputeDriver):
                               'virt_disk_size': virt_size,
                               'backing_file': backing_file,
                               'disk_size': dk_size})
-        return jsonutils.dumps(disk_info)
+        return disk_info
 
     def get_disk_available_least(self):
         """Return disk available least size.
@@ -2696,27 +2922,23 @@ class LibvirtDriver(driver.ComputeDriver):
         dk_sz_gb = self.get_local_gb_total() - self.get_local_gb_used()
 
         # Disk size that all instance uses : virtual_size - disk_size
-        instances_name = self.list_instances()
+        # NOTE: the virtual sizes are cached with the domain resources, as
+        # they require a qemu-img process each, while the disk sizes are
+        # a stat and can grow at any time.
         instances_sz = 0
-        for i_name in instances_name:
-            try:
-                disk_infos = jsonutils.loads(
-                        self.get_instance_disk_info(i_name))
-                for info in disk_infos:
-                    i_vt_sz = int(info['virt_disk_size'])
-                    i_dk_sz = int(info['disk_size'])
-                    instances_sz += i_vt_sz - i_dk_sz
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    LOG.error(_("Getting disk size of %(i_name)s: %(e)s") %
-                              locals())
-                else:
+        domain_resources = self._get_domain_resources(disks=True)
+        for resources in domain_resources.itervalues():
+            for info in resources['disks'] or []:
+                path = info['path']
+                try:
+                    i_dk_sz = int(os.path.getsize(path))
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        LOG.error(_("Getting disk size of %(path)s: %(e)s") %
+                                  locals())
+                        continue
                     raise
-            except exception.InstanceNotFound:
-                # Instance was deleted during the check so ignore it
-                pass
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
+                instances_sz += int(info['virt_disk_size']) - i_dk_sz
         # Disk available least size
         available_least_size = dk_sz_gb * (1024 ** 3) - instances_sz
         return (available_least_size / 1024 / 1024 / 1024)
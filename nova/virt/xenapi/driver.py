@@ -290,6 +290,10 @@ class XenAPIDriver(driver.ComputeDriver):
         """Unplug VIFs from networks."""
         self._vmops.unplug_vifs(instance_ref, network_info)
 
+    def list_instance_power_states(self):
+        """Return the power states of all VM instances"""
+        return self._vmops.list_instance_power_states()
+
     def get_info(self, instance):
         """Return data about VM instance"""
         return self._vmops.get_info(instance)
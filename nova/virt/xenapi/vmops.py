@@ -170,6 +170,22 @@ class VMOps(object):
 
         return name_labels
 
+    def list_instance_power_states(self):
+        """Return the power states of VM instances by name label.
+
+        Halted and suspended VMs aren't resident on any host, so they are
+        included as well, like get_info() would find them.
+        """
+        resident_on = (self._session.get_xenapi_host(), 'OpaqueRef:NULL')
+        power_states = {}
+        for vm_ref, vm_rec in self._session.get_all_refs_and_recs('VM'):
+            if vm_rec["is_a_template"] or vm_rec["is_control_domain"]:
+                continue
+            if vm_rec["resident_on"] in resident_on:
+                power_states[vm_rec["name_label"]] = \
+                        vm_utils.XENAPI_POWER_STATE[vm_rec["power_state"]]
+        return power_states
+
     def confirm_migration(self, migration, instance, network_info):
         name_label = self._get_orig_vm_name_label(instance)
         vm_ref = vm_utils.lookup(self._session, name_label)